@@ -0,0 +1,458 @@
+import os
+import sys
+import shutil
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import datetime
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from run_config import compile_run_config
+from test_manager import TestManager
+from kinematics import GEAR_RATIO, slider_crank_kinematics
+from stroke_reference import MM_PER_IN
+
+try:
+    import psutil  # cross-platform RSS; falls back to resource.getrusage
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+DEFAULT_SAMPLE_RATES = (800, 2000, 5000, 10000, 20000, 50000)
+DEFAULT_CHUNK_SIZES = (100, 200, 1000, 5000)
+DEFAULT_CHANNELS = (3, 4)
+GUI_MAX_POINTS = 5000  # MAX_POINTS of DamperDynoGUI.process_daq_queue
+LATENCY_PERCENTILES = (50, 90, 99)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+    if PSUTIL_AVAILABLE:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1e6
+    return None
+
+
+class SyntheticSource:
+    """
+    Raw DAQ voltages of a running dyno: a linpot following the slider-crank
+    stroke of the configured geometry (so the stroke reference fits it like
+    real data), a sinusoidal load cell at the crank frequency, a slowly
+    drifting IR temperature and HLFB duty, plus any number of extra (unused)
+    channels.
+    """
+
+    def __init__(self, n_channels=3, rpm=600, gear_ratio=GEAR_RATIO, seed=0,
+                 crank_radius_in=0.75, rod_length_in=6.0, disp_slope=9.64, disp_offset=0.0):
+        """
+        Args:
+            n_channels (int): Rows per chunk (4 adds the HLFB duty).
+            rpm (float): Motor speed [RPM]; the crank turns at rpm / gear_ratio.
+            crank_radius_in, rod_length_in (float): Slider-crank geometry [in].
+            disp_slope, disp_offset (float): Linpot calibration [mm/V, mm],
+                used to turn the stroke back into volts.
+        """
+        self.n_channels = n_channels
+        self.crank_hz = rpm / gear_ratio / 60.0
+        self.R = crank_radius_in * MM_PER_IN
+        self.Lc = rod_length_in * MM_PER_IN
+        self.disp_slope = disp_slope
+        self.disp_offset = disp_offset
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_settings(cls, settings, n_channels=3, rpm=600, seed=0):
+        """SyntheticSource for the geometry and linpot calibration of a settings dict."""
+        return cls(n_channels, rpm=rpm, seed=seed,
+                   crank_radius_in=float(settings['crank_radius_in']),
+                   rod_length_in=float(settings['rod_length_in']),
+                   disp_slope=float(settings.get('disp_slope', 9.64)),
+                   disp_offset=float(settings.get('disp_offset', 0.0)))
+
+    def read(self, start, n, sample_rate):
+        t = (start + np.arange(n)) / sample_rate
+        phase = 2 * np.pi * self.crank_hz * t
+        stroke_mm, _, _ = slider_crank_kinematics(phase, 2 * np.pi * self.crank_hz, self.Lc, self.R)
+        rows = [
+            -0.5 * np.sin(phase + 0.3),                       # load cell [V]
+            (0.5 + stroke_mm - self.disp_offset) / self.disp_slope,  # linpot [V]
+            1.2 + 0.001 * t,                                  # IR temperature [V]
+            50 + 20 * np.sin(phase),                          # HLFB duty [%]
+        ]
+        data = np.vstack(rows[:self.n_channels] +
+                         [np.zeros(n)] * max(0, self.n_channels - len(rows)))
+        return data + self.rng.normal(0, 1e-3, data.shape)
+
+
+class ReplaySource:
+    """Replays the raw voltage columns of a saved capture CSV, looping as needed."""
+
+    COLUMNS = ("Force (V)", "Displacement (V)", "Temperature (V)", "HLFB Duty (%)")
+
+    def __init__(self, path, n_channels=3):
+        from ingest import parse_csv
+        columns = parse_csv(path)
+        rows = [np.asarray(columns[c], dtype=float) for c in self.COLUMNS if c in columns]
+        if len(rows) < 3:
+            raise ValueError(f"'{path}' has no raw voltage columns to replay.")
+        self.data = np.nan_to_num(np.vstack(rows))
+        self.n_channels = n_channels
+
+    def read(self, start, n, sample_rate):
+        idx = (start + np.arange(n)) % self.data.shape[1]
+        data = self.data[:self.n_channels, idx]
+        if self.n_channels > data.shape[0]:
+            data = np.vstack((data, np.zeros((self.n_channels - data.shape[0], n))))
+        return data
+
+
+class BenchmarkDAQ:
+    """
+    Stand-in for DAQController: captures TestManager's callback instead of
+    starting NI tasks, and builds each chunk's timestamps the way
+    DAQController._acquisition_callback does.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.callback = None
+        self.sample_rate = None
+        self.chunk_size = None
+        self.start_time = None
+        self.total_samples_acquired = 0
+
+    def start_acquisition(self, analog_channels, mode, sample_rate, chunk_size, callback, acquire_hlfb=False):
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.start_time = datetime.datetime.now()
+        self.total_samples_acquired = 0
+        return True
+
+    def acquire_chunk(self):
+        data = self.source.read(self.total_samples_acquired, self.chunk_size, self.sample_rate)
+        times = [
+            self.start_time + datetime.timedelta(seconds=(self.total_samples_acquired + i) / self.sample_rate)
+            for i in range(data.shape[1])
+        ]
+        self.total_samples_acquired += data.shape[1]
+        return times, data
+
+    def stop_acquisition(self):
+        self.callback = None
+
+    def configure_motor_pwm(self, frequency=1000):
+        pass
+
+    def start_motor(self, duty_cycle):
+        pass
+
+    def update_motor_duty_cycle(self, duty_cycle):
+        pass
+
+    def stop_motor(self, slowdown_time=1.0):
+        pass
+
+    def emergency_stop(self):
+        self.stop_acquisition()
+
+    def close(self):
+        self.stop_acquisition()
+
+
+class PacedDAQ(BenchmarkDAQ):
+    """
+    BenchmarkDAQ that delivers chunks from its own thread at the sample clock,
+    like the NI every-N-samples callback, for headless replay or simulated runs.
+    """
+
+    def __init__(self, source):
+        super().__init__(source)
+        self._stop = threading.Event()
+
+    def start_acquisition(self, analog_channels, mode, sample_rate, chunk_size, callback, acquire_hlfb=False):
+        super().start_acquisition(analog_channels, mode, sample_rate, chunk_size, callback, acquire_hlfb)
+        self._stop.clear()
+        threading.Thread(target=self._run, name="PacedDAQ", daemon=True).start()
+        return True
+
+    def _run(self):
+        period = self.chunk_size / self.sample_rate
+        deadline = time.perf_counter() + period
+        while not self._stop.wait(max(0.0, deadline - time.perf_counter())):
+            callback = self.callback
+            if callback is None:
+                break
+            times, data = self.acquire_chunk()
+            try:
+                callback(times, data)
+            except Exception as e:
+                logging.info(f"Error in DAQ callback: {e}")
+            deadline += period
+
+    def stop_acquisition(self):
+        self._stop.set()
+        super().stop_acquisition()
+
+
+def _drain_gui_queue(gui_queue, buffers):
+    """Consumes GUI packets like DamperDynoGUI.process_daq_queue (without Tk)."""
+    packets = 0
+    while True:
+        try:
+            packet = gui_queue.get_nowait()
+        except queue.Empty:
+            break
+        packets += 1
+        if isinstance(packet, dict) and "times" in packet:
+            for key in ("times", "force", "disp", "vel", "vel_ref"):
+                buffers[key].extend(packet[key])
+    excess = len(buffers["times"]) - GUI_MAX_POINTS
+    if excess > 0:
+        for key in buffers:
+            buffers[key] = buffers[key][excess:]
+    return packets
+
+def run_point(sample_rate, chunk_size, n_channels, duration_s=5.0, max_wall_s=60.0, buffer_s=1.0,
+              config_path=DEFAULT_CONFIG, replay=None):
+    """
+    Drives one acquisition -> processing -> storage -> GUI-packet run.
+
+    Chunks are pushed through TestManager's DAQ callback as fast as
+    possible and timed; a virtual hardware clock (one chunk every
+    chunk_size / sample_rate seconds) then replays those service times to
+    get the real-time latency (queueing included) and the chunks that would
+    have overflowed a buffer_s-second DAQ buffer.
+
+    Returns:
+        dict: Throughput, latency percentiles, utilization, dropped samples,
+        storage time and peak RSS of the point.
+    """
+    with open(config_path, "r") as f:
+        settings = json.load(f)
+    tmp_dir = tempfile.mkdtemp(prefix="dyno_bench_")
+    settings.update(sample_rate=sample_rate, chunk_size=chunk_size, output_dir=tmp_dir,
+                    catalog_update_on_save=0, hlfb_enable=int(n_channels > 3))
+    config = compile_run_config(settings, mode="single")
+
+    source = (ReplaySource(replay, n_channels) if replay
+              else SyntheticSource.from_settings(settings, n_channels, rpm=config.segment_rpm[0]))
+    daq = BenchmarkDAQ(source)
+    manager = TestManager(daq)
+    manager.current_target_rpm = config.segment_rpm[0]
+    manager._start_acquisition(config)
+
+    n_chunks = max(1, int(round(duration_s * sample_rate / chunk_size)))
+    acquire_s = np.zeros(n_chunks)
+    process_s = np.zeros(n_chunks)
+    gui_s = np.zeros(n_chunks)
+    buffers = {key: [] for key in ("times", "force", "disp", "vel", "vel_ref")}
+    packets = 0
+
+    # silence per-chunk warnings (glitches, saturation) so logging is not what gets measured
+    log_level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.ERROR)
+    wall_start = time.perf_counter()
+    done = 0
+    try:
+        for k in range(n_chunks):
+            t0 = time.perf_counter()
+            times, data = daq.acquire_chunk()
+            t1 = time.perf_counter()
+            daq.callback(times, data)
+            t2 = time.perf_counter()
+            packets += _drain_gui_queue(manager.gui_queue, buffers)
+            t3 = time.perf_counter()
+            acquire_s[k], process_s[k], gui_s[k] = t1 - t0, t2 - t1, t3 - t2
+            done = k + 1
+            if t3 - wall_start > max_wall_s:
+                break
+        t0 = time.perf_counter()
+        manager._end_test(config)
+        storage_s = time.perf_counter() - t0
+    finally:
+        logging.getLogger().setLevel(log_level)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    wall_s = time.perf_counter() - wall_start
+
+    # replay the measured service times against the hardware clock
+    service = (acquire_s + process_s)[:done]
+    period = chunk_size / sample_rate
+    finish = 0.0
+    latency = []
+    dropped = 0
+    for k, s in enumerate(service):
+        arrival = (k + 1) * period
+        start = max(arrival, finish)
+        if start - arrival > buffer_s:
+            dropped += 1
+            continue
+        finish = start + s
+        latency.append(finish - arrival)
+    latency = np.array(latency) if latency else np.full(1, np.nan)
+
+    processed = done * chunk_size
+    result = {
+        "sample_rate": sample_rate,
+        "chunk_size": chunk_size,
+        "channels": n_channels,
+        "chunks": done,
+        "truncated": done < n_chunks,
+        "samples_per_s": processed / max(float(service.sum()), 1e-12),
+        "end_to_end_samples_per_s": processed / wall_s,
+        "utilization": float(service.mean() / period),
+        "sustainable": dropped == 0 and float(service.mean()) < period,
+        "dropped_samples": dropped * chunk_size,
+        "gui_packets": packets,
+        "storage_s": storage_s,
+        "storage_rows_per_s": processed / storage_s if storage_s > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    for stage, values in (("service", service), ("acquire", acquire_s[:done]),
+                          ("process", process_s[:done]), ("gui", gui_s[:done]), ("latency", latency)):
+        for p in LATENCY_PERCENTILES:
+            result[f"{stage}_p{p}_ms"] = float(np.percentile(values, p) * 1e3)
+        result[f"{stage}_max_ms"] = float(np.max(values) * 1e3)
+    return result
+
+def _point_job(kwargs):
+    return run_point(**kwargs)
+
+def run_suite(sample_rates=DEFAULT_SAMPLE_RATES, chunk_sizes=DEFAULT_CHUNK_SIZES, channels=DEFAULT_CHANNELS,
+              isolate=True, output=None, **point_kwargs):
+    """
+    Runs the benchmark sweep and optionally writes it as JSON.
+
+    Args:
+        isolate (bool): Run every point in a fresh process so peak RSS is
+            per point (points still run one at a time, so timings do not
+            compete for cores).
+        output (str, optional): JSON path for the results.
+        **point_kwargs: Forwarded to run_point (duration_s, max_wall_s,
+            buffer_s, config_path, replay).
+
+    Returns:
+        dict: {'meta': environment info, 'results': [run_point dicts]}.
+    """
+    points = [dict(sample_rate=fs, chunk_size=cs, n_channels=ch, **point_kwargs)
+              for fs in sample_rates for cs in chunk_sizes for ch in channels]
+    results = []
+    for point in points:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(_point_job, point).result()
+        else:
+            result = run_point(**point)
+        logging.info(f"[bench] fs={result['sample_rate']} chunk={result['chunk_size']} ch={result['channels']}: "
+                     f"{result['samples_per_s']:.0f} samples/s, p99 latency {result['latency_p99_ms']:.2f} ms, "
+                     f"dropped {result['dropped_samples']}")
+        results.append(result)
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in point_kwargs.items()},
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=4)
+        logging.info(f"Benchmark results written to '{output}'")
+    return report
+
+def max_sustainable_rate(report, chunk_size=None, channels=None):
+    """Highest sample rate with no dropped data, optionally for one chunk size / channel count."""
+    rates = [r["sample_rate"] for r in report["results"] if r["sustainable"]
+             and (chunk_size is None or r["chunk_size"] == chunk_size)
+             and (channels is None or r["channels"] == channels)]
+    return max(rates) if rates else None
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Regression gate between two benchmark reports (dicts or JSON paths).
+
+    A point regresses if its throughput drops, or its p99 latency or peak
+    RSS grows, by more than tolerance, or if it stops being sustainable.
+
+    Returns:
+        list: One message per regression (empty if none).
+    """
+    if isinstance(baseline, str):
+        with open(baseline, "r") as f:
+            baseline = json.load(f)
+    if isinstance(current, str):
+        with open(current, "r") as f:
+            current = json.load(f)
+
+    def key(r):
+        return (r["sample_rate"], r["chunk_size"], r["channels"])
+
+    base = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        name = "fs={} chunk={} ch={}".format(*key(r))
+        if r["samples_per_s"] < b["samples_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {b['samples_per_s']:.0f} -> {r['samples_per_s']:.0f} samples/s")
+        if r["latency_p99_ms"] > b["latency_p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 latency {b['latency_p99_ms']:.2f} -> {r['latency_p99_ms']:.2f} ms")
+        if b.get("peak_rss_mb") and r.get("peak_rss_mb") and r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {b['peak_rss_mb']:.0f} -> {r['peak_rss_mb']:.0f} MB")
+        if b["sustainable"] and not r["sustainable"]:
+            regressions.append(f"{name}: no longer sustainable ({r['dropped_samples']} samples dropped)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Damper dyno acquisition pipeline benchmark (no hardware needed).")
+    parser.add_argument("--rates", type=int, nargs="+", default=list(DEFAULT_SAMPLE_RATES), help="Sample rates [Hz].")
+    parser.add_argument("--chunks", type=int, nargs="+", default=list(DEFAULT_CHUNK_SIZES), help="Chunk sizes [samples].")
+    parser.add_argument("--channels", type=int, nargs="+", default=list(DEFAULT_CHANNELS), help="Channel counts.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Simulated seconds of data per point.")
+    parser.add_argument("--max-wall", type=float, default=60.0, help="Wall-clock cap per point [s].")
+    parser.add_argument("--replay", help="Capture CSV to replay instead of synthetic data.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="config.json to compile the run from.")
+    parser.add_argument("--output", default=f"benchmark_{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}.json")
+    parser.add_argument("--compare", help="Baseline JSON; exit with status 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative regression tolerance.")
+    parser.add_argument("--no-isolate", action="store_true", help="Run all points in this process.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    report = run_suite(args.rates, args.chunks, args.channels, isolate=not args.no_isolate, output=args.output,
+                       duration_s=args.duration, max_wall_s=args.max_wall, config_path=args.config,
+                       replay=args.replay)
+    for ch in args.channels:
+        for cs in args.chunks:
+            logging.info(f"Max sustainable rate (chunk={cs}, channels={ch}): "
+                         f"{max_sustainable_rate(report, cs, ch)} Hz")
+    if args.compare:
+        regressions = compare(args.compare, report, args.tolerance)
+        for message in regressions:
+            logging.error(f"Regression: {message}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
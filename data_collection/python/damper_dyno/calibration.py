@@ -0,0 +1,154 @@
+import logging
+import numpy as np
+
+class CalibrationEngine:
+    """
+    Fused voltage -> engineering unit calibration for all analog channels.
+
+    Each channel has an affine (slope/offset), polynomial or lookup-table
+    transform. Calibrations are compiled into
+
+        - one (channels x degree+1) coefficient matrix, evaluated with Horner's
+          rule over the whole (channels x samples) block, and
+        - one stacked uniform-grid table for lookup-table channels, evaluated
+          with a single gather for all of them,
+
+    so the number of numpy passes per chunk depends on the polynomial degree,
+    not on the number of channels. A tare capture adds per-channel offsets so
+    that selected channels read their tare target (usually 0) at rest.
+    """
+
+    LUT_POINTS = 1024  # uniform grid resolution used to compile lookup tables
+
+    def __init__(self, channel_names):
+        self.channel_names = list(channel_names)
+        self._specs = {name: ('poly', [1.0, 0.0]) for name in self.channel_names}
+        self.tare_offsets = {name: 0.0 for name in self.channel_names}
+        self._compiled = False
+
+    @classmethod
+    def from_settings(cls, settings, channel_names=('force', 'disp', 'temp')):
+        """
+        Builds the engine from config.json style settings. For each channel
+        name, '<name>_lut' ([[volts...], [values...]]) takes precedence over
+        '<name>_poly' (coefficients, highest power first as in np.polyval),
+        which takes precedence over '<name>_slope' / '<name>_offset'.
+        """
+        engine = cls(channel_names)
+        for name in channel_names:
+            if settings.get(f"{name}_lut"):
+                volts, values = settings[f"{name}_lut"]
+                engine.set_lookup_table(name, volts, values)
+            elif settings.get(f"{name}_poly"):
+                engine.set_polynomial(name, settings[f"{name}_poly"])
+            else:
+                engine.set_affine(name, settings.get(f"{name}_slope", 1.0), settings.get(f"{name}_offset", 0.0))
+        return engine
+
+    def set_affine(self, name, slope, offset):
+        self.set_polynomial(name, [slope, offset])
+
+    def set_polynomial(self, name, coeffs):
+        """Sets a polynomial calibration, coefficients highest power first."""
+        coeffs = [float(c) for c in coeffs]
+        if not coeffs:
+            raise ValueError(f"Empty polynomial calibration for channel '{name}'.")
+        self._specs[name] = ('poly', coeffs)
+        self._compiled = False
+
+    def set_lookup_table(self, name, volts, values):
+        """Sets a piecewise-linear lookup table calibration (clamped at the ends)."""
+        volts = np.asarray(volts, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if volts.size < 2 or volts.shape != values.shape:
+            raise ValueError(f"Lookup table for channel '{name}' needs matching voltage/value rows of length >= 2.")
+        order = np.argsort(volts)
+        self._specs[name] = ('lut', (volts[order], values[order]))
+        self._compiled = False
+
+    def compile(self):
+        """Compiles all channel calibrations into the fused evaluation arrays."""
+        n_ch = len(self.channel_names)
+        poly = [(i, c) for i, name in enumerate(self.channel_names)
+                for kind, c in [self._specs[name]] if kind == 'poly']
+        luts = [(i, t) for i, name in enumerate(self.channel_names)
+                for kind, t in [self._specs[name]] if kind == 'lut']
+
+        # polynomial channels: zero-padded coefficient matrix, lowest power first
+        degree = max((len(c) - 1 for _, c in poly), default=0)
+        self._poly_rows = np.array([i for i, _ in poly], dtype=int)
+        self._poly_coeffs = np.zeros((len(poly), degree + 1))
+        for row, (_, c) in enumerate(poly):
+            self._poly_coeffs[row, :len(c)] = c[::-1]
+
+        # lookup-table channels: resample onto per-channel uniform grids
+        self._lut_rows = np.array([i for i, _ in luts], dtype=int)
+        self._lut_v0 = np.array([t[0][0] for _, t in luts]).reshape(-1, 1)
+        self._lut_dv = np.array([(t[0][-1] - t[0][0]) / (self.LUT_POINTS - 1) for _, t in luts]).reshape(-1, 1)
+        self._lut_table = np.array([
+            np.interp(np.linspace(t[0][0], t[0][-1], self.LUT_POINTS), t[0], t[1]) for _, t in luts
+        ]).reshape(len(luts), self.LUT_POINTS)
+
+        self._offsets = np.array([self.tare_offsets.get(name, 0.0) for name in self.channel_names]).reshape(n_ch, 1)
+        self._compiled = True
+
+    def _transform(self, volts):
+        """Raw calibration (no tare) of a (channels x samples) voltage block."""
+        if not self._compiled:
+            self.compile()
+        volts = np.asarray(volts, dtype=float)
+        if volts.ndim == 1:
+            volts = volts.reshape(-1, 1)
+        out = np.empty((len(self.channel_names), volts.shape[1]))
+
+        if self._poly_rows.size:
+            v = volts[self._poly_rows]
+            acc = np.broadcast_to(self._poly_coeffs[:, -1:], v.shape).copy()
+            for k in range(self._poly_coeffs.shape[1] - 2, -1, -1):
+                acc *= v
+                acc += self._poly_coeffs[:, k:k + 1]
+            out[self._poly_rows] = acc
+
+        if self._lut_rows.size:
+            pos = np.clip((volts[self._lut_rows] - self._lut_v0) / self._lut_dv, 0, self.LUT_POINTS - 1)
+            idx = np.minimum(pos.astype(int), self.LUT_POINTS - 2)
+            frac = pos - idx
+            lo = np.take_along_axis(self._lut_table, idx, axis=1)
+            hi = np.take_along_axis(self._lut_table, idx + 1, axis=1)
+            out[self._lut_rows] = lo + frac * (hi - lo)
+
+        return out
+
+    def apply(self, volts):
+        """
+        Calibrates a (channels x samples) voltage block in one fused pass.
+
+        Args:
+            volts (array): Raw voltages, one row per channel in channel_names order.
+
+        Returns:
+            np.ndarray: Calibrated values with the same shape, tare applied.
+        """
+        out = self._transform(volts)
+        out += self._offsets
+        return out
+
+    def capture_tare(self, volts, channels=('force',), targets=None):
+        """
+        Computes tare offsets from a block of at-rest voltages so that the mean
+        calibrated value of each tared channel equals its target (default 0).
+        """
+        targets = targets or {}
+        means = self._transform(volts).mean(axis=1)
+        for name in channels:
+            if name not in self.channel_names:
+                continue
+            i = self.channel_names.index(name)
+            self.tare_offsets[name] = targets.get(name, 0.0) - float(means[i])
+            logging.info(f"Tare '{name}': offset {self.tare_offsets[name]:.4f}")
+        self._compiled = False
+        return dict(self.tare_offsets)
+
+    def clear_tare(self):
+        self.tare_offsets = {name: 0.0 for name in self.channel_names}
+        self._compiled = False
@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import logging
+import datetime
+import numpy as np
+from ingest import find_csvs, load_csvs
+
+CATALOG_VERSION = 1
+CATALOG_NAME = "catalog.json"
+CACHE_DIR_NAME = ".ingest_cache"
+
+# t1_2_2_24_24_s5_n10_100psi[_with_heat_gun].csv (Phase 1 temperature sensitivity)
+TRIAL_PATTERN = re.compile(
+    r"^t(?P<trial>\d+)_(?P<hsc>[0-9.]+)_(?P<hsr>[0-9.]+)_(?P<lsc>[0-9.]+)_(?P<lsr>[0-9.]+)"
+    r"_s(?P<speed>[0-9.]+)_n(?P<cycles>\d+)_(?P<pressure_psi>[0-9.]+)psi(?P<suffix>.*)$", re.IGNORECASE)
+# Run#_HSC_HSR_LSC_LSR.csv (Phase 3 valving sweeps, see read_data.m)
+RUN_PATTERN = re.compile(
+    r"^Run(?P<run>\d+)_(?P<hsc>[0-9.]+)_(?P<hsr>[0-9.]+)_(?P<lsc>[0-9.]+)_(?P<lsr>[0-9.]+)(?P<suffix>.*)$", re.IGNORECASE)
+# dyno_test_YYYY-mm-dd_HH-MM-SS.csv (utils.save_test_data)
+CAPTURE_PATTERN = re.compile(r"^dyno_test_(?P<captured>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})$")
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+def parse_test_name(filename):
+    """
+    Parses the test identity encoded in a capture filename.
+
+    Returns:
+        dict: Typed fields. Always contains 'scheme' ('trial', 'run', 'capture'
+        or 'unknown'); valving clicks are 'hsc', 'hsr', 'lsc', 'lsr'.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+
+    m = TRIAL_PATTERN.match(stem)
+    if m:
+        suffix = m.group("suffix").lower()
+        fields = {k: _number(m.group(k)) for k in ("trial", "hsc", "hsr", "lsc", "lsr", "speed", "cycles", "pressure_psi")}
+        fields.update(scheme="trial", heat_gun="heat_gun" in suffix, tag=suffix.strip("_") or None)
+        return fields
+
+    m = RUN_PATTERN.match(stem)
+    if m:
+        suffix = m.group("suffix").lower()
+        fields = {k: _number(m.group(k)) for k in ("run", "hsc", "hsr", "lsc", "lsr")}
+        fields.update(scheme="run", heat_gun="heat_gun" in suffix, tag=suffix.strip("_") or None)
+        return fields
+
+    m = CAPTURE_PATTERN.match(stem)
+    if m:
+        captured = datetime.datetime.strptime(m.group("captured"), "%Y-%m-%d_%H-%M-%S")
+        return {"scheme": "capture", "captured": captured.isoformat()}
+
+    return {"scheme": "unknown"}
+
+def summarize_columns(columns):
+    """
+    Summary statistics of one parsed capture (see ingest.parse_csv).
+
+    Returns:
+        dict: rows, duration_s, sample_rate, rpm_segments (motor RPM in run
+        order), peak force / min / max force [N] and temperature range [C].
+        Missing channels give None.
+    """
+    def column(name):
+        values = columns.get(name)
+        return None if values is None or len(values) == 0 else np.asarray(values)
+
+    def stat(values, fn):
+        return None if values is None else float(fn(values))
+
+    t = column("time_s")
+    force = column("Force (N)")
+    temp = column("Temperature (C)")
+    rpm = column("RPM")
+
+    summary = {"rows": int(len(next(iter(columns.values())))) if columns else 0}
+    if t is not None and t.size > 1:
+        summary["duration_s"] = float(t[-1] - t[0])
+        summary["sample_rate"] = float((t.size - 1) / (t[-1] - t[0])) if t[-1] > t[0] else None
+    else:
+        summary["duration_s"] = summary["sample_rate"] = None
+
+    if rpm is not None:
+        # segment boundaries are where the commanded RPM steps
+        starts = np.flatnonzero(np.r_[True, np.diff(rpm) != 0])
+        summary["rpm_segments"] = [float(r) for r in rpm[starts]]
+    else:
+        summary["rpm_segments"] = []
+
+    summary["peak_force_n"] = stat(force, lambda f: np.max(np.abs(f)))
+    summary["force_min_n"] = stat(force, np.min)
+    summary["force_max_n"] = stat(force, np.max)
+    summary["temp_min_c"] = stat(temp, np.min)
+    summary["temp_max_c"] = stat(temp, np.max)
+    return summary
+
+def table_columns(table):
+    """
+    Columns needed by summarize_columns from an in-memory capture table
+    (header row + data rows, as passed to utils.save_test_data), so a capture
+    can be indexed without re-reading or caching its CSV.
+    """
+    header, rows = table[0], table[1:]
+    columns = {}
+    if not rows:
+        return columns
+    for name in ("RPM", "Force (N)", "Temperature (C)"):
+        if name in header:
+            i = header.index(name)
+            columns[name] = np.array([row[i] for row in rows], dtype=float)
+    if "Timestamp" in header:
+        i = header.index("Timestamp")
+        t0 = rows[0][i]
+        columns["time_s"] = np.array([(row[i] - t0).total_seconds() for row in rows])
+    return columns
+
+def _matches(value, condition):
+    if callable(condition):
+        return bool(condition(value))
+    if isinstance(condition, tuple) and len(condition) == 2:
+        lo, hi = condition
+        return value is not None and (lo is None or value >= lo) and (hi is None or value <= hi)
+    if isinstance(condition, (list, set, frozenset)):
+        return value in condition
+    return value == condition
+
+
+class TestCatalog:
+    """
+    Queryable index of test captures.
+
+    Each CSV gets one record with the fields parsed from its filename, summary
+    statistics of its data and, for GUI captures, the run mode and segments
+    from the JSON metadata sidecar. Records are stored in a JSON index and only
+    (re)built for files whose size or mtime changed, so queries never open a
+    capture file.
+    """
+
+    def __init__(self, catalog_path, cache_dir=None):
+        """
+        Args:
+            catalog_path (str): Path of the JSON index.
+            cache_dir (str, optional): Ingest cache directory, defaults to
+                '.ingest_cache' next to the index.
+        """
+        self.catalog_path = catalog_path
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(catalog_path)), CACHE_DIR_NAME)
+        self.records = {}
+        self.load()
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        """Catalog stored in the GUI's output_dir."""
+        return cls(os.path.join(output_dir, CATALOG_NAME))
+
+    def load(self):
+        try:
+            with open(self.catalog_path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                self.records = data["records"]
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.records = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+        tmp = self.catalog_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "records": self.records}, f, indent=1)
+        os.replace(tmp, self.catalog_path)
+
+    def update(self, folders, recursive=True, workers=None):
+        """
+        Brings the catalog up to date with the CSVs under one or more folders.
+        New or modified files are ingested (in parallel, through the columnar
+        cache) and summarized; records of deleted files are dropped.
+
+        Returns:
+            int: Number of records added or refreshed.
+        """
+        if isinstance(folders, str):
+            folders = [folders]
+        scanned = set()
+        stale = []
+        for folder in folders:
+            for path in find_csvs(folder, recursive=recursive):
+                path = os.path.abspath(path)
+                scanned.add(path)
+                st = os.stat(path)
+                record = self.records.get(path)
+                if record is None or record["size"] != st.st_size or record["mtime_ns"] != st.st_mtime_ns:
+                    stale.append((path, st))
+
+        roots = tuple(os.path.abspath(f) + os.sep for f in folders)
+        for path in [p for p in self.records if p.startswith(roots) and p not in scanned]:
+            del self.records[path]
+
+        if stale:
+            loaded = load_csvs([p for p, _ in stale], self.cache_dir, workers=workers)
+            for path, st in stale:
+                self.records[path] = self._build_record(path, st, loaded[path])
+            logging.info(f"Catalog: indexed {len(stale)} file(s), {len(self.records)} total")
+        self.save()
+        return len(stale)
+
+    def add(self, path, columns):
+        """
+        Indexes one capture from columns already in memory (see table_columns),
+        e.g. right after the GUI saved it. Nothing is written to the ingest cache.
+        """
+        path = os.path.abspath(path)
+        self.records[path] = self._build_record(path, os.stat(path), columns)
+        self.save()
+
+    def _build_record(self, path, st, columns):
+        record = {
+            "path": path,
+            "name": os.path.basename(path),
+            "folder": os.path.basename(os.path.dirname(path)),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        record.update(parse_test_name(path))
+        record.update(summarize_columns(columns))
+
+        sidecar = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(sidecar):
+            try:
+                with open(sidecar, "r") as f:
+                    meta = json.load(f)
+                record["mode"] = meta.get("mode")
+                record["segment_rpm"] = meta.get("segments", {}).get("rpm")
+                record["linear_speed_ips"] = meta.get("segments", {}).get("linear_speed_ips")
+            except (json.JSONDecodeError, OSError) as e:
+                logging.warning(f"Catalog: could not read metadata {sidecar}: {e}")
+        return record
+
+    def query(self, **conditions):
+        """
+        Returns the records matching every condition, sorted by path.
+
+        A condition is a value (equality), a (min, max) tuple (inclusive,
+        either end may be None), a list/set of allowed values or a predicate,
+        e.g. query(pressure_psi=100, heat_gun=True, lsc=24, lsr=24).
+        """
+        return [r for _, r in sorted(self.records.items())
+                if all(_matches(r.get(key), cond) for key, cond in conditions.items())]
+
+    def paths(self, **conditions):
+        return [r["path"] for r in self.query(**conditions)]
@@ -0,0 +1,359 @@
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from uncertainty import DEFAULT_SEED, bootstrap_intervals, t_halfwidth
+
+# Defaults of data_wrangler.m
+DEFAULT_PARAMS = {
+    "nbins_fd": 300,
+    "nbins_fv": 200,
+    "nbins_fv_all": 100,
+    "max_vel_bin_width": 0.25,
+    "poly_order": 3,
+    "opp_vel_perc": 0.15,
+    "v_knee": 1.0,
+    "n_boot": 0,          # bootstrap resamples per bin (0: Student-t only)
+    "seed": DEFAULT_SEED,
+}
+
+def grouped_bin_index(x, group, n_groups, nbins):
+    """
+    Flattened (group, bin) index of every sample for per-group uniform bins
+    between the group's min and max of x (last bin closed).
+
+    Returns:
+        tuple: (flat_index, lo, width) with lo/width of each group's bins.
+    """
+    lo = np.full(n_groups, np.inf)
+    hi = np.full(n_groups, -np.inf)
+    np.minimum.at(lo, group, x)
+    np.maximum.at(hi, group, x)
+    width = (hi - lo) / nbins
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pos = (x - lo[group]) / width[group]
+    b = np.where(width[group] > 0, pos, nbins - 1)
+    b = np.clip(np.floor(b), 0, nbins - 1).astype(np.intp)
+    return group * nbins + b, lo, width
+
+def grouped_bin_profile(x, y, group, n_groups, nbins):
+    """
+    bin_profile_modified ('uniform_x') for many groups in one pass.
+
+    Every group gets nbins uniform bins between its own min and max of x
+    (last bin closed). Per-bin mean and t-uncertainty of y come from
+    np.bincount over the flattened (group, bin) index.
+
+    Returns:
+        tuple: (centers, mean, unc, count), each of shape (n_groups, nbins),
+        NaN for empty bins.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    flat, lo, width = grouped_bin_index(x, group, n_groups, nbins)
+
+    size = n_groups * nbins
+    count = np.bincount(flat, minlength=size).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(flat, y, minlength=size) / count
+    sum_sq_dev = np.bincount(flat, (y - mean[flat])**2, minlength=size)
+    unc = t_halfwidth(sum_sq_dev, count)
+
+    empty = ~np.isfinite(lo)
+    centers = lo[:, None] + width[:, None] * (np.arange(nbins) + 0.5)
+    centers[empty] = np.nan
+    shape = (n_groups, nbins)
+    return centers, mean.reshape(shape), unc.reshape(shape), count.reshape(shape)
+
+def grouped_polyfit(v, f, group, n_groups, order):
+    """
+    Batched polyfit/polyval R^2 (polyfit_data) for many groups.
+
+    Normal equations of every group are accumulated with np.bincount on
+    velocities scaled to [-1, 1] per group and solved as one stacked system.
+
+    Returns:
+        tuple: (coeffs, R2) with coeffs of shape (n_groups, order + 1),
+        highest power first as np.polyval; NaN for groups with
+        order + 1 or fewer samples.
+    """
+    v = np.asarray(v, dtype=float)
+    f = np.asarray(f, dtype=float)
+    count = np.bincount(group, minlength=n_groups)
+    scale = np.zeros(n_groups)
+    np.maximum.at(scale, group, np.abs(v))
+    scale[scale == 0] = 1.0
+    u = v / scale[group]
+
+    powers = u[:, None] ** np.arange(2 * order + 1)
+    moments = np.stack([np.bincount(group, powers[:, k], minlength=n_groups) for k in range(2 * order + 1)], axis=1)
+    rhs = np.stack([np.bincount(group, f * powers[:, k], minlength=n_groups) for k in range(order + 1)], axis=1)
+    idx = np.arange(order + 1)
+    A = moments[:, idx[:, None] + idx[None, :]]
+
+    valid = count > order + 1
+    c = np.full((n_groups, order + 1), np.nan)
+    if valid.any():
+        try:
+            c[valid] = np.linalg.solve(A[valid], rhs[valid][..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            for g in np.flatnonzero(valid):
+                c[g] = np.linalg.lstsq(A[g], rhs[g], rcond=None)[0]
+
+    # R^2 on the scaled basis, then unscale the coefficients
+    pred = np.einsum("ij,ij->i", powers[:, :order + 1], np.nan_to_num(c[group]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f_mean = np.bincount(group, f, minlength=n_groups) / count
+        ss_res = np.bincount(group, (f - pred)**2, minlength=n_groups)
+        ss_tot = np.bincount(group, (f - f_mean[group])**2, minlength=n_groups)
+        r2 = np.where(valid, 1 - ss_res / ss_tot, np.nan)
+    coeffs = (c / scale[:, None] ** idx)[:, ::-1]
+    return coeffs, r2
+
+def grouped_piecewise_fit(v, f, group, n_groups, v_fit_max, v_knee, opp_vel_perc):
+    """
+    Batched fit_piecewise_linear: F = F0 + C_LS*min(|v|, v_knee) + C_HS*max(0, |v| - v_knee)
+    with F0 the mean force below opp_vel_perc * v_fit_max, for many groups.
+
+    Returns:
+        dict: Arrays 'F0', 'C_LS', 'C_HS', 'v_knee', 'R2', 'R2_LS', 'R2_HS',
+        NaN for groups with fewer than 5 samples or invalid fits.
+    """
+    v = np.asarray(v, dtype=float)
+    f = np.asarray(f, dtype=float)
+    v_fit_max = np.broadcast_to(np.asarray(v_fit_max, dtype=float), (n_groups,))
+    v_a = np.abs(v)
+    keep = v_a <= v_fit_max[group]
+    v, f, v_a, group = v[keep], f[keep], v_a[keep], group[keep]
+
+    def gsum(weights=None):
+        return np.bincount(group, weights, minlength=n_groups)
+
+    n = gsum()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        is_positive_vel = gsum(v) / n > 0
+        low = v_a < (v_fit_max * opp_vel_perc)[group]
+        n_low = np.bincount(group[low], minlength=n_groups)
+        F0 = np.where(n_low > 0, np.bincount(group[low], f[low], minlength=n_groups) / n_low, gsum(f) / n)
+
+    f_prime = f - F0[group]
+    m1 = np.minimum(v_a, v_knee)
+    m2 = np.maximum(0.0, v_a - v_knee)
+    MtM = np.stack([np.stack([gsum(m1 * m1), gsum(m1 * m2)], -1),
+                    np.stack([gsum(m1 * m2), gsum(m2 * m2)], -1)], -2)
+    Mtf = np.stack([gsum(m1 * f_prime), gsum(m2 * f_prime)], -1)
+    # pinv gives the minimum-norm solution when no sample is above the knee
+    P = np.einsum("gij,gj->gi", np.linalg.pinv(MtM), Mtf)
+    C_LS, C_HS = P[:, 0], P[:, 1]
+
+    pred = m1 * C_LS[group] + m2 * C_HS[group]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fp_mean = gsum(f_prime) / n
+        ss_res = gsum((f_prime - pred)**2)
+        ss_tot = gsum((f_prime - fp_mean[group])**2)
+        R2 = 1 - ss_res / ss_tot
+
+    sign_ok = np.where(is_positive_vel, (C_LS >= 0) & (C_HS >= 0), (C_LS <= 0) & (C_HS <= 0))
+    valid = (n >= 5) & sign_ok & ~((np.abs(C_LS) < 1e-6) & (np.abs(C_HS) < 1e-6)) & (ss_tot >= 1e-10)
+
+    def region_r2(mask):
+        g = group[mask]
+        y = f[mask]
+        y_pred = pred[mask] + F0[g]
+        cnt = np.bincount(g, minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            y_mean = np.bincount(g, y, minlength=n_groups) / cnt
+            res = np.bincount(g, (y - y_pred)**2, minlength=n_groups)
+            tot = np.bincount(g, (y - y_mean[g])**2, minlength=n_groups)
+            return np.where((cnt > 2) & (tot > 1e-10), 1 - res / tot, np.nan)
+
+    out = {
+        "F0": F0, "C_LS": C_LS, "C_HS": C_HS, "v_knee": np.full(n_groups, float(v_knee)),
+        "R2": R2, "R2_LS": region_r2(v_a <= v_knee), "R2_HS": region_r2(v_a > v_knee),
+    }
+    return {k: np.where(valid, val, np.nan) for k, val in out.items()}
+
+def characterize_run(run_samples, n_segments, params=None):
+    """
+    Vectorized process_run_data for one run.
+
+    Args:
+        run_samples (dict): 'disp', 'velocity', 'accel', 'force' and
+            'segment' (0-based segment index within the run) arrays.
+        n_segments (int): Number of segments (frequencies) of the run.
+        params (dict, optional): Overrides of DEFAULT_PARAMS.
+
+    Returns:
+        tuple: (per_segment, per_run) dicts of arrays. per_segment arrays
+        have a leading n_segments axis (bin profiles are n_segments x nbins).
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    x = np.asarray(run_samples["disp"], dtype=float)
+    v = np.asarray(run_samples["velocity"], dtype=float)
+    a = np.asarray(run_samples["accel"], dtype=float)
+    f = np.asarray(run_samples["force"], dtype=float)
+    seg = np.asarray(run_samples["segment"], dtype=np.intp)
+    S = n_segments
+    seg_out = {}
+
+    def profile(prefix, x_val, mask, nbins, axis_name):
+        centers, mean, unc, count = grouped_bin_profile(x_val[mask], f[mask], seg[mask], S, nbins)
+        seg_out[f"{prefix}/{axis_name}"] = centers
+        seg_out[f"{prefix}/mean"] = mean
+        seg_out[f"{prefix}/unc"] = unc
+        seg_out[f"{prefix}/count"] = count
+        if p["n_boot"]:
+            flat, _, _ = grouped_bin_index(x_val[mask], seg[mask], S, nbins)
+            _, low, high, _ = bootstrap_intervals(flat, f[mask], S * nbins, n_boot=p["n_boot"], seed=p["seed"])
+            seg_out[f"{prefix}/boot_low"] = low.reshape(S, nbins)
+            seg_out[f"{prefix}/boot_high"] = high.reshape(S, nbins)
+
+    # FD split by velocity sign, FV split by acceleration sign, FV_all unsplit
+    profile("FD/pos", x, v > 0, p["nbins_fd"], "disp")
+    profile("FD/neg", x, v < 0, p["nbins_fd"], "disp")
+    profile("FV/pos", v, a > 0, p["nbins_fv"], "velocity")
+    profile("FV/neg", v, a < 0, p["nbins_fv"], "velocity")
+    profile("FV_all", v, np.ones_like(v, dtype=bool), p["nbins_fv_all"], "velocity")
+
+    # per-frequency polynomial fits: groups 0..S-1 compression, S..2S-1 rebound
+    comp, reb = v > 0, v < 0
+    fit_v = np.concatenate((v[comp], v[reb]))
+    fit_f = np.concatenate((f[comp], f[reb]))
+    fit_g = np.concatenate((seg[comp], seg[reb] + S))
+    coeffs, r2 = grouped_polyfit(fit_v, fit_f, fit_g, 2 * S, p["poly_order"])
+    seg_out["FV_fit/pos/coeffs"], seg_out["FV_fit/neg/coeffs"] = coeffs[:S], coeffs[S:]
+    seg_out["FV_fit/pos/R2"], seg_out["FV_fit/neg/R2"] = r2[:S], r2[S:]
+
+    # force around the peak velocity of each frequency
+    vmax = np.full(S, -np.inf)
+    vmin = np.full(S, np.inf)
+    np.maximum.at(vmax, seg, v)
+    np.minimum.at(vmin, seg, v)
+    w = p["max_vel_bin_width"]
+    for side, vpk in (("pos", vmax), ("neg", vmin)):
+        mask = np.abs(v - vpk[seg]) <= w
+        g = seg[mask]
+        cnt = np.bincount(g, minlength=S)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(g, f[mask], minlength=S) / cnt
+        seg_out[f"maxV/{side}/mean_force"] = mean
+        seg_out[f"maxV/{side}/unc_force"] = t_halfwidth(np.bincount(g, (f[mask] - mean[g])**2, minlength=S), cnt)
+        seg_out[f"maxV/{side}/vmax"] = np.where(np.isfinite(vpk), vpk, np.nan)
+
+    # combined fits over all frequencies, each side including the low-speed
+    # part of the opposite side (opp_vel_perc of the overall peak speed)
+    vmax_total = np.max(np.abs(v[comp | reb])) if (comp | reb).any() else np.nan
+    v_thr = vmax_total * p["opp_vel_perc"]
+    pos_idx = np.flatnonzero(comp | (reb & (v > -v_thr)))
+    neg_idx = np.flatnonzero(reb | (comp & (v < v_thr)))
+    all_v = np.concatenate((v[pos_idx], v[neg_idx]))
+    all_f = np.concatenate((f[pos_idx], f[neg_idx]))
+    all_g = np.concatenate((np.zeros(pos_idx.size, dtype=np.intp), np.ones(neg_idx.size, dtype=np.intp)))
+
+    run_out = {"Vmax_total": np.array(vmax_total)}
+    coeffs, r2 = grouped_polyfit(all_v, all_f, all_g, 2, p["poly_order"])
+    pw = grouped_piecewise_fit(all_v, all_f, all_g, 2, vmax_total, p["v_knee"], p["opp_vel_perc"])
+    for i, side in enumerate(("pos", "neg")):
+        run_out[f"FV_fit_all/{side}/coeffs"] = coeffs[i]
+        run_out[f"FV_fit_all/{side}/R2"] = np.array(r2[i])
+        for name, values in pw.items():
+            run_out[f"PW_fit_all/{side}/{name}"] = np.array(values[i])
+    return seg_out, run_out
+
+def _run_job(args):
+    run_samples, n_segments, params = args
+    return characterize_run(run_samples, n_segments, params)
+
+def _run_digest(run_samples, params):
+    h = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    for name in ("disp", "velocity", "accel", "force", "segment"):
+        h.update(np.ascontiguousarray(run_samples[name]).tobytes())
+    return h.hexdigest()
+
+
+class Characterization:
+    """
+    Columnar equivalent of data_wrangler.m's results struct.
+
+    'segments' holds one row per (run, frequency) of the dataset, keyed like
+    the MATLAB fields with '/' separators (e.g. 'FV/pos/mean' is an
+    (n_segments x nbins_fv) array); 'runs' holds one row per run for the
+    combined FV_fit_all / PW_fit_all fits.
+    """
+
+    def __init__(self, segments, runs, params):
+        self.segments = segments
+        self.runs = runs
+        self.params = params
+
+    def save(self, path):
+        arrays = {f"segments:{k}": v for k, v in self.segments.items()}
+        arrays.update({f"runs:{k}": v for k, v in self.runs.items()})
+        np.savez(path, params=np.array(json.dumps(self.params)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            segments = {k.split(":", 1)[1]: data[k] for k in data.files if k.startswith("segments:")}
+            runs = {k.split(":", 1)[1]: data[k] for k in data.files if k.startswith("runs:")}
+            params = json.loads(str(data["params"]))
+        return cls(segments, runs, params)
+
+
+def characterize(dataset, params=None, workers=None, cache_dir=None):
+    """
+    Runs the characterization over every run of a ConditionedDataset.
+
+    Runs are processed in a process pool. With cache_dir set, each run's
+    result is stored under a hash of its samples and the parameters, so only
+    runs whose inputs changed are recomputed on the next call.
+
+    Returns:
+        Characterization
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    seg_run = dataset.segments["run"]
+    n_runs = len(dataset.runs)
+
+    jobs, digests, results = [], [], [None] * n_runs
+    for r in range(n_runs):
+        rows = np.flatnonzero(seg_run == r)
+        if rows.size:
+            sl = slice(dataset.segments["start"][rows[0]], dataset.segments["stop"][rows[-1]])
+        else:
+            sl = slice(0, 0)
+        run_samples = {name: dataset.samples[name][sl] for name in ("disp", "velocity", "accel", "force")}
+        run_samples["segment"] = dataset.samples["segment"][sl] - (rows[0] if rows.size else 0)
+        digest = _run_digest(run_samples, p) if cache_dir else None
+        cached = os.path.join(cache_dir, f"{digest}.npz") if cache_dir else None
+        if cached and os.path.exists(cached):
+            with np.load(cached) as data:
+                results[r] = ({k[4:]: data[k] for k in data.files if k.startswith("seg:")},
+                              {k[4:]: data[k] for k in data.files if k.startswith("run:")})
+        else:
+            jobs.append((r, (run_samples, rows.size, p)))
+        digests.append(cached)
+
+    if jobs:
+        logging.info(f"Characterization: computing {len(jobs)} of {n_runs} run(s)")
+        if len(jobs) == 1 or workers == 1:
+            computed = [_run_job(job) for _, job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                computed = list(pool.map(_run_job, [job for _, job in jobs]))
+        for (r, _), result in zip(jobs, computed):
+            results[r] = result
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+                arrays = {f"seg:{k}": val for k, val in result[0].items()}
+                arrays.update({f"run:{k}": val for k, val in result[1].items()})
+                np.savez(digests[r], **arrays)
+
+    segments = {k: np.concatenate([res[0][k] for res in results]) for k in results[0][0]} if n_runs else {}
+    segments["run"] = seg_run.copy()
+    segments["freq_hz"] = dataset.segments["freq_hz"].copy()
+    runs = {k: np.stack([res[1][k] for res in results]) for k in results[0][1]} if n_runs else {}
+    return Characterization(segments, runs, p)
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+
+from events import start_logging, stop_logging
+
+# Only the standard library is imported here. SciPy, Matplotlib, Tk and
+# NI-DAQmx are imported by the commands that need them, so scripted runs
+# and `--help` start without loading the GUI stack.
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+def setup_logging(verbose=False):
+    """Logs to stderr (progress lines go to stdout) and to damper_dyno_cli.log on a background thread."""
+    start_logging([
+        logging.FileHandler("damper_dyno_cli.log", mode="w"),
+        logging.StreamHandler(sys.stderr)
+    ], level=logging.DEBUG if verbose else logging.INFO)
+
+def load_settings(path, overrides=None):
+    """Reads a config.json and applies {key: value} overrides (None values are ignored)."""
+    with open(path, "r") as f:
+        settings = json.load(f)
+    settings.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    return settings
+
+def parse_values(text):
+    """'1,2,5' or 'start:stop:step' (stop inclusive) -> list of floats."""
+    if ":" in text:
+        start, stop, step = (float(v) for v in text.split(":"))
+        n = int(round((stop - start) / step)) + 1
+        return [start + i * step for i in range(n)]
+    return [float(v) for v in text.split(",") if v]
+
+def progress(message):
+    print(message, flush=True)
+
+
+# --- run ---
+
+def _make_daq(args, settings, config):
+    """Hardware DAQController, or a paced replay/synthetic stand-in for hardware-free runs."""
+    if args.replay or args.simulate:
+        from benchmark import PacedDAQ, ReplaySource, SyntheticSource
+        n_channels = 4 if settings.get('hlfb_enable', 0) else 3
+        source = (ReplaySource(args.replay, n_channels) if args.replay
+                  else SyntheticSource.from_settings(settings, n_channels, rpm=config.segment_rpm[0]))
+        return PacedDAQ(source)
+    from daq import DAQController
+    return DAQController(settings.get("daq_device_name", "Dev1"))
+
+def _drain(manager):
+    """Consumes the GUI packets of a headless run; returns (samples, last packet)."""
+    samples, last = 0, None
+    while True:
+        try:
+            packet = manager.gui_queue.get_nowait()
+        except queue.Empty:
+            return samples, last
+        if isinstance(packet, dict) and 'times' in packet:
+            samples += len(packet['times'])
+            last = packet
+
+def cmd_run(args):
+    from run_config import compile_run_config
+    from test_manager import TestManager
+
+    settings = load_settings(args.config, {
+        'default_linear_speed_ips': args.speed,
+        'default_num_cycles': args.cycles,
+        'output_dir': args.output_dir,
+        'sample_rate': args.sample_rate,
+    })
+    config = compile_run_config(settings, mode=args.mode)
+    daq = _make_daq(args, settings, config)
+    manager = TestManager(daq)
+    n_segments = len(config.segment_rpm)
+    total_s = sum(config.segment_duration_s)
+    progress(f"{args.mode} run: {n_segments} segment(s), {total_s:.1f} s at {config.sample_rate} Hz")
+
+    start = time.perf_counter()
+    samples = 0
+    try:
+        if not manager.run_test(config):
+            return 1
+        while not manager.test_done.wait(args.progress_interval):
+            n, packet = _drain(manager)
+            samples += n
+            line = (f"[{time.perf_counter() - start:6.1f} s] segment {manager.current_segment + 1}/{n_segments}, "
+                    f"{manager.current_target_rpm:.0f} RPM, {samples} samples")
+            if packet is not None:
+                line += f", temp {packet['temp']:.1f} C"
+                if packet.get('torque') is not None:
+                    line += f", torque {packet['torque']:.2f} Nm"
+            progress(line)
+    except KeyboardInterrupt:
+        progress("Interrupted -> stopping motor and acquisition.")
+        daq.stop_motor()
+        daq.stop_acquisition()
+        return 130
+    finally:
+        manager.close()
+        daq.close()
+
+    samples += _drain(manager)[0]
+    for segment, stats in manager.get_segment_summary().items():
+        if stats['count']:
+            progress(f"segment {segment + 1}: force p1={stats['p1']:.1f} N, p50={stats['p50']:.1f} N, "
+                     f"p99={stats['p99']:.1f} N")
+    if manager.last_saved_path is None:
+        logging.error("Run data was not saved.")
+        return 1
+    progress(f"done: {samples} samples in {time.perf_counter() - start:.1f} s -> {manager.last_saved_path}")
+    return 0
+
+
+# --- sweep ---
+
+def cmd_sweep(args):
+    from torque_model import sizing_sweep
+
+    settings = load_settings(args.config)
+    speeds, gear_ratios = parse_values(args.speeds), parse_values(args.gear_ratios)
+    designs = [{
+        'R': float(settings['crank_radius_in']),
+        'Lc': float(settings['rod_length_in']),
+        'mechanism': mechanism,
+        'moving_mass_lb': args.moving_mass,
+        'friction_lbf': args.friction,
+        'efficiency': args.efficiency,
+        'damper': {'model': 'ohlins', 'scale': args.damper_scale},
+    } for mechanism in args.mechanism]
+    results = sizing_sweep(designs, speeds, gear_ratios, torque_map=settings['motor_max_torque_map'],
+                           workers=args.workers)
+
+    for result in results:
+        design = result['design']
+        for g, gr in enumerate(result['gear_ratios']):
+            ok = result['feasible'][g]
+            top = int(ok.nonzero()[0].max()) if ok.any() else None
+            if top is None:
+                progress(f"{design['mechanism']} GR {gr:g}: no feasible speed")
+            else:
+                progress(f"{design['mechanism']} GR {gr:g}: up to {result['linear_speeds'][top]:g} in/s "
+                         f"(peak {result['peak_torque_nm'][g, top]:.2f} Nm, "
+                         f"margin {result['margin'][g, top]:.2f} Nm at {result['motor_rpm'][g, top]:.0f} RPM)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([{k: v.tolist() if hasattr(v, 'tolist') else v for k, v in r.items()} for r in results],
+                      f, indent=1)
+        progress(f"saved sweep to {args.output}")
+    return 0
+
+
+# --- export ---
+
+def cmd_export(args):
+    from ingest import find_csvs
+    from conditioning import condition_files
+    from characterization import characterize
+    from surrogate import build_surrogate
+
+    paths = [p for folder in args.folders for p in find_csvs(folder, recursive=not args.no_recursive)]
+    if not paths:
+        logging.error(f"No capture CSVs found under {', '.join(args.folders)}.")
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    progress(f"conditioning {len(paths)} file(s)")
+    dataset = condition_files(paths, cache_dir=args.cache_dir, workers=args.workers)
+    dataset.save(os.path.join(args.output_dir, "dataset.npz"))
+
+    progress(f"characterizing {len(dataset)} run(s)")
+    results = characterize(dataset, workers=args.workers,
+                           cache_dir=os.path.join(args.cache_dir, "fits") if args.cache_dir else None)
+    results.save(os.path.join(args.output_dir, "characterization.npz"))
+
+    surrogate = build_surrogate(dataset, results)
+    if len(surrogate.keys):
+        surrogate.save(os.path.join(args.output_dir, "surrogate.npz"))
+    else:
+        progress("no runs with valving settings in their name; surrogate skipped")
+    progress(f"done in {time.perf_counter() - start:.1f} s -> {args.output_dir}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless damper dyno runs, sweeps and exports.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="config.json to use.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Debug logging.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run a single-speed or profile test.")
+    run.add_argument("mode", choices=("single", "profile"))
+    run.add_argument("--speed", type=float, help="Linear speed [in/s] of a single run.")
+    run.add_argument("--cycles", type=int, help="Crank cycles of a single run.")
+    run.add_argument("--sample-rate", type=int, help="Override sample_rate [Hz].")
+    run.add_argument("--output-dir", help="Override output_dir.")
+    source = run.add_mutually_exclusive_group()
+    source.add_argument("--replay", help="Replay the raw voltages of a capture CSV instead of the DAQ.")
+    source.add_argument("--simulate", action="store_true", help="Synthetic data instead of the DAQ.")
+    run.add_argument("--progress-interval", type=float, default=1.0, help="Seconds between progress lines.")
+    run.set_defaults(func=cmd_run)
+
+    sweep = commands.add_parser("sweep", help="Motor torque sizing sweep over speeds and gear ratios.")
+    sweep.add_argument("--speeds", default="1:10:0.5", help="Linear speeds [in/s], 'a,b,c' or 'start:stop:step'.")
+    sweep.add_argument("--gear-ratios", default="10", help="Gear ratios, 'a,b,c' or 'start:stop:step'.")
+    sweep.add_argument("--mechanism", nargs="+", default=["slider_crank"], choices=("slider_crank", "scotch_yoke"))
+    sweep.add_argument("--moving-mass", type=float, default=2.0, help="Reciprocating mass [lb].")
+    sweep.add_argument("--friction", type=float, default=0.0, help="Slide friction [lbf].")
+    sweep.add_argument("--efficiency", type=float, default=1.0, help="Gearbox efficiency.")
+    sweep.add_argument("--damper-scale", type=float, default=1.0, help="Scale of the firmest Ohlins damper force.")
+    sweep.add_argument("--workers", type=int, help="Process pool size.")
+    sweep.add_argument("--output", help="Save the sweep as JSON.")
+    sweep.set_defaults(func=cmd_sweep)
+
+    export = commands.add_parser("export", help="Condition, characterize and fit capture folders.")
+    export.add_argument("folders", nargs="+", help="Folders of capture CSVs.")
+    export.add_argument("--output-dir", default="export", help="Where the .npz results are written.")
+    export.add_argument("--cache-dir", help="Ingest and fit cache directory.")
+    export.add_argument("--no-recursive", action="store_true", help="Do not search subfolders.")
+    export.add_argument("--workers", type=int, help="Process pool size.")
+    export.set_defaults(func=cmd_export)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logging(args.verbose)
+    try:
+        return args.func(args)
+    except (KeyError, ValueError, OSError) as e:
+        logging.error(f"{args.command} failed: {e}")
+        return 1
+    finally:
+        stop_logging()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.signal import butter, filtfilt
+from catalog import parse_test_name
+from ingest import ColumnarCache, ingest_csvs, parse_csv
+from kinematics import GEAR_RATIO
+from stroke_reference import MM_PER_IN
+
+N_PER_LBF = 4.448  # as used by read_data.m
+DEFAULT_TRIM_START = 0.4  # s dropped at the start of every segment
+DEFAULT_TRIM_END = 2.0    # s dropped at the end of the highest-RPM segment
+
+# Per-sample columns of a conditioned dataset, in read_data.m units
+SAMPLE_COLUMNS = ("time", "disp", "velocity", "accel", "force", "temp")
+
+def matlab_gradient(y, t):
+    """
+    MATLAB gradient(y, t) for a sample-point vector t: central differences
+    (y[i+1] - y[i-1]) / (t[i+1] - t[i-1]) inside, one-sided at the ends.
+    """
+    y = np.asarray(y, dtype=float)
+    t = np.asarray(t, dtype=float)
+    g = np.empty_like(y)
+    if y.size < 2:
+        g[:] = 0.0
+        return g
+    g[1:-1] = (y[2:] - y[:-2]) / (t[2:] - t[:-2])
+    g[0] = (y[1] - y[0]) / (t[1] - t[0])
+    g[-1] = (y[-1] - y[-2]) / (t[-1] - t[-2])
+    return g
+
+def frequency_field(freq_hz):
+    """read_data.m field name of a segment, e.g. 1.0526 Hz -> 'f1_053'."""
+    return f"f{freq_hz:.3f}".replace(".", "_").replace("-", "_")
+
+def _lowpass(x, fc, fs):
+    b, a = butter(2, fc / (fs / 2))
+    # MATLAB's filtfilt pads with 3 * (filter order) samples
+    return filtfilt(b, a, x, padlen=min(3 * (max(len(a), len(b)) - 1), x.size - 1))
+
+def condition_columns(columns, fc=15.0, fc_temp=1.0, trim_start=DEFAULT_TRIM_START, trim_end=DEFAULT_TRIM_END,
+                      gear_ratio=GEAR_RATIO):
+    """
+    Vectorized port of the per-file conditioning in read_data.m.
+
+    Displacement is converted to inches, centred on its midpoint and
+    zero-phase filtered; velocity and acceleration are its gradients;
+    force is converted to lbf and temperature is smoothed. Samples are then
+    split by commanded RPM (segments in ascending RPM order, like unique()),
+    trim_start seconds are dropped from the start of every segment and
+    trim_end seconds from the end of the highest-RPM one. Files without an
+    RPM column are treated as one segment trimmed at both ends.
+
+    Args:
+        columns (dict): Parsed capture columns (see ingest.parse_csv).
+        fc (float): Displacement low-pass cutoff [Hz].
+        fc_temp (float): Temperature low-pass cutoff [Hz].
+        trim_start (float): Seconds dropped at the start of each segment.
+        trim_end (float): Seconds dropped at the end of the last segment.
+        gear_ratio (float): Motor/crank ratio; segment RPM is the crank RPM.
+
+    Returns:
+        tuple: (samples, segments) where samples maps SAMPLE_COLUMNS to
+        arrays ordered segment by segment, and segments maps 'rpm',
+        'freq_hz', 'start' and 'stop' (row slices into samples) to arrays.
+    """
+    t = np.asarray(columns["time_s"], dtype=float)
+    fs = 1.0 / np.mean(np.diff(t))
+
+    disp_in = np.asarray(columns["Displacement (mm)"], dtype=float) / MM_PER_IN
+    disp_norm = disp_in - (disp_in.min() + disp_in.max()) / 2
+    disp = _lowpass(disp_norm, fc, fs)
+    vel = matlab_gradient(disp, t)
+    acc = matlab_gradient(vel, t)
+    force = np.asarray(columns["Force (N)"], dtype=float) / N_PER_LBF
+    temp = _lowpass(np.asarray(columns["Temperature (C)"], dtype=float), fc_temp, fs)
+
+    if "RPM" in columns:
+        rpm_raw = np.asarray(columns["RPM"], dtype=float)
+        unique_rpm, first, seg = np.unique(rpm_raw, return_index=True, return_inverse=True)
+        last = rpm_raw.size - 1 - np.unique(rpm_raw[::-1], return_index=True)[1]
+        crank_rpm = unique_rpm / gear_ratio
+    else:
+        seg = np.zeros(t.size, dtype=int)
+        first, last = np.array([0]), np.array([t.size - 1])
+        crank_rpm = np.array([np.nan])
+    n_seg = first.size
+
+    # time relative to each segment's first sample
+    t_seg = t - t[first][seg]
+    seg_len = t[last] - t[first]
+    keep = t_seg >= trim_start
+    keep &= (seg != n_seg - 1) | (t_seg <= seg_len[n_seg - 1] - trim_end)
+
+    # gather kept samples grouped by segment, preserving time order inside each
+    order = np.flatnonzero(keep)
+    order = order[np.argsort(seg[order], kind="stable")]
+    counts = np.bincount(seg[order], minlength=n_seg)
+    stop = np.cumsum(counts)
+
+    samples = {
+        "time": t_seg[order],
+        "disp": disp[order],
+        "velocity": vel[order],
+        "accel": acc[order],
+        "force": force[order],
+        "temp": temp[order],
+    }
+    segments = {
+        "rpm": crank_rpm,
+        "freq_hz": crank_rpm / 60.0,
+        "start": stop - counts,
+        "stop": stop,
+    }
+    return samples, segments
+
+def _condition_job(args):
+    """Process pool worker: condition one file from the cache or the CSV."""
+    path, cache_dir, key, params = args
+    columns = ColumnarCache(cache_dir).load(key) if key is not None else parse_csv(path)
+    return condition_columns(columns, **params)
+
+
+class ConditionedDataset:
+    """
+    Columnar replacement for read_data.m's nested test_data struct.
+
+    All runs are stored as flat per-sample columns (SAMPLE_COLUMNS plus the
+    run and segment index of each sample) with a segments table giving each
+    (run, frequency) slice and a runs table with the file and valving of
+    each run, so selections are array slices rather than struct walks.
+    """
+
+    def __init__(self, samples, segments, runs):
+        self.samples = samples
+        self.segments = segments
+        self.runs = runs
+
+    def __len__(self):
+        return len(self.runs)
+
+    def run_names(self):
+        return [r["name"] for r in self.runs]
+
+    def run_index(self, run):
+        """Index of a run given as index, name ('r3') or file path."""
+        if isinstance(run, (int, np.integer)):
+            return int(run)
+        for i, r in enumerate(self.runs):
+            if run in (r["name"], r["path"]):
+                return i
+        raise KeyError(f"Run '{run}' not in dataset.")
+
+    def segment_rows(self, run=None):
+        """Indices into the segments table, optionally for one run."""
+        if run is None:
+            return np.arange(self.segments["run"].size)
+        return np.flatnonzero(self.segments["run"] == self.run_index(run))
+
+    def frequency_fields(self, run):
+        return [frequency_field(f) for f in self.segments["freq_hz"][self.segment_rows(run)]]
+
+    def segment(self, run, field):
+        """
+        Samples of one run/frequency as views, e.g. segment('r3', 'f1_053')
+        matches test_data.r3.f1_053 of read_data.m.
+        """
+        for row in self.segment_rows(run):
+            if frequency_field(self.segments["freq_hz"][row]) == field:
+                sl = slice(self.segments["start"][row], self.segments["stop"][row])
+                out = {name: self.samples[name][sl] for name in SAMPLE_COLUMNS}
+                out["RPM"] = float(self.segments["rpm"][row])
+                return out
+        raise KeyError(f"Frequency '{field}' not in run '{run}'.")
+
+    def save(self, path):
+        """Saves the dataset as a single .npz (runs table stored as JSON)."""
+        arrays = {f"samples/{k}": v for k, v in self.samples.items()}
+        arrays.update({f"segments/{k}": v for k, v in self.segments.items()})
+        np.savez(path, runs=np.array(json.dumps(self.runs)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            samples = {k.split("/", 1)[1]: data[k] for k in data.files if k.startswith("samples/")}
+            segments = {k.split("/", 1)[1]: data[k] for k in data.files if k.startswith("segments/")}
+            runs = json.loads(str(data["runs"]))
+        return cls(samples, segments, runs)
+
+
+def _run_info(path, index):
+    fields = parse_test_name(path)
+    name = f"r{fields['run']}" if fields["scheme"] == "run" else os.path.splitext(os.path.basename(path))[0]
+    info = {"name": name, "path": os.path.abspath(path), "index": index}
+    if "hsc" in fields:
+        info["valving"] = {k: fields[k] for k in ("hsc", "hsr", "lsc", "lsr")}
+    return info
+
+def condition_files(paths, cache_dir=None, workers=None, **params):
+    """
+    Conditions many capture files in parallel into one ConditionedDataset.
+
+    Args:
+        paths (list): Capture CSV paths (one run each).
+        cache_dir (str, optional): Ingest cache; files are read from it
+            (ingesting misses first) instead of re-parsing the CSVs.
+        workers (int, optional): Process pool size, default os.cpu_count().
+        **params: Forwarded to condition_columns (fc, fc_temp, trim_start, ...).
+
+    Returns:
+        ConditionedDataset
+    """
+    paths = list(paths)
+    keys = ingest_csvs(paths, cache_dir, workers=workers) if cache_dir else {}
+    jobs = [(path, cache_dir, keys.get(path), params) for path in paths]
+
+    if len(jobs) <= 1 or workers == 1:
+        results = [_condition_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_condition_job, jobs))
+
+    runs = [_run_info(path, i) for i, path in enumerate(paths)]
+    offsets = np.cumsum([0] + [r[0]["time"].size for r in results])
+
+    samples = {name: np.concatenate([r[0][name] for r in results]) if results else np.empty(0)
+               for name in SAMPLE_COLUMNS}
+    samples["run"] = np.repeat(np.arange(len(results)), np.diff(offsets)).astype(np.int32)
+    segments = {
+        "run": np.concatenate([np.full(r[1]["rpm"].size, i, dtype=np.int32) for i, r in enumerate(results)]
+                              if results else [np.empty(0, dtype=np.int32)]),
+    }
+    for name in ("rpm", "freq_hz"):
+        segments[name] = np.concatenate([r[1][name] for r in results]) if results else np.empty(0)
+    for name in ("start", "stop"):
+        segments[name] = (np.concatenate([r[1][name] + offsets[i] for i, r in enumerate(results)])
+                          if results else np.empty(0, dtype=int))
+    samples["segment"] = np.repeat(np.arange(segments["run"].size), segments["stop"] - segments["start"]).astype(np.int32)
+
+    logging.info(f"Conditioned {len(runs)} run(s), {segments['run'].size} segment(s), {samples['time'].size} samples")
+    return ConditionedDataset(samples, segments, runs)
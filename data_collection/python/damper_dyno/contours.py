@@ -0,0 +1,176 @@
+from functools import lru_cache
+import numpy as np
+from scipy.spatial import Delaunay
+
+from conditioning import N_PER_LBF
+from surrogate import PW_NAMES, build_surrogate
+
+# (low-speed column, high-speed column) of the surrogate keys and the fit side of each direction
+DIRECTIONS = {
+    "comp": {"axes": (2, 0), "side": 0, "names": ("lsc", "hsc")},
+    "reb": {"axes": (3, 1), "side": 1, "names": ("lsr", "hsr")},
+}
+DEFAULT_RESOLUTION = 25  # GRID_RESOLUTION of linear_contours.m
+
+@lru_cache(maxsize=16)
+def _triangulation(points):
+    """Delaunay triangulation of a tuple of (ls, hs) points, built once per point set."""
+    return Delaunay(np.array(points, dtype=float))
+
+def _barycentric(tri, query):
+    """
+    Vertex indices and barycentric weights of query points (N x 2) in a
+    triangulation; vertex -1 and NaN weights outside the convex hull.
+    """
+    simplex = tri.find_simplex(query)
+    inside = simplex >= 0
+    T = tri.transform[np.maximum(simplex, 0)]
+    b = np.einsum("nij,nj->ni", T[:, :2], query - T[:, 2])
+    weights = np.column_stack((b, 1.0 - b.sum(axis=1)))
+    vertices = tri.simplices[np.maximum(simplex, 0)]
+    weights[~inside] = np.nan
+    vertices[~inside] = -1
+    return vertices, weights
+
+@lru_cache(maxsize=16)
+def _grid_weights(points, resolution):
+    """Axes and barycentric weights of the dense contour grid of a point set (cached)."""
+    tri = _triangulation(points)
+    pts = np.array(points, dtype=float)
+    ls = np.linspace(pts[:, 0].min(), pts[:, 0].max(), resolution)
+    hs = np.linspace(pts[:, 1].min(), pts[:, 1].max(), resolution)
+    LS, HS = np.meshgrid(ls, hs)
+    vertices, weights = _barycentric(tri, np.column_stack((LS.ravel(), HS.ravel())))
+    return ls, hs, vertices, weights
+
+
+class ContourEngine:
+    """
+    Cached scattered-data interpolation of damper fit results over click settings.
+
+    Port of the griddata(..., 'linear') maps of linear_contours.m and
+    polynomial_contours.m: compression results are interpolated over
+    (LSC, HSC) and rebound results over (LSR, HSR). The Delaunay
+    triangulation and the barycentric weights of the dense grid depend only
+    on the measured settings, so they are cached per set of settings points
+    (shared by every engine and result table measured at the same clicks) and
+    any coefficient map (or the force at any velocity) is a single gather
+    and weighted sum over the grid.
+
+    Runs sharing the same two settings of a direction are averaged, as
+    griddata does for duplicate points.
+    """
+
+    def __init__(self, surrogate, resolution=DEFAULT_RESOLUTION):
+        """
+        Args:
+            surrogate (DamperSurrogate): Per-run fit table (see build_surrogate).
+            resolution (int): Points per axis of the dense contour grids.
+        """
+        self.surrogate = surrogate
+        self.resolution = int(resolution)
+        self._points = {}
+        for direction, d in DIRECTIONS.items():
+            xy = surrogate.keys[:, list(d["axes"])]
+            unique, inverse = np.unique(xy, axis=0, return_inverse=True)
+            self._points[direction] = (tuple(map(tuple, unique)), inverse.ravel())
+
+    @classmethod
+    def from_results(cls, dataset, characterization, **kwargs):
+        """Builds the engine from a ConditionedDataset and its Characterization."""
+        return cls(build_surrogate(dataset, characterization), **kwargs)
+
+    # --- per-run values ---
+
+    def run_values(self, name, direction, velocity=None, model="pw"):
+        """
+        Values of one quantity for every run of the table.
+
+        Args:
+            name (str): 'F0', 'C_LS', 'C_HS', 'v_knee', a polynomial
+                coefficient 'a0'..'aN' (a_k multiplies v^k) or 'force'.
+            direction (str): 'comp' or 'reb'.
+            velocity (float): Velocity [in/s] for name='force' (sign is taken
+                from the direction).
+            model (str): 'pw' or 'poly' fit for name='force'.
+        """
+        side = DIRECTIONS[direction]["side"]
+        s = self.surrogate
+        if name in PW_NAMES:
+            return s.pw[:, side, PW_NAMES.index(name)]
+        if name.startswith("a") and name[1:].isdigit():
+            power = int(name[1:])
+            return s.poly[:, side, s.poly.shape[2] - 1 - power]
+        if name == "force":
+            if velocity is None:
+                raise ValueError("velocity is required for force maps.")
+            v = abs(float(velocity)) * (1 if side == 0 else -1)
+            if model == "poly":
+                return np.polynomial.polynomial.polyval(v, s.poly[:, side, ::-1].T)
+            F0, C_LS, C_HS, v_knee = np.moveaxis(s.pw[:, side], -1, 0)
+            return F0 + C_LS * np.minimum(abs(v), v_knee) + C_HS * np.maximum(0.0, abs(v) - v_knee)
+        raise ValueError(f"Unknown contour quantity '{name}'.")
+
+    def _point_values(self, values, direction):
+        """Averages run values onto the unique settings points of a direction."""
+        points, inverse = self._points[direction]
+        counts = np.bincount(inverse, minlength=len(points))
+        return np.bincount(inverse, values, minlength=len(points)) / counts
+
+    # --- maps and queries ---
+
+    def grid(self, direction):
+        """(ls_axis, hs_axis) of the dense grid of a direction."""
+        ls, hs, _, _ = _grid_weights(self._points[direction][0], self.resolution)
+        return ls, hs
+
+    def field(self, name, direction, velocity=None, model="pw"):
+        """
+        Dense contour map of a quantity.
+
+        Returns:
+            tuple: (ls_axis, hs_axis, Z) with Z of shape (len(hs_axis), len(ls_axis)),
+            NaN outside the measured settings' convex hull.
+        """
+        ls, hs, vertices, weights = _grid_weights(self._points[direction][0], self.resolution)
+        vals = self._point_values(self.run_values(name, direction, velocity, model), direction)
+        Z = np.sum(vals[np.maximum(vertices, 0)] * weights, axis=1)
+        return ls, hs, Z.reshape(hs.size, ls.size)
+
+    def at(self, ls, hs, name, direction, velocity=None, model="pw"):
+        """Interpolated quantity at arbitrary (ls, hs) settings (broadcast arrays)."""
+        ls, hs = np.broadcast_arrays(np.asarray(ls, dtype=float), np.asarray(hs, dtype=float))
+        tri = _triangulation(self._points[direction][0])
+        vertices, weights = _barycentric(tri, np.column_stack((ls.ravel(), hs.ravel())))
+        vals = self._point_values(self.run_values(name, direction, velocity, model), direction)
+        return np.sum(vals[np.maximum(vertices, 0)] * weights, axis=1).reshape(ls.shape)
+
+    def inverse(self, force, velocity, direction=None, step=1.0, n=5, unit="lbf", model="pw"):
+        """
+        Settings giving a target force at a velocity ("what clicks give X N at Y in/s").
+
+        Args:
+            force (float): Target force (signed as the fit: rebound forces negative).
+            velocity (float): Velocity [in/s]; its sign picks the direction
+                unless direction is given.
+            step (float): Spacing of the candidate settings (1 = whole clicks).
+            n (int): Number of candidates returned.
+            unit (str): 'lbf' or 'N' for the target force.
+
+        Returns:
+            list: Up to n dicts with the two settings, the interpolated 'force'
+            (in the requested unit) and its 'error', best first.
+        """
+        if direction is None:
+            direction = "comp" if velocity >= 0 else "reb"
+        scale = N_PER_LBF if unit == "N" else 1.0
+        pts = np.array(self._points[direction][0])
+        ls = np.arange(np.ceil(pts[:, 0].min() / step), np.floor(pts[:, 0].max() / step) + 1) * step
+        hs = np.arange(np.ceil(pts[:, 1].min() / step), np.floor(pts[:, 1].max() / step) + 1) * step
+        LS, HS = np.meshgrid(ls, hs)
+        F = self.at(LS, HS, "force", direction, velocity, model) * scale
+        error = np.abs(F - force).ravel()
+        order = [i for i in np.argsort(error, kind="stable") if np.isfinite(error[i])][:n]
+        names = DIRECTIONS[direction]["names"]
+        return [{names[0]: float(LS.flat[i]), names[1]: float(HS.flat[i]),
+                 "force": float(F.flat[i]), "error": float(error[i])} for i in order]
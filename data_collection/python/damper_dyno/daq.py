@@ -2,10 +2,12 @@ import nidaqmx
 import numpy as np
 import datetime
 import threading
-from nidaqmx.constants import TerminalConfiguration, AcquisitionType
+from nidaqmx.constants import TerminalConfiguration, AcquisitionType, Edge
 from nidaqmx.types import CtrFreq
 import time
 import logging
+from profiling import profiler
+from events import events
 
 class DAQController:
     def __init__(self, device_name="Dev1"):
@@ -13,9 +15,11 @@ class DAQController:
         Initialize the DAQ controller.
         """
         self.ai_task = None
+        self.ci_task = None
         self.pwm_task = None
         self.do_task = None
         self.pwm_frequency = None
+        self.total_samples_acquired = 0
 
         # Run-profile related
         self.run_profile = None
@@ -29,6 +33,7 @@ class DAQController:
         self.stop_event = threading.Event()
         self.motor_enable_pin = f"{self.device_name}/port1/line1"
         self.pwm_output_pin = f"{self.device_name}/ctr0"
+        self.hlfb_counter = f"{self.device_name}/ctr1"  # motor HLFB PWM (torque) input
 
     def enable_motor(self):
         if self.do_task:
@@ -55,6 +60,10 @@ class DAQController:
                 self.do_task.close()
                 self.do_task = None
 
+    def _sample_index(self):
+        """Samples acquired so far in the running acquisition (None when not acquiring), for events."""
+        return self.total_samples_acquired if self.ai_task is not None else None
+
     def configure_motor_pwm(self, frequency=1000):
         if self.pwm_task:
             self.pwm_task.close()
@@ -78,7 +87,8 @@ class DAQController:
             
         # Before starting the task, set the duty cycle as a property.
         safe_duty = max(min(duty_cycle / 100.0, 1.0), 0.0)
-        logging.info(f"Setting initial PWM property to Duty Cycle: {safe_duty:.3f}")
+        events.emit("pwm_start", self._sample_index(), "Setting initial PWM property to Duty Cycle: {duty:.3f}",
+                    duty=safe_duty)
         self.pwm_task.co_channels.all.co_pulse_duty_cyc = safe_duty
 
         try:
@@ -98,16 +108,17 @@ class DAQController:
 
         safe_duty = max(min(duty_cycle / 100.0, 1.0), 0.0) 
         
-        logging.info(f"Writing to running task >> Freq: {self.pwm_frequency} Hz, Duty Cycle: {safe_duty:.2f}")
-        
         try:
             # Create the required CtrFreq object
             sample = CtrFreq(freq=self.pwm_frequency, duty_cycle=safe_duty)
             # Write the sample to the running task
             self.pwm_task.write(sample, timeout=2.0)
-            logging.info("Successfully wrote new CtrFreq sample to PWM task.")
+            events.emit("pwm_write", self._sample_index(),
+                        "Wrote PWM sample to running task >> Freq: {freq} Hz, Duty Cycle: {duty:.2f}",
+                        freq=self.pwm_frequency, duty=safe_duty)
         except nidaqmx.errors.DaqError as e:
-            logging.info(f"Error writing new CtrFreq sample: {e}")
+            events.emit("pwm_error", self._sample_index(), "Error writing new CtrFreq sample: {error}",
+                        level=logging.ERROR, freq=self.pwm_frequency, duty=safe_duty, error=str(e))
 
     def stop_motor(self, slowdown_time=1.0):
         """
@@ -145,16 +156,27 @@ class DAQController:
             return 0
 
         try:
+            t0 = profiler.tic()
             raw_data = self.ai_task.read(number_of_samples_per_channel=number_of_samples)
             data = np.array(raw_data)
             if data.ndim == 1:
                 data = data.reshape((1, -1))
+
+            # HLFB duty cycle shares the AI sample clock, so it is appended as an extra row (%)
+            if self.ci_task is not None:
+                try:
+                    duty = np.asarray(self.ci_task.read(number_of_samples_per_channel=data.shape[1]), dtype=float)
+                except nidaqmx.errors.DaqError as e:
+                    logging.info(f"Warning reading HLFB counter: {e}")
+                    duty = np.full(data.shape[1], np.nan)
+                data = np.vstack((data, 100.0 * duty.reshape(1, -1)))
             
             times = [
                 self.start_time + datetime.timedelta(seconds=(self.total_samples_acquired + i) / self.sample_rate)
                 for i in range(data.shape[1])
             ]
             self.total_samples_acquired += data.shape[1]
+            profiler.toc("daq_read", t0, data.shape[1])
 
             if self.data_callback:
                 self.data_callback(times, data)
@@ -163,10 +185,56 @@ class DAQController:
             logging.info(f"Error in DAQ callback: {e}")
             return 1
 
-    def start_acquisition(self, analog_channels, mode, sample_rate, chunk_size, callback):
+    def _start_hlfb_counter(self, sample_rate):
+        """
+        Configures a duty-cycle counter input for the motor HLFB PWM signal,
+        clocked by the AI sample clock so every analog sample has a duty reading.
+        Must be started before the AI task so it is armed for the first clock edge.
+        """
+        try:
+            self.ci_task = nidaqmx.Task("HLFBCounterTask")
+            self.ci_task.ci_channels.add_ci_duty_cycle_chan(
+                self.hlfb_counter,
+                name_to_assign_to_channel="HLFB",
+                min_freq=50.0,
+                max_freq=2000.0,
+                edge=Edge.RISING
+            )
+            self.ci_task.timing.cfg_samp_clk_timing(
+                rate=sample_rate,
+                source=f"/{self.device_name}/ai/SampleClock",
+                sample_mode=AcquisitionType.CONTINUOUS
+            )
+            self.ci_task.start()
+            logging.info("HLFB counter input started.")
+        except Exception as e:
+            logging.info(f"Failed to start HLFB counter input, continuing without torque: {e}")
+            if self.ci_task:
+                self.ci_task.close()
+            self.ci_task = None
+
+    def _stop_hlfb_counter(self):
+        if self.ci_task:
+            try:
+                self.ci_task.stop()
+                self.ci_task.close()
+            except Exception as e:
+                logging.info(f"Warning stopping HLFB counter task: {e}")
+            finally:
+                self.ci_task = None
+
+    def start_acquisition(self, analog_channels, mode, sample_rate, chunk_size, callback,
+                          acquire_hlfb=False):
+        """
+        Starts continuous analog acquisition. If acquire_hlfb is True, the motor
+        HLFB duty cycle (%) is appended to each chunk as an extra channel row.
+
+        Returns:
+            bool: True if this call started the acquisition.
+        """
         if self.ai_task:
             logging.info("An acquisition is already running. Stop it first.")
-            return
+            return False
         self.data_callback = callback
         self.sample_rate = sample_rate
         self.total_samples_acquired = 0
@@ -191,14 +259,19 @@ class DAQController:
             self.ai_task.register_every_n_samples_acquired_into_buffer_event(
                 chunk_size, self._acquisition_callback
             )
+            if acquire_hlfb:
+                self._start_hlfb_counter(sample_rate)
             self.start_time = datetime.datetime.now()
             self.ai_task.start()
             logging.info("DAQ acquisition started successfully.")
+            return True
         except Exception as e:
             logging.info(f"Failed to start DAQ acquisition: {e}")
             if self.ai_task:
                 self.ai_task.close()
                 self.ai_task = None
+            self._stop_hlfb_counter()
+            return False
 
     def stop_acquisition(self):
         if self.ai_task:
@@ -212,6 +285,7 @@ class DAQController:
                 logging.info(f"Warning stopping AI task: {e}")
             finally:
                 self.ai_task = None
+        self._stop_hlfb_counter()
         self.data_callback = None
 
 
@@ -315,8 +389,9 @@ class DAQController:
                     # Clamp duty to [0,100]
                     duty = max(0.0, min(100.0, duty))
 
-                    logging.info(f"Profile step {idx+1}/{len(self.run_profile)}: "
-                                 f"speed={speed_rpm} RPM, cycles={cycles}, duty={duty:.3f}%")
+                    events.emit("profile_step", self._sample_index(),
+                                "Profile step {step}/{steps}: speed={rpm} RPM, cycles={cycles}, duty={duty:.3f}%",
+                                step=idx + 1, steps=len(self.run_profile), rpm=speed_rpm, cycles=cycles, duty=duty)
 
                     # Start or update motor duty
                     try:
@@ -0,0 +1,177 @@
+import json
+import time
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DEFAULT_LOG_INTERVAL_S = 1.0  # at most one log line per event kind (or call site) per interval
+DEFAULT_BURST = 5             # lines a call site may log back to back before it is limited
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits every logging call site (file and line) to `burst` records per
+    interval_s. Suppressed records are counted and the count is appended to
+    the next record let through, so repeated hot-path messages cost one
+    dictionary lookup instead of a formatted write. Warnings and above are
+    limited too, but never dropped silently.
+    """
+
+    def __init__(self, interval_s=DEFAULT_LOG_INTERVAL_S, burst=DEFAULT_BURST):
+        super().__init__()
+        self.interval_s = interval_s
+        self.burst = burst
+        self._sites = {}  # (pathname, lineno) -> [window start, records in window, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.interval_s:
+                suppressed = site[2] if site is not None else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                suppressed, site[2] = site[2], 0
+            else:
+                site[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} (+{suppressed} similar suppressed)"
+            record.args = None
+        return True
+
+
+_listener = None
+
+def start_logging(handlers, level=logging.INFO, interval_s=DEFAULT_LOG_INTERVAL_S, burst=DEFAULT_BURST):
+    """
+    Routes the root logger through a queue to a background thread.
+
+    Callers (DAQ callback, profile and test threads) only enqueue records;
+    the QueueListener thread does the file and console writes. Records pass
+    a RateLimitFilter before they are queued.
+
+    Args:
+        handlers (list): Handlers doing the actual output (e.g. FileHandler, StreamHandler).
+        level (int): Root log level.
+        interval_s, burst: See RateLimitFilter.
+
+    Returns:
+        QueueListener: The running listener (stopped by stop_logging).
+    """
+    global _listener
+    stop_logging()
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(interval_s, burst))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging():
+    """Flushes queued records and stops the logging thread (no-op if not started)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class EventLog:
+    """
+    Typed record of what happened during a run (PWM writes, segment changes,
+    stroke glitches, torque saturation, ...).
+
+    Every event is kept as a (timestamp, sample index, kind, values) record
+    for the capture's _events.jsonl sidecar; only a rate-limited subset is
+    also written to the log, with a count of the events of that kind since
+    the last line.
+    """
+
+    def __init__(self, log_interval_s=DEFAULT_LOG_INTERVAL_S):
+        self.log_interval_s = log_interval_s
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.reset()
+
+    def reset(self):
+        """Clears all records, e.g. at the start of a new run."""
+        with self._lock:
+            self.records = []
+            self.counts = {}
+            self._last_logged = {}  # kind -> (time of last log line, count at that time)
+
+    def add_listener(self, fn):
+        """Calls fn(timestamp, sample_index, kind, values) for every new event (e.g. a live publisher)."""
+        if fn not in self._listeners:
+            self._listeners = self._listeners + [fn]
+
+    def remove_listener(self, fn):
+        self._listeners = [f for f in self._listeners if f != fn]
+
+    def emit(self, kind, sample_index=None, message=None, level=logging.INFO, **values):
+        """
+        Records an event and, if message is given, logs it unless an event of
+        the same kind was logged less than log_interval_s ago.
+
+        Args:
+            kind (str): Event type, e.g. 'pwm_write'.
+            sample_index (int, optional): Acquired sample the event refers to.
+            message (str, optional): str.format template filled from values;
+                only formatted when the line is actually logged.
+            level (int): Log level of the message.
+            **values: JSON-serializable event fields.
+        """
+        now = time.time()
+        with self._lock:
+            self.records.append((now, sample_index, kind, values))
+            count = self.counts[kind] = self.counts.get(kind, 0) + 1
+            last = self._last_logged.get(kind)
+            log_now = message is not None and (last is None or now - last[0] >= self.log_interval_s
+                                               or level >= logging.ERROR)
+            if log_now:
+                self._last_logged[kind] = (now, count)
+        for listener in self._listeners:
+            try:
+                listener(now, sample_index, kind, values)
+            except Exception as e:
+                logging.debug(f"Event listener failed: {e}")
+        if log_now:
+            skipped = count - last[1] - 1 if last is not None else 0
+            text = message.format(**values)
+            if skipped > 0:
+                text += f" (+{skipped} {kind} events)"
+            logging.log(level, text)
+
+    def summary(self):
+        """Number of events of each kind."""
+        with self._lock:
+            return dict(self.counts)
+
+    def save(self, path):
+        """Writes the records as JSON lines: {'time', 'sample', 'kind', **values}."""
+        with self._lock:
+            records = list(self.records)
+        with open(path, "w") as f:
+            for timestamp, sample_index, kind, values in records:
+                f.write(json.dumps(dict(values, time=timestamp, sample=sample_index, kind=kind), default=str))
+                f.write("\n")
+        logging.info(f"Saved {len(records)} events to '{path}'")
+
+
+# shared by the DAQ and TestManager threads
+events = EventLog()
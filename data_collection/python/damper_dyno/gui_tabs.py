@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
-import math
 import logging
+import numpy as np
 from plots import RealTimePlot, RealTimeScatter
-from utils import required_theta_dot
+from uncertainty import RunningBinStats
+from profiling import profiler
 import matplotlib.cm as cm
 import random
 
@@ -23,6 +24,7 @@ class RunTestTab(ttk.Frame):
         self.force_q = []
         self.disp_q = []
         self.vel_q = []
+        self.vel_ref_q = []  # model-referenced (lag-free) velocity
 
         self._create_widgets()
 
@@ -35,11 +37,16 @@ class RunTestTab(ttk.Frame):
         right_plot_frame = ttk.Frame(plots_frame)
         right_plot_frame.pack(side="left", fill="both", expand=True, padx=(5, 0))
 
+        offscreen = bool(int(self.settings_manager.settings.get('gui_offscreen_render', 0)))
+        # y-limits follow the 1st/99th percentiles of the run instead of the fixed ranges
+        autoscale = bool(int(self.settings_manager.settings.get('plot_autoscale', 0)))
         self.force_plot = RealTimePlot(
             master=left_plot_frame, 
             signal_names=["Force"], 
             y_label="Force [N]", 
-            y_range=(-500, 500)
+            y_range=(-500, 500),
+            autoscale=autoscale,
+            offscreen=offscreen
         )
         self.disp_plot = RealTimePlot(
             master=right_plot_frame,
@@ -48,7 +55,9 @@ class RunTestTab(ttk.Frame):
             y_range=(10, 50),
             secondary_signals=["Velocity"],
             secondary_y_label="Velocity [mm/s]",
-            secondary_y_range=(-200, 200)
+            secondary_y_range=(-200, 200),
+            autoscale=autoscale,
+            offscreen=offscreen
         )
 
         
@@ -57,6 +66,18 @@ class RunTestTab(ttk.Frame):
         ttk.Label(readouts_frame, text="Temperature:", font=("Helvetica", 20)).pack(side=tk.LEFT, padx=5)
         self.temp_var = tk.StringVar(value="-- °C")
         ttk.Label(readouts_frame, textvariable=self.temp_var, font=self.fonts['btn_font']).pack(side=tk.LEFT, padx=5)
+        ttk.Label(readouts_frame, text="Motor Torque:", font=("Helvetica", 20)).pack(side=tk.LEFT, padx=5)
+        self.torque_var = tk.StringVar(value="-- Nm")
+        ttk.Label(readouts_frame, textvariable=self.torque_var, font=self.fonts['btn_font']).pack(side=tk.LEFT, padx=5)
+
+        # rolling stage timings (see profiling.py), refreshed by the GUI loop
+        self.hud_var = None
+        if int(self.settings_manager.settings.get('profiling_hud', 1)):
+            hud_frame = ttk.LabelFrame(self, text="Performance")
+            hud_frame.pack(side="left", padx=10, pady=5, anchor="w")
+            self.hud_var = tk.StringVar(value="no data")
+            ttk.Label(hud_frame, textvariable=self.hud_var, font=("Courier", 9),
+                      justify=tk.LEFT).pack(padx=5, pady=2)
 
         control_frame = ttk.Frame(self)
         control_frame.pack(pady=10, padx=10)
@@ -67,11 +88,15 @@ class RunTestTab(ttk.Frame):
         ttk.Label(control_frame, text="Cycles", font=self.fonts['widget_font']).pack(side=tk.LEFT, padx=(10, 0))
         ttk.Entry(control_frame, width=8, font=self.fonts['widget_font'], textvariable=self.settings_manager.get_var('default_num_cycles')).pack(side=tk.LEFT, padx=5)
 
-        ttk.Button(control_frame, text="Run Single", style="Big.TButton",
-           command=self.start_single_test).pack(side=tk.LEFT, padx=10)
-
-        ttk.Button(control_frame, text="Run Profile", style="Big.TButton",
-                command=self.start_profile_test).pack(side=tk.LEFT, padx=10)
+        # Run and Tare share the DAQ; disabled while either is in progress (see update_controls)
+        self.acquire_buttons = [
+            ttk.Button(control_frame, text="Run Single", style="Big.TButton", command=self.start_single_test),
+            ttk.Button(control_frame, text="Run Profile", style="Big.TButton", command=self.start_profile_test),
+            ttk.Button(control_frame, text="Tare", style="Big.TButton", command=self.start_tare),
+        ]
+        for button in self.acquire_buttons:
+            button.pack(side=tk.LEFT, padx=10)
+        self._controls_busy = False
 
         ttk.Button(control_frame, text="E-STOP", style="Big.TButton",
                 command=self.emergency_stop).pack(side=tk.LEFT, padx=10)
@@ -80,136 +105,92 @@ class RunTestTab(ttk.Frame):
                 command=self.on_quit).pack(side=tk.LEFT, padx=10)
 
 
-    def start_test(self):
+    def update_hud(self, stats):
+        """Shows rolling p50/p99 per stage and the current throughput (profiler.stats() output)."""
+        if self.hud_var is None:
+            return
+        if not stats:
+            self.hud_var.set("no data" if profiler.enabled else "profiling disabled")
+            return
+        lines = [f"{'stage':<16}{'p50 ms':>8}{'p99 ms':>8}"]
+        lines += [f"{stage:<16}{st['p50_ms']:>8.2f}{st['p99_ms']:>8.2f}" for stage, st in sorted(stats.items())]
+        lines.append(f"{profiler.throughput(stats):.0f} samples/s")
+        self.hud_var.set("\n".join(lines))
+
+    def update_controls(self):
+        """Disables Run Single/Run Profile/Tare while a run or tare capture holds the DAQ."""
+        busy = self.test_manager.busy
+        if busy != self._controls_busy:
+            self._controls_busy = busy
+            for button in self.acquire_buttons:
+                button.state(['disabled'] if busy else ['!disabled'])
+
+    def _refuse_if_busy(self):
+        """Shows a warning and returns True if a run or tare capture is in progress."""
+        if self.test_manager.busy:
+            messagebox.showwarning("DAQ Busy", "A run or tare capture is in progress. Wait for it to finish.")
+            return True
+        return False
+
+    def _compile_config(self, mode):
+        """Returns the (cached) compiled RunConfig, or None after showing the error."""
         try:
-            settings_for_run = {key: var.get() for key, var in self.settings_manager.setting_vars.items()}
-                        
-            target_linear_speed = float(settings_for_run['default_linear_speed_ips'])
-            crank_radius = float(settings_for_run['crank_radius_in'])
-            rod_length = float(settings_for_run['rod_length_in'])
-
-            theta_dot_rad_s, _, __ = required_theta_dot(V_des=target_linear_speed, Lc=rod_length, R=crank_radius)
-            calculated_rpm = theta_dot_rad_s * 60 / (2 * math.pi)
-            logging.info(f"Target linear speed: {target_linear_speed} in/s => Calculated RPM: {calculated_rpm:.2f}")
-
-            for key, value in settings_for_run.items():
-                if key != 'output_dir':
-                    try: settings_for_run[key] = float(value) if '.' in str(value) else int(value)
-                    except (ValueError, TypeError): pass
-
-            settings_for_run['run_speed_rpm'] = calculated_rpm
-            settings_for_run['run_num_cycles'] = int(self.settings_manager.get_var('default_num_cycles').get())
-
+            return self.settings_manager.compile_run_config(mode=mode, tare_offsets=self.test_manager.tare_offsets)
         except (KeyError, ValueError, TypeError) as e:
             messagebox.showerror("Invalid Input or Configuration", f"Please check your inputs and config.json file.\n\nError: {e}")
-            return
-            
-        threading.Thread(target=self.test_manager.run_test, args=(settings_for_run,), daemon=True).start()
+            return None
+
+    def start_test(self):
+        """Run a test with the default single-speed settings."""
+        self.start_single_test()
 
     def start_single_test(self):
         """Run a single constant-speed test."""
-        try:
-            settings_for_run = {key: var.get() for key, var in self.settings_manager.setting_vars.items()}
-                            
-            target_linear_speed = float(settings_for_run['default_linear_speed_ips'])
-            crank_radius = float(settings_for_run['crank_radius_in'])
-            rod_length = float(settings_for_run['rod_length_in'])
-
-            theta_dot_rad_s, _, __ = required_theta_dot(V_des=target_linear_speed, Lc=rod_length, R=crank_radius)
-            calculated_rpm = theta_dot_rad_s * 60 / (2 * math.pi)
-            logging.info(f"[Single] Linear speed {target_linear_speed} in/s -> RPM {calculated_rpm:.2f}")
-
-            for key, value in settings_for_run.items():
-                if key != 'output_dir':
-                    try: settings_for_run[key] = float(value) if '.' in str(value) else int(value)
-                    except: pass
-
-            settings_for_run['run_speed_rpm'] = calculated_rpm
-            settings_for_run['run_num_cycles'] = int(self.settings_manager.get_var('default_num_cycles').get())
-            settings_for_run['run_profile'] = None  # force single mode
-
-        except Exception as e:
-            messagebox.showerror("Invalid Input", str(e))
+        if self._refuse_if_busy():
+            return
+        config = self._compile_config('single')
+        if config is None:
             return
 
+        logging.info(f"[Single] Linear speed {config.segment_linear_speed_ips[0]} in/s -> RPM {config.segment_rpm[0]:.2f}")
         threading.Thread(target=self.test_manager.run_test,
-                        args=(settings_for_run,), daemon=True).start()
+                        args=(config,), daemon=True).start()
 
     def start_profile_test(self):
         """Run a full profile defined in config.json.
 
-        Interprets the first row of run_profile as linear speed (in/s) by default,
-        and converts each speed to RPM using the same required_theta_dot logic
-        that start_single_test uses. If settings contains
-        'run_profile_speeds_are_rpm' == True, the speeds are treated as RPM already.
+        Interprets the first row of run_profile as linear speed (in/s) by default
+        and converts each speed to RPM when the run config is compiled. If settings
+        contains 'run_profile_speeds_are_rpm' == True, the speeds are treated as RPM already.
         """
-        try:
-            # crerate dictionary of settings for profile run
-            settings_for_run = {key: var.get() for key, var in self.settings_manager.setting_vars.items()}
-
-            for key, value in settings_for_run.items(): # convert numeric
-                if key != 'output_dir':
-                    try:
-                        settings_for_run[key] = float(value) if '.' in str(value) else int(value)
-                    except Exception:
-                        pass
-
-            # get the inital run profile from ettings namanger
-            raw_profile = self.settings_manager.settings.get("run_profile", None)
-            if not raw_profile:
-                messagebox.showerror("Missing Profile", "No run_profile found in config.json.")
-                return
-
-            # Optionally treat speeds as RPM directly
-            speeds_are_rpm = bool(self.settings_manager.settings.get("run_profile_speeds_are_rpm", False))
-
-            speeds_row = raw_profile[0]
-            durations_row = raw_profile[1]
-
-            # Convert speeds -> RPM if they are linear speeds (in/s)
-            if not speeds_are_rpm:
-                try:
-                    crank_radius = float(settings_for_run.get('crank_radius_in', self.settings_manager.get_var('crank_radius_in').get()))
-                    rod_length   = float(settings_for_run.get('rod_length_in', self.settings_manager.get_var('rod_length_in').get()))
-                except Exception as e:
-                    messagebox.showerror("Missing Geometry", f"Crank or rod geometry missing or invalid: {e}")
-                    return
-
-                rpm_list = []
-                for v in speeds_row:
-                    # assume v is linear speed in in/s
-                    try:
-                        v_float = float(v)
-                    except Exception:
-                        messagebox.showerror("Invalid profile value", f"Invalid speed value in profile: {v}")
-                        return
-
-                    theta_dot_rad_s, _, _ = required_theta_dot(V_des=v_float, Lc=rod_length, R=crank_radius)
-                    rpm = theta_dot_rad_s * 60.0 / (2.0 * math.pi)
-                    rpm_list.append(rpm)
-            else:
-                # speeds are already RPM
-                rpm_list = [float(s) for s in speeds_row]
-
-            # build the converted profile in the same 2xN row-wise format
-            converted_profile = [rpm_list, durations_row]
-
-            # attach to settings_for_run and start
-            settings_for_run['run_profile'] = converted_profile
-
-            logging.info("Starting profile test (converted speeds to RPM)...")
-            threading.Thread(target=self.test_manager.run_test,
-                            args=(settings_for_run,), daemon=True).start()
-
-        except Exception as e:
-            messagebox.showerror("Profile Start Error", f"Failed to start profile test: {e}")
-            logging.exception("Failed to start profile test")
+        if self._refuse_if_busy():
+            return
+        config = self._compile_config('profile')
+        if config is None:
+            return
+
+        logging.info("Starting profile test (converted speeds to RPM)...")
+        threading.Thread(target=self.test_manager.run_test,
+                        args=(config,), daemon=True).start()
+
+    def start_tare(self):
+        """Capture tare offsets with the motor stopped (applied to all following runs)."""
+        if self._refuse_if_busy():
+            return
+        config = self._compile_config('single')
+        if config is None:
             return
 
+        def tare_worker():
+            offsets = self.test_manager.capture_tare(config)
+            if offsets is None:
+                self.after(0, lambda: messagebox.showerror("Tare Failed", "Tare capture failed or timed out. Check the log and the DAQ connection."))
+
+        threading.Thread(target=tare_worker, daemon=True).start()
 
     def emergency_stop(self):
         logging.info("⚠ EMERGENCY STOP PRESSED ⚠")
-        self.test_manager.daq.emergency_stop()
+        self.test_manager.emergency_stop()
 
 
 class SettingsTab(ttk.Frame):
@@ -271,9 +252,21 @@ class AnalysisTab(ttk.Frame):
         super().__init__(parent)
         self.run_tab = run_tab
         self.fonts = fonts
+        self.last_idx = 0  # index into run_tab buffers of the first sample not yet plotted
+        self._draw_pending = False  # samples ingested but not yet drawn
         self._create_widgets()
     
     def _create_widgets(self):
+        settings = self.run_tab.settings_manager.settings
+        offscreen = bool(int(settings.get('gui_offscreen_render', 0)))
+        # F-V against the fitted stroke reference instead of the filtered derivative
+        self.use_reference_velocity = bool(int(settings.get('fv_use_reference_velocity', 0)))
+        # binned mean force with its 99% t-interval drawn over the F-V scatter
+        self.fv_band = None
+        if int(settings.get('fv_confidence_band', 0)):
+            v_max = float(settings.get('fv_band_max_velocity', 250))
+            self.fv_band = RunningBinStats(np.linspace(-v_max, v_max, int(settings.get('fv_band_bins', 40)) + 1))
+
         # Force vs Displacement
         force_disp_frame = ttk.LabelFrame(self, text="Force vs Displacement", padding=(10, 10))
         force_disp_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
@@ -283,7 +276,8 @@ class AnalysisTab(ttk.Frame):
             y_label="Force [N]",
             x_range=(0, 50),
             y_range=(-1000, 1000),
-            color='blue'
+            color='blue',
+            offscreen=offscreen
         )
 
         # Force vs Velocity
@@ -295,17 +289,34 @@ class AnalysisTab(ttk.Frame):
             y_label="Force [N]",
             x_range=(-200, 200),
             y_range=(-1000, 1000),
-            color='blue'
+            color='blue',
+            offscreen=offscreen
         )
 
     def reset_plots(self):
         """Call at the start of a new run to clear plots."""
         self.force_disp_plot.reset()
         self.force_vel_plot.reset()
+        if self.fv_band is not None:
+            self.fv_band.reset()
+        self.last_idx = 0
+        self._draw_pending = False
 
-    def update_plots(self):
-        """Update plots with data from run_tab."""
-        if self.run_tab.time_q:
-            self.force_disp_plot.update(self.run_tab.disp_q, self.run_tab.force_q)
-            self.force_vel_plot.update(self.run_tab.vel_q, self.run_tab.force_q)
+    def update_plots(self, draw=True):
+        """
+        Update plots with the samples added to run_tab since the last update.
+        With draw=False the samples are ingested but the canvases are not redrawn.
+        """
+        new_idx = len(self.run_tab.time_q)
+        if new_idx > self.last_idx or (draw and self._draw_pending):
+            force = self.run_tab.force_q[self.last_idx:new_idx]
+            self.force_disp_plot.update(self.run_tab.disp_q[self.last_idx:new_idx], force, draw=draw)
+            vel_q = self.run_tab.vel_ref_q if self.use_reference_velocity else self.run_tab.vel_q
+            band = None
+            if self.fv_band is not None:
+                self.fv_band.update(vel_q[self.last_idx:new_idx], force)
+                band = self.fv_band.intervals() if draw else None
+            self.force_vel_plot.update(vel_q[self.last_idx:new_idx], force, draw=draw, band=band)
+            self.last_idx = new_idx
+            self._draw_pending = not draw
 
@@ -0,0 +1,215 @@
+import os
+import csv
+import json
+import hashlib
+import logging
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+CACHE_VERSION = 1
+TIMESTAMP_COLUMN = "Timestamp"
+
+def parse_csv(path):
+    """
+    Parses a dyno capture CSV into float64 columns.
+
+    The ISO timestamp column is parsed in one vectorized pass into 'Timestamp'
+    (POSIX seconds, naive local time) and 'time_s' (seconds since the first
+    sample). All other columns are read as floats.
+
+    Returns:
+        dict: {column name: np.ndarray}
+    """
+    with open(path, "r", newline="") as f:
+        header = next(csv.reader(f))
+    header = [h.strip() for h in header]
+
+    columns = {}
+    numeric_idx = [i for i, name in enumerate(header) if name != TIMESTAMP_COLUMN]
+    if numeric_idx:
+        data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=numeric_idx, ndmin=2, dtype=float)
+        for j, i in enumerate(numeric_idx):
+            columns[header[i]] = data[:, j]
+
+    if TIMESTAMP_COLUMN in header:
+        ts = np.loadtxt(path, delimiter=",", skiprows=1, usecols=header.index(TIMESTAMP_COLUMN),
+                        ndmin=1, dtype="datetime64[us]")
+        us = ts.astype(np.int64)
+        columns[TIMESTAMP_COLUMN] = us / 1e6
+        columns["time_s"] = (us - us[0]) / 1e6 if us.size else us.astype(float)
+
+    return columns
+
+def file_sha1(path, block_size=1 << 20):
+    """Content hash of a file, used as the cache key."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ColumnarCache:
+    """
+    On-disk columnar cache of parsed CSVs.
+
+    Each file is stored once as one .npy per column under a directory named
+    by its content hash, and served back memory-mapped. An index keyed by the
+    absolute path remembers (size, mtime) -> hash, so unchanged files are
+    resolved without reading them at all; touched-but-identical files are
+    recognized by hash and not re-parsed.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_VERSION:
+                return index
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return {"version": CACHE_VERSION, "files": {}}
+
+    def save_index(self):
+        tmp = self._index_path + f".tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp, self._index_path)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, path):
+        """Returns the cache key of path if a valid entry exists, else None."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self._index["files"].get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            key = entry["sha1"]
+        else:
+            key = file_sha1(path)
+            self._index["files"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": key}
+        if os.path.exists(os.path.join(self._entry_dir(key), "meta.json")):
+            return key
+        return None
+
+    def key_for(self, path):
+        """Returns the (possibly not yet cached) cache key of path."""
+        self.lookup(path)
+        return self._index["files"][os.path.abspath(path)]["sha1"]
+
+    def store(self, key, columns, source_path):
+        """Writes parsed columns under key (atomic per entry)."""
+        write_entry(self._entry_dir(key), columns, source_path)
+
+    def load(self, key, mmap=True):
+        """Loads a cached entry as {column: array}, memory-mapped by default."""
+        entry_dir = self._entry_dir(key)
+        with open(os.path.join(entry_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        return {name: np.load(os.path.join(entry_dir, fname), mmap_mode=mode)
+                for name, fname in meta["columns"].items()}
+
+    def meta(self, key):
+        with open(os.path.join(self._entry_dir(key), "meta.json"), "r") as f:
+            return json.load(f)
+
+
+def write_entry(entry_dir, columns, source_path):
+    tmp_dir = entry_dir + f".tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    names = {}
+    for i, (name, values) in enumerate(columns.items()):
+        fname = f"c{i:02d}.npy"
+        np.save(os.path.join(tmp_dir, fname), np.ascontiguousarray(values, dtype=np.float64))
+        names[name] = fname
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(source_path),
+        "columns": names,
+        "rows": int(len(next(iter(columns.values())))) if columns else 0,
+        "cached_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # another process cached the same content first
+        for fname in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, fname))
+        os.rmdir(tmp_dir)
+
+def _parse_to_cache(args):
+    """Process pool worker: parse one CSV and write its cache entry."""
+    path, entry_dir = args
+    write_entry(entry_dir, parse_csv(path), path)
+    return path
+
+def ingest_csvs(paths, cache_dir, workers=None):
+    """
+    Makes sure every file in paths is in the columnar cache, parsing the
+    misses in a process pool.
+
+    Returns:
+        dict: {path: cache key}
+    """
+    cache = ColumnarCache(cache_dir)
+    keys = {}
+    misses = {}
+    for path in paths:
+        key = cache.lookup(path)
+        if key is None:
+            key = cache.key_for(path)
+            misses.setdefault(key, path)  # identical files are parsed once
+        keys[path] = key
+
+    if misses:
+        logging.info(f"Ingest: parsing {len(misses)} of {len(paths)} files")
+        jobs = [(path, os.path.join(cache_dir, key)) for key, path in misses.items()]
+        if len(jobs) == 1 or workers == 1:
+            for job in jobs:
+                _parse_to_cache(job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for _ in pool.map(_parse_to_cache, jobs):
+                    pass
+    cache.save_index()
+    return keys
+
+def load_csvs(paths, cache_dir, workers=None, mmap=True):
+    """
+    Loads many dyno CSVs, parsing only files that are not cached yet.
+
+    Cache misses are parsed in a process pool and written to the columnar
+    cache; every file is then served from the cache (memory-mapped).
+
+    Args:
+        paths (list): CSV file paths.
+        cache_dir (str): Cache directory (created if missing).
+        workers (int, optional): Process pool size, default os.cpu_count().
+        mmap (bool): Memory-map cached columns instead of reading them.
+
+    Returns:
+        dict: {path: {column name: array}}
+    """
+    keys = ingest_csvs(paths, cache_dir, workers=workers)
+    cache = ColumnarCache(cache_dir)
+    return {path: cache.load(keys[path], mmap=mmap) for path in paths}
+
+def find_csvs(folder, recursive=True):
+    """Returns all .csv files under folder, sorted."""
+    found = []
+    for root, _, files in os.walk(folder):
+        found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".csv"))
+        if not recursive:
+            break
+    return sorted(found)
@@ -0,0 +1,162 @@
+import math
+import warnings
+from functools import lru_cache
+import numpy as np
+from scipy.optimize import minimize_scalar
+
+# Motor revolutions per crank revolution, as used by utils.gearbox_scaling
+GEAR_RATIO = 10
+
+def _as_output(x):
+    """Returns a Python float for 0-d results, otherwise the array."""
+    x = np.asarray(x)
+    return x.item() if x.ndim == 0 else x
+
+def slider_crank_kinematics(theta, theta_dot, Lc, R, theta_ddot=0.0):
+    """
+    Closed-form slider position, velocity and acceleration of an in-line
+    slider-crank (see motor_gearbox_sizing/slider_crank_kinematic_fcn.m).
+
+    Displacement is measured from the slider position at theta = 0 (TDC).
+    All inputs broadcast against each other.
+
+    Args:
+        theta: Crank angle [rad].
+        theta_dot: Crank angular velocity [rad/s].
+        Lc (float): Connecting rod length.
+        R (float): Crank radius (same units as Lc).
+        theta_ddot: Crank angular acceleration [rad/s^2].
+
+    Returns:
+        tuple: (x, x_dot, x_ddot) in units of R, R/s and R/s^2.
+    """
+    theta = np.asarray(theta, dtype=float)
+    n = Lc / R
+    s = np.sin(theta)
+    denom = np.sqrt(n**2 - s**2)
+
+    x = R * (1 - np.cos(theta) + n - denom)
+    dx_dtheta = R * (s + np.sin(2 * theta) / (2 * denom))
+    d2x_dtheta2 = R * (np.cos(theta) + np.cos(2 * theta) / denom +
+                       np.sin(2 * theta)**2 / (4 * denom**3))
+
+    x_dot = theta_dot * dx_dtheta
+    x_ddot = theta_ddot * dx_dtheta + np.square(theta_dot) * d2x_dtheta2
+    return _as_output(x), _as_output(x_dot), _as_output(x_ddot)
+
+def scotch_yoke_kinematics(theta, theta_dot, R, theta_ddot=0.0):
+    """
+    Closed-form yoke position, velocity and acceleration of a scotch-yoke.
+
+    Uses the same convention as slider_crank_kinematics: displacement is
+    measured from the position at theta = 0. All inputs broadcast.
+
+    Returns:
+        tuple: (x, x_dot, x_ddot) in units of R, R/s and R/s^2.
+    """
+    theta = np.asarray(theta, dtype=float)
+    s = np.sin(theta)
+    c = np.cos(theta)
+
+    x = R * (1 - c)
+    x_dot = R * theta_dot * s
+    x_ddot = R * (theta_ddot * s + np.square(theta_dot) * c)
+    return _as_output(x), _as_output(x_dot), _as_output(x_ddot)
+
+@lru_cache(maxsize=64)
+def _unit_slider_crank_gmax(n):
+    """
+    Max of g(theta) = sin(theta) + sin(2 theta) / (2 sqrt(n^2 - sin^2(theta)))
+    for a unit crank radius, i.e. G_max / R. Only depends on n = Lc/R, so it
+    is computed once per geometry.
+    """
+    if n < 1:
+        warnings.warn(
+            f"n = Lc/R = {n:.4g} < 1. This geometry is not physically possible "
+            "and will produce imaginary results for some theta."
+        )
+
+    def gfun(th):
+        th = np.asarray(th, dtype=float)
+        s = np.sin(th)
+        root_term = n**2 - s**2
+        mask = root_term >= 0
+        g = np.full(th.shape, -np.inf)
+        g[mask] = s[mask] + np.sin(2 * th[mask]) / (2 * np.sqrt(root_term[mask]))
+        return g.item() if g.ndim == 0 else g
+
+    # coarse grid search followed by a bounded refinement around the best point
+    theta_grid = np.linspace(0, 2 * np.pi, 2000)
+    g_vals = gfun(theta_grid)
+    idx = int(np.argmax(g_vals))
+    theta_coarse = theta_grid[idx]
+
+    w = 0.15
+    result = minimize_scalar(lambda t: -gfun(t), bounds=(theta_coarse - w, theta_coarse + w),
+                             method='bounded')
+    if not result.success:
+        warnings.warn(f"Optimization failed: {result.message}. Falling back to coarse grid result.")
+        return float(g_vals[idx]), float(theta_coarse)
+    return float(-result.fun), float(result.x)
+
+def slider_crank_gmax(Lc, R):
+    """
+    Returns (Gmax, theta_at_Gmax): the peak of dx/dtheta for the slider-crank
+    geometry and the crank angle where it occurs. Cached per Lc/R ratio.
+    """
+    g_max, theta_at_gmax = _unit_slider_crank_gmax(float(Lc) / float(R))
+    return R * g_max, theta_at_gmax
+
+def required_theta_dot(V_des, Lc, R, gear_ratio=GEAR_RATIO):
+    """
+    Vectorized replacement for utils.required_theta_dot.
+
+    Solves the constant crank speed giving a desired peak linear speed for a
+    whole array of speeds at once, reusing the cached Gmax of the geometry.
+
+    Args:
+        V_des: Desired peak linear speed(s), same length units as Lc and R per second.
+        Lc (float): Connecting rod length.
+        R (float): Crank radius.
+        gear_ratio (float): Motor/crank ratio applied to the returned speed.
+
+    Returns:
+        tuple: (theta_dot_req, Gmax, theta_at_Gmax) where theta_dot_req is the
+        required motor angular speed in rad/s (float or array matching V_des).
+    """
+    V_des = np.asarray(V_des, dtype=float)
+    Gmax, theta_at_Gmax = slider_crank_gmax(Lc, R)
+
+    if Gmax <= 0:
+        warnings.warn(f"Gmax is non-positive ({Gmax:.4g}). Check geometry.", UserWarning)
+        # Avoid division by zero or negative speed
+        crank_speed = np.where(V_des > 0, np.inf, 0.0)
+    else:
+        crank_speed = V_des / Gmax
+
+    return _as_output(gear_ratio * crank_speed), Gmax, theta_at_Gmax
+
+def linear_speed_to_rpm(V_des, Lc, R, gear_ratio=GEAR_RATIO):
+    """Converts desired peak linear speed(s) to motor RPM in one vectorized call."""
+    theta_dot, _, _ = required_theta_dot(V_des, Lc, R, gear_ratio=gear_ratio)
+    return _as_output(np.asarray(theta_dot) * 60.0 / (2.0 * math.pi))
+
+def slider_crank_torque(theta, F_slider, R, Lc):
+    """
+    Crank torque resisting a slider force (motor_gearbox_sizing/slider_crank_torque.m).
+
+    Args:
+        theta: Crank angle [rad].
+        F_slider: Force on the slider along its axis.
+        R (float): Crank radius.
+        Lc (float): Connecting rod length.
+
+    Returns:
+        tuple: (T, phi, F_connecting_rod): crank torque [force * R units],
+        connecting rod angle [rad] and axial rod force.
+    """
+    theta = np.asarray(theta, dtype=float)
+    phi = np.arcsin(R * np.sin(theta) / Lc)
+    F_rod = np.asarray(F_slider, dtype=float) / np.cos(phi)
+    T = F_rod * R * np.sin(theta + phi)
+    return _as_output(T), _as_output(phi), _as_output(F_rod)
@@ -1,39 +1,47 @@
 import os
+import sys
 import logging
-import tkinter as tk
-from tkinter import messagebox
-
-try:
-    from nidaqmx.errors import DaqError
-    NIDAQMX_AVAILABLE = True
-except ImportError:
-    DaqError = Exception
-    NIDAQMX_AVAILABLE = False
-from main_gui import DamperDynoGUI
-from daq import DAQController
-from test_manager import TestManager
-from settings_manager import SettingsManager
+from events import start_logging, stop_logging
 
 def setup_logging():
-    """Configures logging to print to console and save to a file."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler("damper_dyno.log", mode="w"),
-            logging.StreamHandler()
-        ]
-    )
+    """
+    Configures logging to print to console and save to a file. Both writes
+    happen on a background thread (see events.start_logging).
+    """
+    start_logging([
+        logging.FileHandler("damper_dyno.log", mode="w"),
+        logging.StreamHandler()
+    ])
 
 def main():
     """
     Main function to initialize and run the Damper Dyno application.
+    With command line arguments the headless CLI (cli.py) runs instead,
+    without loading Tk or Matplotlib.
     """
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        return cli_main(sys.argv[1:])
+
+    # GUI stack, imported only for the GUI
+    import tkinter as tk
+    from tkinter import messagebox
+    try:
+        from nidaqmx.errors import DaqError
+        nidaqmx_available = True
+    except ImportError:
+        DaqError = Exception
+        nidaqmx_available = False
+    from main_gui import DamperDynoGUI
+    from daq import DAQController
+    from test_manager import TestManager
+    from settings_manager import SettingsManager
+
     setup_logging()
     logging.info("Application starting")
     
     # Check for NI-DAQmx drivers
-    if not NIDAQMX_AVAILABLE:
+    if not nidaqmx_available:
         root = tk.Tk()
         root.withdraw()
         logging.error("NI-DAQmx library not found. install with 'pip install nidaqmx'.")
@@ -77,7 +85,8 @@ def main():
     app.mainloop()
 
     logging.info("Application shut down.")
+    stop_logging()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
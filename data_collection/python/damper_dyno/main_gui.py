@@ -5,6 +5,9 @@ import tkinter as tk
 from tkinter import ttk, font
 from ttkthemes import ThemedTk
 from gui_tabs import RunTestTab, SettingsTab, AnalysisTab
+from render_scheduler import RenderScheduler
+from profiling import profiler
+from events import stop_logging
 
 class DamperDynoGUI(ThemedTk):
     def __init__(self, test_manager, settings_manager):
@@ -53,6 +56,39 @@ class DamperDynoGUI(ThemedTk):
         notebook.add(settings_tab, text="Settings")
         notebook.add(self.analysis_tab, text="Analysis")
 
+        # Plots are redrawn through a frame-budgeted scheduler so the E-STOP
+        # button and Tk event loop stay responsive under heavy data load
+        self.frame_period_ms = int(self.settings_manager.settings.get('gui_frame_period_ms', 100))
+        self.render_scheduler = RenderScheduler(
+            notebook, budget_ms=float(self.settings_manager.settings.get('gui_frame_budget_ms', 50))
+        )
+        self.render_scheduler.add_target("force_plot", self._update_force_plot, tab=self.run_tab)
+        self.render_scheduler.add_target("disp_plot", self._update_disp_plot, tab=self.run_tab)
+        self.render_scheduler.add_target("analysis", self.analysis_tab.update_plots,
+                                         tab=self.analysis_tab, expensive=True)
+
+        # stage timings shown on the Run Test performance HUD
+        profiler.configure(enabled=self.settings_manager.settings.get('profiling_enable', 1))
+        self.hud_period_ms = int(self.settings_manager.settings.get('profiling_hud_period_ms', 500))
+        self._hud_ticks = 0
+
+    def _update_force_plot(self, draw):
+        # hidden time plots still ingest every frame and only skip the redraw
+        self.run_tab.force_plot.update(
+            self.run_tab.time_q,
+            [self.run_tab.force_q],
+            sample_rate=self._sample_rate,
+            draw=draw
+        )
+
+    def _update_disp_plot(self, draw):
+        self.run_tab.disp_plot.update(
+            self.run_tab.time_q,
+            [self.run_tab.disp_q, self.run_tab.vel_q],
+            sample_rate=self._sample_rate,
+            draw=draw
+        )
+
 
     def process_daq_queue(self):
         """
@@ -62,11 +98,13 @@ class DamperDynoGUI(ThemedTk):
         MAX_POINTS = 5000  # Max num data points to keep in memory for plots
 
         try:
-            sample_rate = int(self.settings_manager.get_var('sample_rate').get())
+            self._sample_rate = int(self.settings_manager.get_var('sample_rate').get())
         except (ValueError, tk.TclError):
-            sample_rate = 1000 # fallback
+            self._sample_rate = 1000 # fallback
 
         try:
+            drain_t0 = profiler.tic()
+            drained = 0
             new_data_received = False
             while not self.test_manager.gui_queue.empty():
                 packet = self.test_manager.gui_queue.get_nowait()
@@ -83,21 +121,29 @@ class DamperDynoGUI(ThemedTk):
                         self.run_tab.force_q.clear()
                         self.run_tab.disp_q.clear()
                         self.run_tab.vel_q.clear()
+                        self.run_tab.vel_ref_q.clear()
 
                         # Reset analysis tab with new color
                         self.analysis_tab.reset_plots()
+
+                        self.render_scheduler.reset_stats()
                                     
                 elif isinstance(packet, dict) and 'times' in packet:
                     # data packet
                     new_data_received = True
+                    drained += len(packet['times'])
                     self.run_tab.time_q.extend(packet['times'])
                     self.run_tab.force_q.extend(packet['force'])
                     self.run_tab.disp_q.extend(packet['disp'])
                     self.run_tab.vel_q.extend(packet['vel'])
+                    self.run_tab.vel_ref_q.extend(packet['vel_ref'])
 
 
                     if self.run_tab.temp_var and packet['temp'] is not None:
                         self.run_tab.temp_var.set(f"{packet['temp']:.1f} °C")
+
+                    if packet.get('torque') is not None:
+                        self.run_tab.torque_var.set(f"{packet['torque']:.2f} Nm")
                 
             if new_data_received:
                 #trim data buffers but keep history for the plot window
@@ -108,36 +154,38 @@ class DamperDynoGUI(ThemedTk):
                     self.run_tab.force_q = self.run_tab.force_q[trim_amount:]
                     self.run_tab.disp_q = self.run_tab.disp_q[trim_amount:]
                     self.run_tab.vel_q = self.run_tab.vel_q[trim_amount:]
+                    self.run_tab.vel_ref_q = self.run_tab.vel_ref_q[trim_amount:]
                     
                     #update the plot's tracking index
                     self.run_tab.force_plot.last_idx = max(0, self.run_tab.force_plot.last_idx - trim_amount)
                     self.run_tab.disp_plot.last_idx = max(0, self.run_tab.disp_plot.last_idx - trim_amount)
-
-                
-                # update plots with the trimmed data
-                self.run_tab.force_plot.update(
-                    self.run_tab.time_q, 
-                    [self.run_tab.force_q], 
-                    sample_rate=sample_rate
-                )
-                self.run_tab.disp_plot.update(
-                    self.run_tab.time_q, 
-                    [self.run_tab.disp_q, self.run_tab.vel_q], 
-                    sample_rate=sample_rate
-                )
-
-                self.analysis_tab.update_plots()
+                    self.analysis_tab.last_idx = max(0, self.analysis_tab.last_idx - trim_amount)
+            if drained:
+                profiler.toc("gui_drain", drain_t0, drained)
+
+            # update visible plots with the trimmed data within the frame budget;
+            # runs every tick so tabs that just became visible catch up
+            self.render_scheduler.run_frame()
+            self.run_tab.update_controls()
+
+            if self.run_tab.hud_var is not None:
+                self._hud_ticks += 1
+                if self._hud_ticks * self.frame_period_ms >= self.hud_period_ms:
+                    self._hud_ticks = 0
+                    self.run_tab.update_hud(profiler.stats())
         
         except queue.Empty:
             pass
         finally:
-            self._after_id = self.after(100, self.process_daq_queue)
+            self._after_id = self.after(self.frame_period_ms, self.process_daq_queue)
 
     def on_closing(self):
         """Handles the complete application shutdown sequence."""
         if self._after_id: self.after_cancel(self._after_id)
+        self.test_manager.close()
         try: self.test_manager.daq.close()
         except Exception as e: logging.error(f"Error during DAQ cleanup: {e}")
         finally:
             self.destroy()
+            stop_logging()  # flush queued log records before the hard exit
             os._exit(0)
\ No newline at end of file
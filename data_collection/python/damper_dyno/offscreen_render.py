@@ -0,0 +1,147 @@
+import threading
+import logging
+import tkinter as tk
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from profiling import profiler
+
+class AggRenderWorker:
+    """
+    Background thread that renders figures into off-screen Agg buffers.
+
+    Jobs are coalesced per canvas: if the GUI submits new snapshots faster than
+    they can be rendered, only the most recent snapshot of each figure is drawn.
+    Figures handed to the worker must not be touched by any other thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs = {}          # OffscreenCanvas -> latest apply function
+        self._thread = threading.Thread(target=self._run, name="AggRenderWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, canvas, apply_fn):
+        """
+        Queues apply_fn(figure) followed by a render of canvas.figure. A plain
+        redraw request (apply_fn=None) never replaces a pending snapshot.
+        """
+        with self._cond:
+            if apply_fn is None:
+                self._jobs.setdefault(canvas, None)
+            else:
+                self._jobs[canvas] = apply_fn
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                # oldest canvas first so no figure is starved
+                canvas = next(iter(self._jobs))
+                apply_fn = self._jobs.pop(canvas)
+            try:
+                if apply_fn is not None:
+                    apply_fn(canvas.figure)
+                canvas.render()
+            except Exception as e:
+                logging.error(f"Off-screen render failed: {e}")
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_render_worker():
+    """Returns the shared render worker, starting it on first use."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = AggRenderWorker()
+        return _worker
+
+
+class OffscreenCanvas:
+    """
+    Tk display for a Matplotlib Figure that is rendered on the AggRenderWorker.
+
+    Stands in for FigureCanvasTkAgg: get_tk_widget() returns the widget to pack
+    and draw_idle() requests a redraw. Artist updates must be passed as
+    snapshot-applying callables to submit(); the Tk thread only blits finished
+    RGB frames into a PhotoImage. Interactive toolbars are not supported.
+    """
+
+    def __init__(self, figure, master, poll_ms=15):
+        self.figure = figure
+        self.agg = FigureCanvasAgg(figure)
+        self.worker = get_render_worker()
+        self.poll_ms = poll_ms
+
+        self._frame_lock = threading.Lock()
+        self._frame = None   # (width, height, ppm bytes) of the latest finished render
+        self._size_lock = threading.Lock()
+        self._target_size = None  # pending (w, h) in inches from a widget resize
+
+        # the figure is only read here, before the worker owns it; later
+        # resizes compare against the last size requested from the Tk side
+        width, height = (int(v) for v in figure.bbox.size)
+        self._dpi = figure.dpi
+        self._pixel_size = (width, height)  # guarded by _size_lock
+        self.photo = tk.PhotoImage(master=master, width=width, height=height)
+        self.widget = tk.Label(master, image=self.photo, borderwidth=0, highlightthickness=0,
+                               padx=0, pady=0)
+        self.widget.bind("<Configure>", self._on_resize)
+
+        self.draw_idle()
+        self._poll()
+
+    def get_tk_widget(self):
+        return self.widget
+
+    def submit(self, apply_fn):
+        """Applies a data snapshot to the figure and redraws it on the worker thread."""
+        self.worker.submit(self, apply_fn)
+
+    def draw_idle(self):
+        self.worker.submit(self, None)
+
+    def render(self):
+        """Renders the figure to Agg and stores the frame. Runs on the worker thread."""
+        with self._size_lock:
+            size, self._target_size = self._target_size, None
+        if size is not None:
+            self.figure.set_size_inches(*size, forward=False)
+        t0 = profiler.tic()
+        self.agg.draw()
+        profiler.toc("canvas_draw", t0)
+        rgba = np.asarray(self.agg.buffer_rgba())
+        height, width = rgba.shape[:2]
+        header = f"P6 {width} {height} 255 ".encode()
+        frame = header + np.ascontiguousarray(rgba[..., :3]).tobytes()
+        with self._frame_lock:
+            self._frame = (width, height, frame)
+
+    def _poll(self):
+        """Blits the latest finished frame, if any. Runs on the Tk thread."""
+        with self._frame_lock:
+            frame, self._frame = self._frame, None
+        if frame is not None:
+            width, height, data = frame
+            try:
+                self.photo.configure(width=width, height=height, data=data, format="PPM")
+            except tk.TclError as e:
+                logging.error(f"Failed to blit off-screen frame: {e}")
+        try:
+            self.widget.after(self.poll_ms, self._poll)
+        except tk.TclError:
+            pass  # widget destroyed
+
+    def _on_resize(self, event):
+        size = (event.width, event.height)
+        if event.width <= 1 or event.height <= 1:
+            return
+        with self._size_lock:
+            if size == self._pixel_size:
+                return
+            self._pixel_size = size
+            self._target_size = (event.width / self._dpi, event.height / self._dpi)
+        self.draw_idle()
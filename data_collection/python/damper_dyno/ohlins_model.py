@@ -0,0 +1,206 @@
+import os
+from functools import lru_cache
+import numpy as np
+from scipy.io import loadmat
+
+# Default location of cdamp.mat / rdamp.mat (repo_root/ohlins_model)
+DEFAULT_TABLE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "ohlins_model"))
+
+MAX_VELOCITY = 9.65  # in/s, highest velocity covered by every digitized curve
+HS_SWEEP = (0, 1, 2, 3, 4)              # HS turns at LS = 0, curves 0..4
+LS_SWEEP = (0, 2, 4, 6, 10, 15, 25)     # LS clicks at HS = 4, curves 4..10
+HS_RANGE = (0, 4)
+LS_RANGE = (0, 25)
+
+def _curve_coordinate(ls, hs):
+    """
+    Position of (LS, HS) settings along the measured curve sequence: the HS
+    sweep (LS = 0) maps onto 0..4 and the LS sweep (HS = 4) onto 4..10.
+    NaN for combinations Ohlins did not publish.
+    """
+    ls = np.asarray(ls, dtype=float)
+    hs = np.asarray(hs, dtype=float)
+    in_range = (ls >= LS_RANGE[0]) & (ls <= LS_RANGE[1]) & (hs >= HS_RANGE[0]) & (hs <= HS_RANGE[1])
+    on_hs_sweep = in_range & (ls == 0)
+    on_ls_sweep = in_range & (hs == 4)
+    s = np.full(np.broadcast(ls, hs).shape, np.nan)
+    s = np.where(on_hs_sweep, np.interp(hs, HS_SWEEP, np.arange(5)), s)
+    s = np.where(on_ls_sweep & ~on_hs_sweep, np.interp(ls, LS_SWEEP, np.arange(4, 11)), s)
+    return s
+
+def ame441_to_ohlins(hsc, lsc, hsr, lsr):
+    """
+    naming_swap.m: converts AME441 click naming to the Ohlins convention.
+    Low speed is unchanged; high speed is flipped and rescaled.
+
+    Returns:
+        tuple: (hsc, lsc, hsr, lsr) in Ohlins convention.
+    """
+    hsc_ohlins = 4.3 + (4.3 - 0) / (0 - 5.25) * np.asarray(hsc, dtype=float)
+    hsr_ohlins = 4.3 + (4.3 - 0) / (0 - 4.75) * np.asarray(hsr, dtype=float)
+    return hsc_ohlins, lsc, hsr_ohlins, lsr
+
+
+class OhlinsDamperModel:
+    """
+    Batch-evaluable port of ohlins_model/ohlins_damper_model.m.
+
+    The digitized Ohlins curves (cdamp.mat / rdamp.mat) are resampled once
+    onto a shared uniform velocity grid, giving one (11 x n_grid) table per
+    direction. A force evaluation is then four gathers and three linear blends
+    for any broadcastable mix of velocity samples and click settings: linear
+    in velocity along each curve, then linear between the two neighbouring
+    curves of the setting, as the MATLAB model does point by point (to within
+    the grid resolution, ~0.002 lbf at the default n_grid).
+
+    Conventions follow the MATLAB model: velocity in in/s (positive is
+    compression), force in lbf (compression positive, rebound negative), LS in
+    clicks from closed (0 = max damping, 25 = min), HS in turns from open
+    (0 = min, 4 = max). Only the published sweeps are valid: LS = 0 with any
+    HS, or HS = 4 with any LS.
+    """
+
+    def __init__(self, cdamp, rdamp, n_grid=4096, max_velocity=MAX_VELOCITY):
+        """
+        Args:
+            cdamp (list): 11 (n x 2) [velocity, force] compression curves.
+            rdamp (list): 11 (n x 2) [velocity, force] rebound curves.
+            n_grid (int): Number of points of the uniform velocity grid.
+            max_velocity (float): Velocity magnitude inputs are clamped to.
+        """
+        self.max_velocity = float(max_velocity)
+        self.n_grid = int(n_grid)
+        self.velocity_grid = np.linspace(0.0, self.max_velocity, self.n_grid)
+        self._dv = self.velocity_grid[1] - self.velocity_grid[0]
+        self.comp_table = self._resample(cdamp)
+        self.reb_table = self._resample(rdamp)
+        # one flat [direction, curve, velocity] table so a single gather serves both directions
+        self._flat = np.concatenate((self.comp_table, self.reb_table)).ravel()
+
+    @classmethod
+    def from_mat(cls, table_dir=DEFAULT_TABLE_DIR, **kwargs):
+        cdamp = loadmat(os.path.join(table_dir, "cdamp.mat"))["cdamp"].ravel()
+        rdamp = loadmat(os.path.join(table_dir, "rdamp.mat"))["rdamp"].ravel()
+        return cls(list(cdamp), list(rdamp), **kwargs)
+
+    def _resample(self, curves):
+        if len(curves) != 11:
+            raise ValueError(f"Expected 11 damping curves, got {len(curves)}.")
+        table = np.empty((len(curves), self.n_grid))
+        for i, curve in enumerate(curves):
+            curve = np.asarray(curve, dtype=float)
+            # digitized points are not always ordered; interp1 sorts them too
+            v, idx = np.unique(curve[:, 0], return_index=True)
+            table[i] = np.interp(self.velocity_grid, v, curve[idx, 1])
+        return table
+
+    def _interp(self, rebound, s, v_abs):
+        pos = v_abs / self._dv
+        vi = np.minimum(pos.astype(np.intp), self.n_grid - 2)
+        vw = pos - vi
+        ci = np.clip(s.astype(np.intp), 0, 9)
+        cw = s - ci
+        base = (rebound * 11 + ci) * self.n_grid + vi
+        t = self._flat
+        lo = t[base] + (t[base + 1] - t[base]) * vw
+        base += self.n_grid
+        hi = t[base] + (t[base + 1] - t[base]) * vw
+        return lo + (hi - lo) * cw
+
+    def force(self, lsc, hsc, lsr, hsr, velocity, strict=True):
+        """
+        Damping force for any broadcastable arrays of settings and velocities.
+
+        Args:
+            lsc, hsc, lsr, hsr: Click settings (scalars or arrays).
+            velocity: Piston velocity [in/s]; magnitudes above max_velocity are clamped.
+            strict (bool): Raise ValueError for unpublished setting combinations
+                (as the MATLAB model does); otherwise return NaN for them.
+
+        Returns:
+            np.ndarray: Force [lbf] with the broadcast shape of the inputs.
+        """
+        velocity = np.asarray(velocity, dtype=float)
+        s_comp = _curve_coordinate(lsc, hsc)
+        s_reb = _curve_coordinate(lsr, hsr)
+        if strict:
+            if np.isnan(s_comp).any():
+                raise ValueError("Invalid compression settings: LSC must be 0 (any HSC 0-4) or HSC must be 4 (LSC 0-25).")
+            if np.isnan(s_reb).any():
+                raise ValueError("Invalid rebound settings: LSR must be 0 (any HSR 0-4) or HSR must be 4 (LSR 0-25).")
+
+        velocity, s_comp, s_reb = np.broadcast_arrays(velocity, s_comp, s_reb)
+        shape = velocity.shape
+        velocity, s_comp, s_reb = velocity.ravel(), s_comp.ravel(), s_reb.ravel()
+        v_abs = np.minimum(np.abs(velocity), self.max_velocity)
+        compression = velocity > 0
+        s = np.where(compression, s_comp, s_reb)
+        valid = ~np.isnan(s)
+        s = np.where(valid, s, 0.0)
+
+        out = self._interp(~compression, s, v_abs)
+        out[velocity == 0] = 0.0
+        out[~valid] = np.nan
+        return out.reshape(shape)
+
+    def curves(self, settings, velocity, strict=True):
+        """
+        Force curves for a list of settings.
+
+        Args:
+            settings (array): (K x 4) [LSC, HSC, LSR, HSR] rows.
+            velocity (array): Velocities [in/s].
+
+        Returns:
+            np.ndarray: (K x len(velocity)) forces [lbf].
+        """
+        settings = np.atleast_2d(np.asarray(settings, dtype=float))
+        v = np.asarray(velocity, dtype=float).ravel()[None, :]
+        cols = [settings[:, i:i + 1] for i in range(4)]
+        return self.force(*cols, v, strict=strict)
+
+    def score_histogram(self, settings, velocity_centers, counts, strict=True):
+        """
+        Scores settings against a velocity histogram (e.g. from vehicle logs).
+
+        Returns:
+            dict: Per-setting arrays 'mean_abs_force', 'rms_force',
+            'mean_comp_force' and 'mean_reb_force' weighted by the counts.
+        """
+        centers = np.asarray(velocity_centers, dtype=float).ravel()
+        w = np.asarray(counts, dtype=float).ravel()
+        F = self.curves(settings, centers, strict=strict)
+        total = w.sum()
+        comp, reb = centers > 0, centers < 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "mean_abs_force": np.abs(F) @ w / total,
+                "rms_force": np.sqrt(F**2 @ w / total),
+                "mean_comp_force": F[:, comp] @ w[comp] / w[comp].sum(),
+                "mean_reb_force": F[:, reb] @ w[reb] / w[reb].sum(),
+            }
+
+    def compare(self, settings, velocity, force):
+        """
+        compare_to_truth-style residuals of measured (velocity, force) data
+        against the model at one setting [LSC, HSC, LSR, HSR].
+
+        Returns:
+            dict: 'model' force at the measured velocities, 'residual'
+            (measured - model), 'rms' and 'max_abs' of the residual.
+        """
+        model = self.curves([settings], velocity)[0]
+        residual = np.asarray(force, dtype=float).ravel() - model
+        finite = np.isfinite(residual)
+        return {
+            "model": model,
+            "residual": residual,
+            "rms": float(np.sqrt(np.mean(residual[finite]**2))) if finite.any() else np.nan,
+            "max_abs": float(np.max(np.abs(residual[finite]))) if finite.any() else np.nan,
+        }
+
+
+@lru_cache(maxsize=4)
+def load_ohlins_model(table_dir=DEFAULT_TABLE_DIR, n_grid=4096):
+    """Loads (once per table_dir) the Ohlins model from cdamp.mat / rdamp.mat."""
+    return OhlinsDamperModel.from_mat(table_dir, n_grid=n_grid)
@@ -1,16 +1,27 @@
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import matplotlib.dates as mdates
 import datetime
 import numpy as np
+from quantile_sketch import QuantileSketch
+from offscreen_render import OffscreenCanvas
+from profiling import profiler
 
 class RealTimePlot:
     def __init__(self, master, signal_names, y_label="Values", y_range=(-100, 100),
                  figsize=(10,8), x_window=3, plot_freq=3, 
-                 secondary_signals=None, secondary_y_label=None, secondary_y_range=None):
+                 secondary_signals=None, secondary_y_label=None, secondary_y_range=None,
+                 autoscale=False, offscreen=False):
         """
         Parameters:
         -----------
+        autoscale : bool, optional
+            If True, y-limits follow the 1st/99th percentiles of all data seen
+            this run, estimated incrementally with a streaming quantile sketch
+        offscreen : bool, optional
+            If True, the figure is rendered to an Agg buffer on a worker thread
+            and the Tk thread only blits the finished frame
         secondary_signals : list of str, optional
             Names of signals to plot on the secondary y-axis
         secondary_y_label : str, optional
@@ -19,7 +30,13 @@ class RealTimePlot:
             (min, max) range for the secondary y-axis
         """
         
-        self.fig, self.ax = plt.subplots(figsize=figsize)
+        self.offscreen = offscreen
+        if offscreen:
+            # pyplot is not thread-safe; off-screen figures are owned by the render worker
+            self.fig = Figure(figsize=figsize)
+            self.ax = self.fig.add_subplot()
+        else:
+            self.fig, self.ax = plt.subplots(figsize=figsize)
         
         # Primary axis setup
         self.primary_signals = signal_names
@@ -52,19 +69,38 @@ class RealTimePlot:
         all_labels = [line.get_label() for line in all_lines]
         self.ax.legend(all_lines, all_labels, loc='upper right')
         
-        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        if offscreen:
+            self.canvas = OffscreenCanvas(self.fig, master=master)
+        else:
+            self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+            # every redraw ends in canvas.draw(), timed here as the canvas_draw stage
+            self.canvas.draw = profiler.timed("canvas_draw", self.canvas.draw)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
 
+        # (x, y) data per line, primary then secondary. Kept apart from the
+        # artists so off-screen figures are only ever touched by the worker.
+        self._line_data = [([], []) for _ in self.lines + self.secondary_lines]
+
         self.x_window = x_window
         self.plot_freq = plot_freq
         self.last_idx = 0
+        self._draw_pending = False
+
+        # streaming percentile estimates per signal for autoscaling / summary stats
+        self.autoscale = autoscale
+        self.primary_sketches = [QuantileSketch((0.01, 0.99)) for _ in self.lines]
+        self.secondary_sketches = [QuantileSketch((0.01, 0.99)) for _ in self.secondary_lines]
 
     def _get_secondary_color(self, i):
         primary_colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
         return primary_colors[(i + len(self.primary_signals)) % len(primary_colors)]
 
-    def update(self, time_q, data_qs, sample_rate):
-
+    def update(self, time_q, data_qs, sample_rate, draw=True):
+        """
+        Appends the samples added to the queues since the last update.
+        With draw=False (plot not visible) the line data and sketches are
+        still updated but the redraw is deferred until the next drawn update.
+        """
         if not time_q:
             return
 
@@ -72,19 +108,18 @@ class RealTimePlot:
         samples_per_update = max(1, int(sample_rate / self.plot_freq))
 
         new_idx = len(time_q)
-        if new_idx - self.last_idx < samples_per_update:
+        if new_idx - self.last_idx < samples_per_update and not (draw and self._draw_pending):
             return  # Not enough new data yet
 
         # Grab the new chunk
         times = list(time_q)[self.last_idx:new_idx]
         data_slices = [list(dq)[self.last_idx:new_idx] for dq in data_qs]
 
-        # Update primary axis lines
-        num_primary = len(self.lines)
-        for i, line in enumerate(self.lines):
-            xdata, ydata = line.get_data()
-            xdata = list(xdata) + times
-            ydata = list(ydata) + data_slices[i]
+        # Update primary and secondary line data
+        sketches = self.primary_sketches + self.secondary_sketches
+        for i, (xdata, ydata) in enumerate(self._line_data):
+            xdata = xdata + times
+            ydata = ydata + data_slices[i]
 
             # Trim to x_window seconds
             cutoff_time = xdata[-1] - datetime.timedelta(seconds=self.x_window)
@@ -92,27 +127,50 @@ class RealTimePlot:
             xdata = xdata[idx_start:]
             ydata = ydata[idx_start:]
 
-            line.set_data(xdata, ydata)
-
-        # Update secondary axis lines
-        if self.ax2 is not None:
-            for i, line in enumerate(self.secondary_lines):
-                xdata, ydata = line.get_data()
-                xdata = list(xdata) + times
-                ydata = list(ydata) + data_slices[num_primary + i]
+            self._line_data[i] = (xdata, ydata)
+            sketches[i].update(data_slices[i])
+        self.last_idx = new_idx
 
-                # Trim to x_window seconds
-                cutoff_time = xdata[-1] - datetime.timedelta(seconds=self.x_window)
-                idx_start = next((j for j, t in enumerate(xdata) if t >= cutoff_time), 0)
-                xdata = xdata[idx_start:]
-                ydata = ydata[idx_start:]
+        self._draw_pending = not draw
+        if not draw or not xdata:
+            return
 
-                line.set_data(xdata, ydata)
+        snapshot = {
+            'lines': list(self._line_data),
+            'xlim': (xdata[0], xdata[-1]),
+        }
+        if self.autoscale:
+            snapshot['ylim'] = self._autoscale_lims(self.primary_sketches)
+            snapshot['ylim2'] = self._autoscale_lims(self.secondary_sketches)
+
+        self._render(snapshot)
+
+    def _autoscale_lims(self, sketches):
+        lims = [get_lims(sketch) for sketch in sketches]
+        lims = [lim for lim in lims if lim is not None]
+        if lims:
+            return (min(lim[0] for lim in lims), max(lim[1] for lim in lims))
+        return None
 
-        # Update x-axis limits
-        self.ax.set_xlim(xdata[0], xdata[-1])
-        self.canvas.draw_idle()
-        self.last_idx = new_idx
+    def _apply(self, snapshot):
+        """Applies a data snapshot to the artists. Runs wherever the figure is drawn."""
+        for line, (xdata, ydata) in zip(self.lines + self.secondary_lines, snapshot['lines']):
+            line.set_data(xdata, ydata)
+        if snapshot.get('xlim'):
+            self.ax.set_xlim(*snapshot['xlim'])
+        if snapshot.get('ylim'):
+            self.ax.set_ylim(*snapshot['ylim'])
+        if snapshot.get('ylim2') and self.ax2 is not None:
+            self.ax2.set_ylim(*snapshot['ylim2'])
+
+    def _render(self, snapshot):
+        if self.offscreen:
+            self.canvas.submit(lambda fig: self._apply(snapshot))
+        else:
+            self._apply(snapshot)
+            # drawn now rather than in Tk idle time, so the Agg render counts
+            # against the RenderScheduler frame budget it is called from
+            self.canvas.draw()
 
     def reset(self):
         """
@@ -121,33 +179,49 @@ class RealTimePlot:
         """
         # Reset the index for data
         self.last_idx = 0
+        self._draw_pending = False
         
-        # Clear the data from primary axis
-        for line in self.lines:
-            line.set_data([], [])
-        
-        # Clear the data from secondary axis
-        if self.ax2 is not None:
-            for line in self.secondary_lines:
-                line.set_data([], [])
+        # Clear the data from primary and secondary axis
+        self._line_data = [([], []) for _ in self._line_data]
+
+        for sketch in self.primary_sketches + self.secondary_sketches:
+            sketch.reset()
             
         # Redraw the empty canvas
-        self.canvas.draw_idle()
+        self._render({'lines': list(self._line_data)})
 
 
 class RealTimeScatter:
     def __init__(self, master, x_label, y_label,
-                 x_range, y_range, figsize=(6, 4), marker='o', dot_size=6, color='k'):
+                 x_range, y_range, figsize=(6, 4), marker='o', dot_size=6, color='k',
+                 offscreen=False):
+        """
+        With offscreen=True the figure is rendered to an Agg buffer on a worker
+        thread and the Tk thread only blits the finished frame. The navigation
+        toolbar is not available in that mode.
+        """
         
-        self.fig, self.ax = plt.subplots(figsize=figsize)
+        self.offscreen = offscreen
+        if offscreen:
+            self.fig = Figure(figsize=figsize)
+            self.ax = self.fig.add_subplot()
+        else:
+            self.fig, self.ax = plt.subplots(figsize=figsize)
         self.marker = marker
         self.dot_size = dot_size
         self.color = color
 
-        self.x_data = []
-        self.y_data = []
+        # plotted (x, y) points, grown by doubling; rendered as a view of the
+        # first _n rows, which stays valid because growth reallocates
+        self._offsets = np.empty((1024, 2))
+        self._n = 0
+
+        # streaming 1st/99th percentile estimates for outlier-robust autoscaling
+        self.x_sketch = QuantileSketch((0.01, 0.99))
+        self.y_sketch = QuantileSketch((0.01, 0.99))
 
         self.scatter = self.ax.scatter([], [], marker=self.marker, color=self.color, s=self.dot_size)
+        self.band_lines = None  # binned mean and confidence limits, created on first use
 
         self.ax.set_xlabel(x_label)
         self.ax.set_ylabel(y_label)
@@ -155,43 +229,114 @@ class RealTimeScatter:
         self.ax.set_ylim(*y_range)
         self.ax.grid()
 
-        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
-        self.canvas.get_tk_widget().pack(fill="both", expand=True)
-        self.toolbar = NavigationToolbar2Tk(self.canvas, master)
-        self.toolbar.update()
+        if offscreen:
+            self.canvas = OffscreenCanvas(self.fig, master=master)
+            self.toolbar = None
+        else:
+            self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+            self.canvas.draw = profiler.timed("canvas_draw", self.canvas.draw)
+            self.canvas.get_tk_widget().pack(fill="both", expand=True)
+            self.toolbar = NavigationToolbar2Tk(self.canvas, master)
+            self.toolbar.update()
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
 
-    def update(self, x_samples, y_samples):
+    def update(self, x_samples, y_samples, draw=True, band=None):
+        """
+        Appends new (not previously plotted) samples to the scatter.
+        With draw=False the samples are only stored and the redraw is deferred.
+        band, if given, is a (centers, mean, low, high) tuple drawn as a binned
+        mean line with its confidence limits.
+        """
         if len(x_samples) != len(y_samples):
             return
 
-        self.x_data.extend(x_samples)
-        self.y_data.extend(y_samples)
+        self._append(x_samples, y_samples)
+        self.x_sketch.update(x_samples)
+        self.y_sketch.update(y_samples)
+
+        if not draw:
+            return
 
         # Update scatter
-        self.scatter.set_offsets(list(zip(self.x_data, self.y_data)))
+        snapshot = {'offsets': self._offsets[:self._n]}
+        if band is not None:
+            snapshot['band'] = band
 
         # Update autorange
-        if self.x_data and self.y_data:
-            self.ax.set_xlim(get_lims(self.x_data))
-            self.ax.set_ylim(get_lims(self.y_data))
-
-        self.canvas.draw_idle()
+        if self.x_sketch.count and self.y_sketch.count:
+            snapshot['xlim'] = get_lims(self.x_sketch)
+            snapshot['ylim'] = get_lims(self.y_sketch)
+
+        self._render(snapshot)
+
+    def _append(self, x_samples, y_samples):
+        n_new = len(x_samples)
+        if self._n + n_new > len(self._offsets):
+            # a new array rather than an in-place resize: snapshots still
+            # queued for the render worker keep viewing the old one
+            grown = np.empty((max(2 * len(self._offsets), self._n + n_new), 2))
+            grown[:self._n] = self._offsets[:self._n]
+            self._offsets = grown
+        self._offsets[self._n:self._n + n_new, 0] = x_samples
+        self._offsets[self._n:self._n + n_new, 1] = y_samples
+        self._n += n_new
 
     def reset(self):
-        self.x_data = []
-        self.y_data = []
-        self.scatter.set_offsets(np.empty((0, 2)))
-        self.scatter.set_color(self.color)
-        self.canvas.draw_idle()
+        self._offsets = np.empty((1024, 2))
+        self._n = 0
+        self.x_sketch.reset()
+        self.y_sketch.reset()
+        snapshot = {'offsets': np.empty((0, 2)), 'color': self.color}
+        if self.band_lines is not None:
+            snapshot['band'] = ([], [], [], [])
+        self._render(snapshot)
+
+    def _apply(self, snapshot):
+        """Applies a data snapshot to the artists. Runs wherever the figure is drawn."""
+        self.scatter.set_offsets(snapshot['offsets'])
+        if snapshot.get('color') is not None:
+            self.scatter.set_color(snapshot['color'])
+        if snapshot.get('band') is not None:
+            centers, mean, low, high = snapshot['band']
+            if self.band_lines is None:
+                self.band_lines = (self.ax.plot([], [], color='red', linewidth=1.5)[0],
+                                   self.ax.plot([], [], color='red', linewidth=0.8, linestyle='--')[0],
+                                   self.ax.plot([], [], color='red', linewidth=0.8, linestyle='--')[0])
+            for line, y in zip(self.band_lines, (mean, low, high)):
+                line.set_data(centers, y)
+        if snapshot.get('xlim'):
+            self.ax.set_xlim(snapshot['xlim'])
+        if snapshot.get('ylim'):
+            self.ax.set_ylim(snapshot['ylim'])
+
+    def _render(self, snapshot):
+        if self.offscreen:
+            self.canvas.submit(lambda fig: self._apply(snapshot))
+        else:
+            self._apply(snapshot)
+            # drawn now rather than in Tk idle time, so the Agg render counts
+            # against the RenderScheduler frame budget it is called from
+            self.canvas.draw()
 
 def get_lims(data):
-    if len(data) == 0:
-        return None
-
-    d = np.array(data)
-    low  = np.percentile(d, 1)
-    high = np.percentile(d, 99)
+    """
+    Returns padded [low, high] axis limits from the 1st/99th percentiles.
+
+    data may be a QuantileSketch tracking the 0.01 and 0.99 quantiles,
+    or a plain sequence of samples (percentiles computed from scratch).
+    """
+    if isinstance(data, QuantileSketch):
+        if data.count == 0:
+            return None
+        low = data.quantile(0.01)
+        high = data.quantile(0.99)
+    else:
+        if len(data) == 0:
+            return None
+
+        d = np.array(data)
+        low  = np.percentile(d, 1)
+        high = np.percentile(d, 99)
 
     # span-based padding
     span = high - low
@@ -0,0 +1,219 @@
+import json
+import logging
+import math
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+from kinematics import GEAR_RATIO, slider_crank_gmax, slider_crank_kinematics
+from characterization import DEFAULT_PARAMS as FV_PARAMS
+from conditioning import DEFAULT_TRIM_START, DEFAULT_TRIM_END
+from torque_model import motor_requirements
+
+def _target_distribution(target, corner=None):
+    """
+    (edges, probability) of a target shock velocity distribution.
+
+    target is a VelocityHistogram (optionally one corner of it; its wheel
+    velocities are converted to shock velocities) or an (edges, weights)
+    pair of shock velocities with len(edges) == len(weights) + 1.
+    """
+    if hasattr(target, "shock_distribution"):
+        edges, weights = target.shock_distribution(corner)
+    else:
+        edges, weights = target
+    edges = np.asarray(edges, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if edges.size != weights.size + 1:
+        raise ValueError("Target distribution needs one more edge than weights.")
+    total = weights.sum()
+    if total <= 0:
+        raise ValueError("Target distribution is empty.")
+    return edges, weights / total
+
+def _rebin(edges_src, prob, edges_dst):
+    """Redistributes binned probability onto other bins (uniform within source bins)."""
+    cdf = np.concatenate(([0.0], np.cumsum(prob)))
+    return np.diff(np.interp(edges_dst, edges_src, cdf))
+
+def _speed_quantile(edges, prob, q):
+    """|velocity| below which a fraction q of the distribution lies."""
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    order = np.argsort(np.abs(centers))
+    upper = np.maximum(np.abs(edges[:-1]), np.abs(edges[1:]))[order]
+    cdf = np.cumsum(prob[order])
+    return float(upper[min(np.searchsorted(cdf, q), upper.size - 1)])
+
+def cycle_bin_samples(speeds, edges, Lc, R, sample_rate, n_theta=2048):
+    """
+    Samples per crank cycle falling in each velocity bin, for constant crank
+    speeds reaching the given peak linear speeds.
+
+    Args:
+        speeds (array): Peak linear speeds [in/s].
+        edges (array): Velocity bin edges [in/s].
+        Lc, R (float): Rod length and crank radius [in].
+        sample_rate (float): DAQ sample rate [Hz].
+        n_theta (int): Crank angles evaluated per cycle.
+
+    Returns:
+        tuple: (samples, period): (n_bins x n_speeds) samples per cycle and the
+        (n_speeds,) crank period [s].
+    """
+    speeds = np.asarray(speeds, dtype=float)
+    Gmax, _ = slider_crank_gmax(Lc, R)
+    theta_dot = speeds / Gmax
+    period = 2 * np.pi / theta_dot
+    theta = (np.arange(n_theta) + 0.5) * (2 * np.pi / n_theta)
+    _, x_dot, _ = slider_crank_kinematics(theta[None, :], theta_dot[:, None], Lc, R)
+
+    n_bins = edges.size - 1
+    idx = np.searchsorted(edges, x_dot, side="right") - 1
+    inside = (idx >= 0) & (idx < n_bins)
+    flat = (idx + n_bins * np.arange(speeds.size)[:, None])[inside]
+    fraction = np.bincount(flat, minlength=n_bins * speeds.size).reshape(speeds.size, n_bins) / n_theta
+    return (fraction * (sample_rate * period)[:, None]).T, period
+
+def peak_motor_torque(speeds, Lc, R, force_fn=None, moving_mass_lb=2.0, gear_ratio=GEAR_RATIO, n_theta=512):
+    """
+    Peak motor torque [Nm] and motor RPM of constant-crank-speed runs at
+    the given peak linear speeds (see torque_model.motor_requirements).
+    """
+    req = motor_requirements(speeds, (gear_ratio,), R=R, Lc=Lc, force_fn=force_fn,
+                             moving_mass_lb=moving_mass_lb, n_theta=n_theta)
+    return req["peak_torque_nm"][0], req["motor_rpm"][0]
+
+def plan_run_profile(target, settings, min_samples=50, total_samples=None, coverage=0.99,
+                     bin_width=FV_PARAMS["max_vel_bin_width"], speed_step=0.5, torque_margin=0.9,
+                     trim_start=DEFAULT_TRIM_START, trim_end=DEFAULT_TRIM_END, force_fn=None,
+                     moving_mass_lb=2.0, corner=None, mip_gap=0.01, time_limit_s=10.0):
+    """
+    Shortest run_profile that fills every F-V velocity bin of a target
+    shock-velocity distribution with enough samples.
+
+    Each candidate peak speed (a multiple of speed_step) contributes a fixed
+    number of samples per crank cycle to each velocity bin, so the sample
+    requirement is linear in the cycle counts. The integer program
+    "minimize total run time subject to samples per bin >= required" is then
+    solved with scipy's MILP solver (to within mip_gap of the optimum, or
+    the best plan found in time_limit_s), charging each segment used for
+    the trim_start seconds conditioning discards at its start, and the
+    fastest segment used for the trim_end seconds dropped at its end (it
+    must run at least trim_start + trim_end). Candidate speeds
+    whose peak motor torque exceeds torque_margin of motor_max_torque_map
+    (or whose RPM exceeds rpm_max) are excluded.
+
+    Args:
+        target: VelocityHistogram or (edges, weights) of the target shock velocities [in/s].
+        settings (dict): Settings with sample_rate, crank_radius_in,
+            rod_length_in, rpm_max and motor_max_torque_map.
+        min_samples (int): Samples required in every bin the target covers.
+        total_samples (int, optional): Additionally require the target's share
+            of this many samples in each bin.
+        coverage (float): Bins up to this quantile of |velocity| are planned.
+        bin_width (float): F-V velocity bin width [in/s].
+        speed_step (float): Resolution of the candidate speeds [in/s].
+        torque_margin (float): Usable fraction of the motor torque curve.
+        trim_start (float): Seconds dropped at the start of each segment.
+        trim_end (float): Seconds dropped at the end of the fastest segment.
+        force_fn (callable, optional): Damper force model for the torque check.
+        moving_mass_lb (float): Moving mass for the torque check [lb].
+        corner (str, optional): Corner of a VelocityHistogram target.
+        mip_gap (float): Relative optimality gap at which the search stops.
+        time_limit_s (float): Search time limit [s].
+
+    Returns:
+        dict: 'run_profile' ([[speeds in/s], [cycles]]), 'duration_s',
+        'bin_edges', 'required' and 'achieved' samples per bin,
+        'unreachable_bins', 'peak_torque_nm' and 'motor_rpm' per segment.
+    """
+    Lc, R = float(settings["rod_length_in"]), float(settings["crank_radius_in"])
+    fs = float(settings["sample_rate"])
+    torque_map = settings["motor_max_torque_map"]
+
+    edges_t, prob_t = _target_distribution(target, corner)
+    v_cover = _speed_quantile(edges_t, prob_t, coverage)
+    n_half = max(1, math.ceil(v_cover / bin_width))
+    edges = np.arange(-n_half, n_half + 1) * bin_width
+    prob = _rebin(edges_t, prob_t, edges)
+    required = np.where(prob > 0, float(min_samples), 0.0)
+    if total_samples:
+        required = np.maximum(required, np.ceil(total_samples * prob))
+
+    # candidate speeds within the motor's torque and speed limits
+    candidates = np.arange(1, math.ceil(edges[-1] / speed_step) + 1) * speed_step
+    peak_torque, rpm = peak_motor_torque(candidates, Lc, R, force_fn, moving_mass_lb)
+    available = np.interp(rpm, torque_map[0], torque_map[1])
+    feasible = (peak_torque <= torque_margin * available) & (rpm <= float(settings.get("rpm_max", np.inf)))
+    if not feasible.any():
+        raise ValueError("No candidate speed is within the motor torque limits.")
+    speeds, peak_torque, rpm = candidates[feasible], peak_torque[feasible], rpm[feasible]
+
+    samples, period = cycle_bin_samples(speeds, edges, Lc, R, fs)
+    unreachable = (required > 0) & ~(samples > 0).any(axis=1)
+    if unreachable.any():
+        logging.warning(f"{int(unreachable.sum())} velocity bins are beyond the fastest feasible speed "
+                        f"({speeds[-1]:.2f} in/s) and are not planned.")
+        required[unreachable] = 0.0
+    need = required > 0
+
+    # variables [cycles_j, used_j, last_j] (last_j: j is the fastest segment used);
+    # samples lost to trimming count against used segments, trim_end against the last one
+    n = speeds.size
+    trim_cycles = trim_start / period
+    end_cycles = trim_end / period
+    A, r = samples[need], required[need]
+    with np.errstate(divide="ignore"):
+        per_bin = np.where(A > 0, r[:, None] / A, 0.0)
+    max_cycles = np.ceil(per_bin.max(axis=0) + trim_cycles + end_cycles) + 1
+    # any feasible plan bounds the optimum: here, the fastest speed alone
+    t_bound = max_cycles[-1] * period[-1]
+    max_cycles = np.minimum(max_cycles, np.floor(t_bound / period))
+    eye, zeros = np.eye(n), np.zeros((n, n))
+    faster = np.triu(np.ones((n, n)), k=1)  # row j: segments faster than j
+    n_faster = faster.sum(axis=1)
+    constraints = [
+        LinearConstraint(np.hstack((A, -A * trim_cycles, -A * end_cycles)), lb=r),
+        LinearConstraint(np.hstack((eye, -np.diag(max_cycles), zeros)), ub=0),
+        # the last segment is used, exactly one is last and none faster is used
+        LinearConstraint(np.hstack((zeros, -eye, eye)), ub=0),
+        LinearConstraint(np.concatenate((np.zeros(2 * n), np.ones(n)))[None, :], lb=1, ub=1),
+        LinearConstraint(np.hstack((zeros, faster, np.diag(n_faster))), ub=n_faster),
+        # every used segment outlasts its trims
+        LinearConstraint(np.hstack((eye, -np.diag(trim_cycles), -np.diag(end_cycles))), lb=0),
+    ]
+    result = milp(np.concatenate((period, np.zeros(2 * n))), constraints=constraints,
+                  integrality=np.ones(3 * n), bounds=Bounds(0, np.concatenate((max_cycles, np.ones(2 * n)))),
+                  options={"time_limit": time_limit_s, "mip_rel_gap": mip_gap})
+    if result.x is None:
+        raise RuntimeError(f"Run profile optimization failed: {result.message}")
+    if not result.success:
+        logging.info(f"Run profile search stopped early, using the best plan found ({result.message})")
+
+    cycles = np.round(result.x[:n]).astype(int)
+    used = cycles > 0
+    last = np.flatnonzero(used)[-1]
+    kept = cycles - trim_cycles
+    kept[last] -= end_cycles[last]
+    achieved = samples[:, used] @ kept[used]
+    plan = {
+        "run_profile": [np.round(speeds[used], 3).tolist(), cycles[used].tolist()],
+        "duration_s": float(cycles @ period),
+        "bin_edges": edges,
+        "required": required,
+        "achieved": achieved,
+        "unreachable_bins": np.flatnonzero(unreachable),
+        "peak_torque_nm": peak_torque[used],
+        "motor_rpm": rpm[used],
+    }
+    logging.info(f"Planned run profile {plan['run_profile']} ({plan['duration_s']:.1f} s of running)")
+    return plan
+
+def save_run_profile(run_profile, config_path="config.json"):
+    """Writes a planned run_profile (linear speeds in in/s) into config.json."""
+    with open(config_path, "r") as f:
+        settings = json.load(f)
+    settings["run_profile"] = [list(run_profile[0]), list(run_profile[1])]
+    settings["run_profile_speeds_are_rpm"] = 0
+    with open(config_path, "w") as f:
+        json.dump(settings, f, indent=4)
+    logging.info(f"Saved run profile to '{config_path}'")
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+import numpy as np
+
+DEFAULT_WINDOW = 512      # timings kept per stage for the rolling percentiles
+DEFAULT_RATE_WINDOW_S = 2.0
+THROUGHPUT_STAGE = "calibration"  # every acquired sample passes through it exactly once
+
+class _StageWindow:
+    """Ring buffer of the latest durations of one stage plus run totals."""
+
+    def __init__(self, window):
+        self.durations = np.zeros(window)
+        self.ends = np.zeros(window)
+        self.samples = np.zeros(window)
+        self.filled = 0
+        self.pos = 0
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.total_samples = 0
+        self.lock = threading.Lock()
+
+    def add(self, duration, end, samples):
+        with self.lock:
+            i = self.pos
+            self.durations[i] = duration
+            self.ends[i] = end
+            self.samples[i] = samples
+            self.pos = (i + 1) % self.durations.size
+            self.filled = min(self.filled + 1, self.durations.size)
+            self.count += 1
+            self.total_s += duration
+            self.total_samples += samples
+            if duration > self.max_s:
+                self.max_s = duration
+
+    def copy(self):
+        with self.lock:
+            n = self.filled
+            return (self.durations[:n].copy(), self.ends[:n].copy(), self.samples[:n].copy(),
+                    self.count, self.total_s, self.max_s, self.total_samples)
+
+
+class StageProfiler:
+    """
+    Always-available timing hooks for the acquisition and GUI hot paths.
+
+    Hot paths bracket a stage with t0 = profiler.tic() ... profiler.toc(stage, t0).
+    While disabled tic() returns None and toc() returns on its first check, so
+    the hooks stay in place at the cost of two attribute lookups. While enabled
+    each stage keeps its latest `window` timings for rolling p50/p99 and the
+    samples it handled for a throughput estimate, plus totals for the run report.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, enabled=False, rate_window_s=DEFAULT_RATE_WINDOW_S):
+        self.window = int(window)
+        self.rate_window_s = rate_window_s
+        self.enabled = enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def configure(self, enabled=None, window=None):
+        """Switches the hooks on or off and/or resizes the rolling window (clears the stats)."""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if window is not None and int(window) != self.window:
+            self.window = int(window)
+            self.reset()
+
+    def reset(self):
+        """Clears all stage statistics, e.g. at the start of a new run."""
+        with self._lock:
+            self._stages = {}
+        self._started = time.perf_counter()
+
+    # --- hooks ---
+
+    def tic(self):
+        """Start time of a stage, or None while profiling is disabled."""
+        return time.perf_counter() if self.enabled else None
+
+    def toc(self, stage, t0, samples=0):
+        """
+        Records a stage started with tic().
+
+        Args:
+            stage (str): Stage name.
+            t0 (float): Value returned by tic(); None is ignored.
+            samples (int): DAQ samples handled, for the throughput estimate.
+        """
+        if t0 is None:
+            return
+        end = time.perf_counter()
+        window = self._stages.get(stage)
+        if window is None:
+            with self._lock:
+                window = self._stages.setdefault(stage, _StageWindow(self.window))
+        window.add(end - t0, end, samples)
+
+    def timed(self, stage, fn):
+        """Wraps a callable so each call is recorded as one run of stage."""
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.toc(stage, t0)
+        return wrapper
+
+    # --- results ---
+
+    def stats(self):
+        """
+        Rolling and whole-run statistics of every stage.
+
+        Returns:
+            dict: stage -> {'count', 'p50_ms', 'p99_ms', 'max_ms', 'mean_ms',
+            'total_s', 'samples', 'samples_per_s'} where the percentiles cover
+            the rolling window and samples_per_s the last rate_window_s seconds.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            stages = dict(self._stages)
+        out = {}
+        for stage, window in stages.items():
+            durations, ends, samples, count, total_s, max_s, total_samples = window.copy()
+            if count == 0:
+                continue
+            p50, p99 = np.percentile(durations, (50, 99)) if durations.size else (np.nan, np.nan)
+            span = min(self.rate_window_s, now - self._started)
+            recent = ends >= now - span
+            out[stage] = {
+                'count': count,
+                'p50_ms': 1000 * float(p50),
+                'p99_ms': 1000 * float(p99),
+                'max_ms': 1000 * max_s,
+                'mean_ms': 1000 * total_s / count,
+                'total_s': total_s,
+                'samples': int(total_samples),
+                'samples_per_s': float(samples[recent].sum() / span) if span > 0 else 0.0,
+            }
+        return out
+
+    def throughput(self, stats=None):
+        """Current acquisition throughput [samples/s] (0 before any samples)."""
+        stats = self.stats() if stats is None else stats
+        return stats.get(THROUGHPUT_STAGE, {}).get('samples_per_s', 0.0)
+
+    def report(self, stats=None):
+        """Multi-line human readable table of the stage statistics."""
+        stats = self.stats() if stats is None else stats
+        lines = [f"{'stage':<18}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'count':>8}"]
+        for stage, s in sorted(stats.items()):
+            lines.append(f"{stage:<18}{s['p50_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}{s['count']:>8}")
+        lines.append(f"throughput {self.throughput(stats):.0f} samples/s")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Writes the stage statistics as a JSON profile report."""
+        stats = self.stats()
+        elapsed = time.perf_counter() - self._started
+        report = {
+            'elapsed_s': elapsed,
+            'window': self.window,
+            'mean_throughput_samples_per_s': stats.get(THROUGHPUT_STAGE, {}).get('samples', 0) / elapsed,
+            'stages': stats,
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=4)
+        logging.info(f"Saved profile report to '{path}'")
+        return report
+
+
+# shared by the DAQ, TestManager and GUI hooks
+profiler = StageProfiler()
@@ -0,0 +1,303 @@
+import os
+import json
+import socket
+import struct
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+DEFAULT_ADDRESS = "tcp://127.0.0.1:5555"
+DEFAULT_BUFFER_FRAMES = 256   # frames queued per subscriber before the oldest is dropped
+
+# Frame: header, then meta_len bytes of UTF-8 JSON, then rows x cols little-endian float64 (row-major)
+MAGIC = b"DDYN"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIqI")  # magic, version, kind, rows, cols, sample index (-1: none), meta_len
+HELLO, CHUNK, CYCLE, EVENT = 0, 1, 2, 3
+KIND_NAMES = {HELLO: "hello", CHUNK: "chunk", CYCLE: "cycle", EVENT: "event"}
+
+CHUNK_COLUMNS = ("time_s", "force_n", "disp_mm", "temp_c", "vel_mm_s", "vel_ref_mm_s", "torque_nm")
+CYCLE_COLUMNS = ("cycle", "start_sample", "samples", "force_min", "force_max", "force_mean",
+                 "disp_min", "disp_max", "vel_min", "vel_max", "temp_mean")
+
+def pack_frame(kind, sample_index=None, data=None, meta=None):
+    """Encodes one frame. data is a 2-D (rows x cols) array or None."""
+    meta_bytes = json.dumps(meta, separators=(",", ":"), default=str).encode() if meta else b""
+    if data is None:
+        rows = cols = 0
+        body = b""
+    else:
+        data = np.asarray(data, dtype="<f8")
+        rows, cols = data.shape
+        body = np.ascontiguousarray(data).tobytes()
+    header = HEADER.pack(MAGIC, VERSION, kind, rows, cols, -1 if sample_index is None else int(sample_index),
+                         len(meta_bytes))
+    return header + meta_bytes + body
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        got = sock.recv_into(view[pos:], n - pos)
+        if got == 0:
+            raise ConnectionError("Publisher closed the connection.")
+        pos += got
+    return bytes(buf)
+
+def read_frame(sock):
+    """
+    Reads one frame from a connected socket.
+
+    Returns:
+        tuple: (kind, sample_index or None, meta dict, (rows x cols) float array or None)
+    """
+    magic, version, kind, rows, cols, sample_index, meta_len = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a damper dyno frame (magic {magic!r}, version {version}).")
+    meta = json.loads(_recv_exact(sock, meta_len)) if meta_len else {}
+    data = None
+    if rows * cols:
+        data = np.frombuffer(_recv_exact(sock, rows * cols * 8), dtype="<f8").reshape(rows, cols)
+    return kind, (None if sample_index < 0 else sample_index), meta, data
+
+def _parse_address(address):
+    """'tcp://host:port' or 'unix:///path/to.sock' -> (family, sockaddr)."""
+    if address.startswith("unix://"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix-domain sockets are not available on this platform; use a tcp:// address.")
+        return socket.AF_UNIX, address[len("unix://"):]
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported publisher address '{address}' (use tcp://host:port or unix:///path).")
+
+def subscribe(address=DEFAULT_ADDRESS, timeout=None):
+    """
+    Connects to a LivePublisher and yields its frames as
+    (kind name, sample_index, meta, data) tuples, e.g. from a notebook:
+
+        for kind, index, meta, data in subscribe("tcp://127.0.0.1:5555"):
+            ...
+    """
+    family, sockaddr = _parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(sockaddr)
+        while True:
+            kind, sample_index, meta, data = read_frame(sock)
+            yield KIND_NAMES.get(kind, kind), sample_index, meta, data
+
+
+class _Subscriber:
+    """One connection: a bounded drop-oldest frame queue drained by its own sender thread."""
+
+    def __init__(self, sock, peer, max_frames):
+        self.sock = sock
+        self.peer = peer
+        self.frames = deque(maxlen=max_frames)
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, name=f"Subscriber {peer}", daemon=True).start()
+
+    def push(self, frame):
+        with self._cond:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.frames and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return
+                frame = self.frames.popleft()
+            try:
+                self.sock.sendall(frame)
+                self.sent += 1
+            except OSError:
+                self.close()
+                return
+
+
+class LivePublisher:
+    """
+    Streams live data to any number of local subscribers.
+
+    publish() only encodes a frame once and appends it to each subscriber's
+    bounded queue, so the acquisition thread never waits on a socket: every
+    subscriber has its own sender thread, and when one falls behind its
+    oldest frames are dropped (and counted) instead of stalling the DAQ.
+    New subscribers first receive the current HELLO frame describing the
+    run and the column layout of CHUNK and CYCLE frames.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, buffer_frames=DEFAULT_BUFFER_FRAMES):
+        """
+        Args:
+            address (str): 'tcp://127.0.0.1:port' or 'unix:///path/to.sock'.
+            buffer_frames (int): Frames queued per subscriber before dropping the oldest.
+        """
+        self.address = address
+        self.buffer_frames = int(buffer_frames)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._hello = pack_frame(HELLO, meta=self._schema({}))
+
+        family, sockaddr = _parse_address(address)
+        if family != socket.AF_INET:
+            try:
+                os.unlink(sockaddr)  # stale socket file of an earlier run
+            except OSError:
+                pass
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(sockaddr)
+        self._server.listen()
+        self._closed = False
+        threading.Thread(target=self._accept, name="LivePublisher", daemon=True).start()
+        logging.info(f"Live data publisher listening on {address}")
+
+    @staticmethod
+    def _schema(run):
+        return dict(run, version=VERSION, chunk_columns=list(CHUNK_COLUMNS), cycle_columns=list(CYCLE_COLUMNS))
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, peer = self._server.accept()
+            except OSError:
+                return
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = _Subscriber(sock, peer or "unix", self.buffer_frames)
+            subscriber.push(self._hello)
+            with self._lock:
+                self._subscribers = [s for s in self._subscribers if not s.closed] + [subscriber]
+            logging.info(f"Live data subscriber connected ({peer or 'unix'})")
+
+    @property
+    def has_subscribers(self):
+        return any(not s.closed for s in self._subscribers)
+
+    def set_run(self, **run):
+        """Describes a new run (sample rate, mode, ...) to current and future subscribers."""
+        self._hello = pack_frame(HELLO, meta=self._schema(run))
+        self._broadcast(self._hello)
+
+    def publish(self, kind, sample_index=None, data=None, meta=None):
+        """Encodes a frame and queues it for every subscriber. Never blocks on the network."""
+        if self.has_subscribers:
+            self._broadcast(pack_frame(kind, sample_index, data, meta))
+
+    def publish_event(self, timestamp, sample_index, kind, values):
+        """EventLog listener: forwards run events as EVENT frames."""
+        self.publish(EVENT, sample_index, meta=dict(values, time=timestamp, kind=kind))
+
+    def _broadcast(self, frame):
+        for subscriber in self._subscribers:
+            if not subscriber.closed:
+                subscriber.push(frame)
+
+    def stats(self):
+        """Frames sent and dropped per connected subscriber."""
+        return [{'peer': str(s.peer), 'sent': s.sent, 'dropped': s.dropped, 'queued': len(s.frames)}
+                for s in self._subscribers if not s.closed]
+
+    def close(self):
+        self._closed = True
+        try:
+            self._server.close()
+        except OSError:
+            pass
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers = []
+
+
+class CycleSummarizer:
+    """
+    Per crank cycle min/max/mean summaries built incrementally from chunks.
+
+    Cycles are numbered by the fitted crank angle of the stroke reference
+    (cycle k covers angles [2 pi k, 2 pi (k + 1))); a cycle is summarized once
+    the first sample of the next one arrives. The cycle in progress when
+    summarizing starts is incomplete and is not reported.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.cycle = None
+        self._acc = None
+        self._partial = True
+
+    def update(self, first_sample, theta, force, disp, vel, temp):
+        """
+        Adds a chunk and returns the summaries of cycles completed by it.
+
+        Args:
+            first_sample (int): Sample index of the first sample of the chunk.
+            theta (array): Crank angle of every sample [rad] (NaN before the first fit).
+            force, disp, vel, temp (array): Per-sample values.
+
+        Returns:
+            list: (CYCLE_COLUMNS values) arrays, oldest first.
+        """
+        theta = np.asarray(theta, dtype=float)
+        valid = np.isfinite(theta)
+        if not valid.any():
+            return []
+        cycle = np.where(valid, np.floor(theta / (2 * np.pi)), -np.inf)
+        if self.cycle is not None:
+            cycle = np.maximum(cycle, self.cycle)
+        cycle = np.maximum.accumulate(cycle)  # refits never move a sample into an earlier cycle
+        start = int(np.argmax(valid))
+        bounds = np.concatenate(([start], start + 1 + np.flatnonzero(np.diff(cycle[start:])), [theta.size]))
+
+        done = []
+        columns = (force, disp, vel, temp)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            c = cycle[lo]
+            if self.cycle is None:
+                self._partial = True
+            elif c != self.cycle:
+                if not self._partial:
+                    done.append(self._summary())
+                self._acc = None
+                self._partial = False
+            self.cycle = c
+            if self._acc is None:
+                self._acc = {'start': first_sample + lo, 'n': 0, 'min': np.full(4, np.inf),
+                             'max': np.full(4, -np.inf), 'sum': np.zeros(4)}
+            block = np.array([np.asarray(col[lo:hi], dtype=float) for col in columns])
+            self._acc['n'] += hi - lo
+            self._acc['min'] = np.fmin(self._acc['min'], np.nanmin(block, axis=1, initial=np.inf))
+            self._acc['max'] = np.fmax(self._acc['max'], np.nanmax(block, axis=1, initial=-np.inf))
+            self._acc['sum'] += np.nansum(block, axis=1)
+        return done
+
+    def _summary(self):
+        a = self._acc
+        mean = a['sum'] / max(a['n'], 1)
+        return np.array([self.cycle, a['start'], a['n'],
+                         a['min'][0], a['max'][0], mean[0],
+                         a['min'][1], a['max'][1],
+                         a['min'][2], a['max'][2], mean[3]])
@@ -0,0 +1,149 @@
+import numpy as np
+
+DEFAULT_BINS = 1024
+MAX_RANGE_SPREAD = 8  # the bin range grows to at most this many times the p1..p99 spread
+
+class QuantileSketch:
+    """
+    Constant-memory summary of a sample stream: count, min, max, mean and a
+    fixed set of quantile estimates.
+
+    Samples are counted into a fixed number of equal-width bins with one
+    np.bincount per chunk, so updates are vectorized (no per-sample Python
+    work). The bin range starts around the first chunk and doubles whenever
+    samples fall outside it, merging neighbouring bins, but only up to
+    MAX_RANGE_SPREAD times the current p1..p99 spread: isolated outliers
+    (e.g. a sensor glitch) are clamped into the edge bins instead of
+    coarsening every later estimate. Quantiles are interpolated within a
+    bin, so their error is below one bin width. Non-finite samples are
+    ignored.
+
+    Used for plot autoscaling and for live summary stats such as the force
+    percentiles of each run profile segment.
+    """
+
+    def __init__(self, quantiles=(0.01, 0.5, 0.99), bins=DEFAULT_BINS):
+        if any(not 0.0 < p < 1.0 for p in quantiles):
+            raise ValueError(f"Quantiles must be in (0, 1), got {quantiles}.")
+        if bins < 2 or bins % 2:
+            raise ValueError(f"Bin count must be an even number >= 2, got {bins}.")
+        self.quantiles = tuple(quantiles)
+        self.bins = int(bins)
+        self.reset()
+
+    def reset(self):
+        """Discards all samples seen so far."""
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._sum = 0.0
+        self._counts = np.zeros(self.bins, dtype=np.int64)
+        self._lo = None      # lower edge of the first bin
+        self._width = None   # bin width
+
+    def update(self, samples):
+        """Adds a chunk of new samples to the sketch."""
+        values = np.asarray(samples, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+
+        chunk_min, chunk_max = float(values.min()), float(values.max())
+        self.count += values.size
+        self._sum += float(values.sum())
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+
+        if self._lo is None:
+            self._fit_range(values)
+        elif chunk_min < self._lo or chunk_max >= self._lo + self._width * self.bins:
+            if self.count < 2 * values.size:
+                # the history is smaller than this chunk (e.g. a lone first
+                # sample): re-centre on the chunk rather than grow around it
+                self._fit_range(values)
+            else:
+                self._cover(chunk_min, chunk_max)
+        self._counts += self._bin(values)
+
+    def _bin(self, values, weights=None):
+        """Counts values into the current bins, clamping outliers to the edges."""
+        idx = ((values - self._lo) / self._width).astype(np.int64)
+        np.clip(idx, 0, self.bins - 1, out=idx)
+        counts = np.bincount(idx, weights=weights, minlength=self.bins)
+        return counts.astype(np.int64) if weights is not None else counts
+
+    def _fit_range(self, values):
+        """
+        Sets the bin range to twice the p1..p99 span of values, centred on it,
+        re-binning any samples already counted at their old bin centres.
+        """
+        if values.size >= 100:
+            low, high = np.percentile(values, (1, 99))
+        else:
+            low, high = values.min(), values.max()
+        span = float(high - low)
+        if span == 0:
+            span = max(abs(low), 1.0) * 1e-3
+        old = None
+        if self._lo is not None and self._counts.any():
+            old = (self._lo + (np.arange(self.bins) + 0.5) * self._width, self._counts)
+        self._lo = low - span / 2
+        self._width = 2 * span / self.bins
+        self._counts = self._bin(*old) if old else np.zeros(self.bins, dtype=np.int64)
+
+    def _cover(self, low, high):
+        """
+        Doubles the bin range (merging bin pairs) until it covers [low, high]
+        or reaches MAX_RANGE_SPREAD times the p1..p99 spread of the samples
+        counted so far; samples still outside land in the edge bins.
+        """
+        if self._counts.any():
+            spread = self._value(0.99) - self._value(0.01)
+        else:
+            spread = self._width * self.bins / 2
+        max_range = MAX_RANGE_SPREAD * max(spread, self._width)
+        while ((low < self._lo or high >= self._lo + self._width * self.bins)
+               and 2 * self._width * self.bins <= max_range):
+            merged = self._counts.reshape(-1, 2).sum(axis=1)
+            counts = np.zeros(self.bins, dtype=np.int64)
+            if low < self._lo:
+                # grow downwards: the old range becomes the upper half
+                counts[self.bins // 2:] = merged
+                self._lo -= self._width * self.bins
+            else:
+                counts[:self.bins // 2] = merged
+            self._counts = counts
+            self._width *= 2
+
+    def quantile(self, p):
+        """Returns the estimate for a tracked quantile p, or None if empty."""
+        if p not in self.quantiles:
+            raise KeyError(f"Quantile {p} is not tracked by this sketch (tracked: {self.quantiles}).")
+        if self.count == 0:
+            return None
+        return float(min(max(self._value(p), self.min), self.max))
+
+    def _value(self, p):
+        """Quantile p of the binned counts, interpolated within its bin."""
+        cum = np.cumsum(self._counts)
+        target = p * cum[-1]
+        k = min(int(np.searchsorted(cum, target, side='left')), self.bins - 1)
+        before = cum[k] - self._counts[k]
+        frac = (target - before) / self._counts[k] if self._counts[k] else 0.5
+        return self._lo + (k + frac) * self._width
+
+    @property
+    def mean(self):
+        return self._sum / self.count if self.count else None
+
+    def summary(self):
+        """Returns a dict with count, min, max, mean and every tracked quantile."""
+        stats = {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+        }
+        for p in self.quantiles:
+            stats[f"p{p * 100:g}"] = self.quantile(p)
+        return stats
@@ -0,0 +1,175 @@
+import time
+import logging
+from profiling import profiler
+
+class RenderTarget:
+    """A plot (or group of plots) redrawn by the RenderScheduler."""
+
+    def __init__(self, name, update_fn, tab=None, expensive=False, max_divider=8):
+        """
+        Args:
+            name (str): Name used in frame reports.
+            update_fn (callable): Called as update_fn(draw). With draw=False the
+                target should only ingest new data and skip all rendering.
+            tab (tk widget, optional): Notebook tab holding the plot. The target is
+                only drawn while this tab is selected. None means always visible.
+            expensive (bool): Expensive targets are rendered at a reduced rate
+                when the frame budget is exceeded.
+            max_divider (int): Lowest allowed rate for expensive targets, as
+                "render once every max_divider frames".
+        """
+        self.name = name
+        self.update_fn = update_fn
+        self.tab = tab
+        self.expensive = expensive
+        self.max_divider = max_divider
+        self.stage = f"plot_{name}"  # profiler stage of a drawn update
+
+        self.divider = 1     # render every `divider` frames
+        self.skipped = 0     # frames since last render
+        self.dropped = 0     # renders skipped because of the budget
+        self.deferred = 0    # renders skipped by a reduced render rate (divider)
+        self.hidden = 0      # renders skipped while the tab or window was hidden
+
+
+class RenderScheduler:
+    """
+    Frame-budgeted redraw of the GUI plots.
+
+    Each frame the visible targets are drawn cheapest first. Hidden targets only
+    ingest data. When a frame overruns its budget, expensive targets are
+    degraded to half their render rate (down to 1/max_divider), and are
+    restored step by step once frames fit comfortably in the budget again.
+    Frame times and skipped renders (over budget, reduced rate or hidden) are
+    logged every report_interval_s seconds.
+    """
+
+    def __init__(self, notebook, budget_ms=50, report_interval_s=10, recover_frames=20):
+        self.notebook = notebook
+        self.budget_s = budget_ms / 1000.0
+        self.report_interval_s = report_interval_s
+        self.recover_frames = recover_frames  # good frames needed before restoring a rate step
+        self.targets = []
+        self._good_frames = 0
+        self.reset_stats()
+
+    def add_target(self, name, update_fn, tab=None, expensive=False, max_divider=8):
+        target = RenderTarget(name, update_fn, tab=tab, expensive=expensive, max_divider=max_divider)
+        self.targets.append(target)
+        # cheap targets first so the budget is spent on them before expensive ones
+        self.targets.sort(key=lambda t: t.expensive)
+        return target
+
+    def reset_stats(self):
+        """Clears frame statistics, e.g. at the start of a new run."""
+        self.frame_count = 0
+        self.overrun_frames = 0
+        self.frame_time_sum = 0.0
+        self.frame_time_max = 0.0
+        self.last_frame_time = 0.0
+        self._last_report = time.perf_counter()
+        for target in self.targets:
+            target.dropped = 0
+            target.deferred = 0
+            target.hidden = 0
+
+    def _is_visible(self, target):
+        if target.tab is None:
+            return True
+        try:
+            return self.notebook.select() == str(target.tab)
+        except Exception:
+            return True
+
+    def run_frame(self):
+        """Updates all targets once, respecting visibility and the frame budget."""
+        start = time.perf_counter()
+
+        try:
+            window_visible = bool(self.notebook.winfo_viewable())
+        except Exception:
+            window_visible = True
+
+        for target in self.targets:
+            draw = window_visible and self._is_visible(target)
+            if not draw:
+                target.hidden += 1
+
+            if draw and target.expensive:
+                target.skipped += 1
+                over_budget = (time.perf_counter() - start) > self.budget_s
+                if over_budget:
+                    target.dropped += 1
+                    draw = False
+                elif target.skipped < target.divider:
+                    target.deferred += 1
+                    draw = False
+                else:
+                    target.skipped = 0
+
+            t0 = profiler.tic() if draw else None
+            try:
+                target.update_fn(draw)
+            except Exception as e:
+                logging.error(f"Render target '{target.name}' failed: {e}")
+            profiler.toc(target.stage, t0)
+
+        frame_time = time.perf_counter() - start
+        self._record_frame(frame_time)
+        self._adapt(frame_time)
+        return frame_time
+
+    def _adapt(self, frame_time):
+        """Degrades or restores the render rate of expensive targets."""
+        if frame_time > self.budget_s:
+            self._good_frames = 0
+            for target in self.targets:
+                if target.expensive and target.divider < target.max_divider:
+                    target.divider *= 2
+                    logging.info(f"Render budget exceeded ({frame_time*1000:.1f} ms): "
+                                 f"'{target.name}' degraded to 1/{target.divider} frames")
+        elif frame_time < 0.5 * self.budget_s:
+            self._good_frames += 1
+            if self._good_frames >= self.recover_frames:
+                self._good_frames = 0
+                for target in self.targets:
+                    if target.expensive and target.divider > 1:
+                        target.divider //= 2
+
+    def _record_frame(self, frame_time):
+        self.frame_count += 1
+        self.last_frame_time = frame_time
+        self.frame_time_sum += frame_time
+        self.frame_time_max = max(self.frame_time_max, frame_time)
+        if frame_time > self.budget_s:
+            self.overrun_frames += 1
+
+        now = time.perf_counter()
+        if now - self._last_report >= self.report_interval_s:
+            self._last_report = now
+            # only surface the report at INFO once frames started overrunning
+            level = logging.INFO if self.overrun_frames else logging.DEBUG
+            logging.log(level, self.report())
+
+    def stats(self):
+        """Returns a dict of frame statistics since the last reset."""
+        return {
+            'frames': self.frame_count,
+            'mean_frame_ms': 1000 * self.frame_time_sum / self.frame_count if self.frame_count else 0.0,
+            'max_frame_ms': 1000 * self.frame_time_max,
+            'last_frame_ms': 1000 * self.last_frame_time,
+            'overrun_frames': self.overrun_frames,
+            'dropped_renders': {t.name: t.dropped + t.deferred + t.hidden for t in self.targets},
+            'dropped_by_reason': {t.name: {'budget': t.dropped, 'rate': t.deferred, 'hidden': t.hidden}
+                                  for t in self.targets},
+            'render_divider': {t.name: t.divider for t in self.targets},
+        }
+
+    def report(self):
+        """One-line human readable frame report."""
+        s = self.stats()
+        dropped = ", ".join(f"{name}={n} (budget {r['budget']}, rate {r['rate']}, hidden {r['hidden']})"
+                            for (name, n), r in zip(s['dropped_renders'].items(), s['dropped_by_reason'].values()))
+        return (f"GUI frames: {s['frames']}, mean {s['mean_frame_ms']:.1f} ms, "
+                f"max {s['max_frame_ms']:.1f} ms, over budget {s['overrun_frames']}, "
+                f"dropped renders [{dropped}]")
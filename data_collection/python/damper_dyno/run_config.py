@@ -0,0 +1,257 @@
+import datetime
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+import numpy as np
+from scipy.signal import butter
+from calibration import CalibrationEngine
+from kinematics import linear_speed_to_rpm
+from utils import convert_speed_to_duty_cycle, gearbox_scaling
+
+# Expected type of every known setting. Unknown keys fall back to coerce_value.
+SETTINGS_SCHEMA = {
+    'daq_device_name': str,
+    'sample_rate': int,
+    'chunk_size': int,
+    'lpf_cutoff': float,
+    'output_dir': str,
+    'rpm_min': float,
+    'rpm_max': float,
+    'duty_cycle_min': float,
+    'duty_cycle_max': float,
+    'force_slope': float,
+    'force_offset': float,
+    'disp_slope': float,
+    'disp_offset': float,
+    'temp_slope': float,
+    'temp_offset': float,
+    'tare_duration_s': float,
+    'tare_channels': list,
+    'default_num_cycles': int,
+    'crank_radius_in': float,
+    'rod_length_in': float,
+    'stroke_glitch_threshold_mm': float,
+    'fv_use_reference_velocity': int,
+    'fv_confidence_band': int,
+    'fv_band_bins': int,
+    'fv_band_max_velocity': float,
+    'default_linear_speed_ips': float,
+    'hlfb_enable': int,
+    'torque_saturation_fraction': float,
+    'gui_frame_period_ms': int,
+    'gui_frame_budget_ms': float,
+    'gui_offscreen_render': int,
+    'plot_autoscale': int,
+    'catalog_update_on_save': int,
+    'profiling_enable': int,
+    'profiling_hud': int,
+    'profiling_hud_period_ms': int,
+    'profiling_dump_on_end': int,
+    'publisher_enable': int,
+    'publisher_address': str,
+    'publisher_buffer_frames': int,
+    'run_profile_speeds_are_rpm': int,
+    'run_profile': list,
+    'motor_max_torque_map': list,
+}
+
+def coerce_value(value):
+    """Best-effort numeric conversion of a setting with no schema entry."""
+    try:
+        return float(value) if '.' in str(value) else int(value)
+    except (ValueError, TypeError):
+        return value
+
+def coerce_setting(key, value):
+    """
+    Converts a raw setting (e.g. a Tk StringVar string) to its schema type.
+
+    Raises:
+        ValueError: If the value cannot be converted, or is not integral for an int setting.
+    """
+    expected = SETTINGS_SCHEMA.get(key)
+    if expected is None:
+        return coerce_value(value)
+    if expected is list:
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"Setting '{key}' must be a list, got {value!r}.")
+        return [list(row) if isinstance(row, (list, tuple)) else row for row in value]
+    try:
+        if expected is int and not isinstance(value, int):
+            # "1000.0" is accepted, "1000.7" is not silently truncated
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError
+            return int(number)
+        return expected(value)
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError(f"Setting '{key}' must be of type {expected.__name__}, got {value!r}.")
+
+def _readonly(array):
+    array = np.array(array, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True, eq=False)
+class RunConfig:
+    """
+    Typed, validated and immutable snapshot of everything a run needs.
+
+    Compiled once from the settings (see compile_run_config) so the acquisition
+    path only reads precomputed state: filter coefficients, the compiled
+    calibration engine and the per-segment RPM / cycle / PWM duty tables.
+    Also serves as the metadata sidecar saved with each capture.
+    """
+    settings: Mapping[str, Any]
+    mode: str                                   # 'single' or 'profile'
+    sample_rate: int
+    chunk_size: int
+    lpf_cutoff: float
+    output_dir: str
+    filter_b: np.ndarray
+    filter_a: np.ndarray
+    calibration: CalibrationEngine
+    segment_rpm: Tuple[float, ...]              # motor RPM per segment
+    segment_cycles: Tuple[float, ...]           # crank cycles per segment
+    segment_duration_s: Tuple[float, ...]       # run time per segment
+    segment_duty: Tuple[float, ...]             # PWM duty (%) per segment
+    segment_linear_speed_ips: Optional[Tuple[float, ...]]
+    compiled_at: str
+
+    def get(self, key, default=None):
+        """Dict-style access to the typed settings."""
+        return self.settings.get(key, default)
+
+    def __getitem__(self, key):
+        return self.settings[key]
+
+    def to_metadata(self):
+        """JSON-serializable description of the run, stored next to the capture."""
+        return {
+            'compiled_at': self.compiled_at,
+            'mode': self.mode,
+            'settings': dict(self.settings),
+            'filter': {'b': self.filter_b.tolist(), 'a': self.filter_a.tolist()},
+            'tare_offsets': dict(self.calibration.tare_offsets),
+            'segments': {
+                'rpm': list(self.segment_rpm),
+                'cycles': list(self.segment_cycles),
+                'duration_s': list(self.segment_duration_s),
+                'duty_cycle': list(self.segment_duty),
+                'linear_speed_ips': (list(self.segment_linear_speed_ips)
+                                     if self.segment_linear_speed_ips is not None else None),
+            },
+        }
+
+
+def _validate(s):
+    errors = []
+    if s['sample_rate'] <= 0:
+        errors.append("sample_rate must be positive")
+    if s['chunk_size'] <= 0:
+        errors.append("chunk_size must be positive")
+    if not 0 < s['lpf_cutoff'] < s['sample_rate'] / 2:
+        errors.append("lpf_cutoff must be between 0 and sample_rate/2")
+    if s['rpm_max'] <= s['rpm_min']:
+        errors.append("rpm_max must be greater than rpm_min")
+    if not 0 <= s['duty_cycle_min'] < s['duty_cycle_max'] <= 100:
+        errors.append("duty cycle range must satisfy 0 <= min < max <= 100")
+    if s['crank_radius_in'] <= 0:
+        errors.append("crank_radius_in must be positive")
+    if s['rod_length_in'] < s['crank_radius_in']:
+        errors.append("rod_length_in must be at least crank_radius_in")
+    torque_map = s.get('motor_max_torque_map')
+    if torque_map is not None:
+        try:
+            rows = np.asarray(torque_map, dtype=float)
+        except (TypeError, ValueError):
+            rows = None
+        if rows is None or rows.ndim != 2 or rows.shape[0] != 2 or rows.shape[1] < 2:
+            errors.append("motor_max_torque_map must be two numeric rows (RPM, max torque) of equal length")
+    if errors:
+        raise ValueError("Invalid settings: " + "; ".join(errors) + ".")
+
+def compile_run_config(raw_settings, mode='single', tare_offsets=None):
+    """
+    Builds a RunConfig from raw settings.
+
+    Args:
+        raw_settings (dict): Settings as loaded from config.json or Tk variables.
+        mode (str): 'single' runs default_linear_speed_ips for default_num_cycles;
+            'profile' runs every segment of run_profile.
+        tare_offsets (dict, optional): Per-channel tare offsets for the calibration.
+
+    Raises:
+        ValueError: If a setting has the wrong type or an invalid value.
+    """
+    settings = {key: coerce_setting(key, value) for key, value in raw_settings.items()}
+    missing = [key for key in ('sample_rate', 'chunk_size', 'lpf_cutoff', 'output_dir', 'rpm_min',
+                               'rpm_max', 'duty_cycle_min', 'duty_cycle_max', 'crank_radius_in',
+                               'rod_length_in') if key not in settings]
+    if missing:
+        raise ValueError(f"Missing settings: {', '.join(missing)}.")
+    _validate(settings)
+
+    fs = settings['sample_rate']
+    b, a = butter(2, settings['lpf_cutoff'] / (fs / 2), btype='low')
+
+    calibration = CalibrationEngine.from_settings(settings)
+    tare_channels = settings.get('tare_channels', ['force'])
+    unknown = [name for name in tare_channels if name not in calibration.channel_names]
+    if not tare_channels or unknown:
+        raise ValueError(f"Invalid settings: tare_channels must name channels from "
+                         f"{calibration.channel_names}, got {tare_channels!r}.")
+    calibration.tare_offsets.update(tare_offsets or {})
+    calibration.compile()
+
+    # Segment tables: motor RPM, crank cycles and PWM duty for each step
+    if mode == 'single':
+        linear_speeds = [settings['default_linear_speed_ips']]
+        cycles = [settings['default_num_cycles']]
+        speeds_are_rpm = False
+    elif mode == 'profile':
+        profile = settings.get('run_profile')
+        if not profile or len(profile) < 2:
+            raise ValueError("No run_profile found in config.json.")
+        linear_speeds, cycles = [float(v) for v in profile[0]], [float(c) for c in profile[1]]
+        if len(linear_speeds) != len(cycles):
+            raise ValueError("run_profile rows must be the same length.")
+        speeds_are_rpm = bool(settings.get('run_profile_speeds_are_rpm', 0))
+    else:
+        raise ValueError(f"Unknown run mode '{mode}'.")
+
+    if any(v <= 0 for v in linear_speeds) or any(c <= 0 for c in cycles):
+        raise ValueError("Run speeds and cycle counts must be positive.")
+
+    if speeds_are_rpm:
+        rpm = [float(v) for v in linear_speeds]
+        linear_speeds = None
+    else:
+        rpm = np.atleast_1d(linear_speed_to_rpm(linear_speeds, Lc=settings['rod_length_in'],
+                                                R=settings['crank_radius_in'])).tolist()
+
+    # cycles are crank cycles; the motor turns gear-ratio times faster
+    duration = [gearbox_scaling(10, c) / r * 60.0 for c, r in zip(cycles, rpm)]
+
+    duty = [convert_speed_to_duty_cycle(r, [settings['rpm_min'], settings['rpm_max']],
+                                        [settings['duty_cycle_min'], settings['duty_cycle_max']])
+            for r in rpm]
+
+    return RunConfig(
+        settings=MappingProxyType(settings),
+        mode=mode,
+        sample_rate=fs,
+        chunk_size=settings['chunk_size'],
+        lpf_cutoff=settings['lpf_cutoff'],
+        output_dir=settings['output_dir'],
+        filter_b=_readonly(b),
+        filter_a=_readonly(a),
+        calibration=calibration,
+        segment_rpm=tuple(rpm),
+        segment_cycles=tuple(float(c) for c in cycles),
+        segment_duration_s=tuple(duration),
+        segment_duty=tuple(float(d) for d in duty),
+        segment_linear_speed_ips=tuple(linear_speeds) if linear_speeds is not None else None,
+        compiled_at=datetime.datetime.now().isoformat(timespec='seconds'),
+    )
@@ -3,6 +3,7 @@ import json
 import tkinter as tk
 from tkinter import messagebox
 import logging
+from run_config import compile_run_config, coerce_setting
 
 class SettingsManager:
     """Handles loading, saving, and managing application settings from a JSON file."""
@@ -11,6 +12,7 @@ class SettingsManager:
         self.filepath = filepath
         self.settings = {}
         self.setting_vars = {}
+        self._config_cache = {}  # compiled RunConfigs, cleared whenever a setting changes
         self._load_data_from_file()
 
     def _load_data_from_file(self):
@@ -18,6 +20,7 @@ class SettingsManager:
         try:
             with open(self.filepath, 'r') as f:
                 self.settings = json.load(f)
+            self._config_cache.clear()
 
             logging.info(f"Successfully loaded settings from '{self.filepath}'")
         except FileNotFoundError:
@@ -31,20 +34,46 @@ class SettingsManager:
         """Creates the tkinter StringVars. Must be called AFTER the main window exists."""
         for key, val in self.settings.items():
             self.setting_vars[key] = tk.StringVar(master=master, value=val)
+            self.setting_vars[key].trace_add('write', self._invalidate_config)
+
+    def _invalidate_config(self, *args):
+        self._config_cache.clear()
+
+    def raw_settings(self):
+        """
+        Current settings: Tk variable values for scalars, and the loaded values
+        for list settings (run_profile, motor_max_torque_map), which are not
+        editable through a StringVar.
+        """
+        raw = dict(self.settings)
+        for key, var in self.setting_vars.items():
+            if not isinstance(self.settings.get(key), (list, tuple)):
+                raw[key] = var.get()
+        return raw
+
+    def compile_run_config(self, mode='single', tare_offsets=None):
+        """
+        Returns the RunConfig for the current settings, compiling it only when
+        the settings (or tare offsets) changed since the last call.
+
+        Raises:
+            ValueError: If the settings are invalid.
+        """
+        key = (mode, tuple(sorted((tare_offsets or {}).items())))
+        if key not in self._config_cache:
+            self._config_cache[key] = compile_run_config(self.raw_settings(), mode=mode, tare_offsets=tare_offsets)
+        return self._config_cache[key]
 
     def save(self):
         """Saves the current values from the StringVars back to the config file."""
         settings_to_save = {}
         # for all items, check and save to config.json
-        for key, var in self.setting_vars.items():
-            value = var.get()
+        for key, value in self.raw_settings().items():
             try:
-                if '.' in str(value):
-                    settings_to_save[key] = float(value)
-                else:
-                    settings_to_save[key] = int(value)
-            except (ValueError, TypeError):
-                settings_to_save[key] = value
+                settings_to_save[key] = coerce_setting(key, value)
+            except ValueError as e:
+                messagebox.showerror("Invalid Setting", str(e))
+                return
 
         try:
             with open(self.filepath, 'w') as f:
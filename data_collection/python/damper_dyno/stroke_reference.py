@@ -0,0 +1,191 @@
+import math
+import logging
+import numpy as np
+from kinematics import GEAR_RATIO, slider_crank_kinematics
+
+MM_PER_IN = 25.4
+INITIAL_SEARCH_POINTS = 1024  # samples of the first cycle used for the coarse phase search
+
+class StrokeReferenceTracker:
+    """
+    Live model-referenced stroke trajectory.
+
+    The stroke is fully determined by the crank angle and the slider-crank
+    geometry, so every cycle the measured displacement is fitted to
+
+        x(t) = polarity * x_sc(omega * t + phase) + offset
+
+    with a few warm-started Gauss-Newton steps over the last cycle of samples
+    (phase, crank speed omega and offset are the fitted parameters). The fit
+    is then extrapolated over incoming chunks to give a noise-free, lag-free
+    reference velocity and per-sample displacement residuals, which flag linpot
+    glitches and motor speed droop without any heavy filtering.
+    """
+
+    def __init__(self, crank_radius_mm, rod_length_mm, sample_rate, gear_ratio=GEAR_RATIO,
+                 glitch_threshold_mm=1.0, droop_tolerance=0.05, gn_iterations=4):
+        """
+        Args:
+            crank_radius_mm (float): Crank radius in mm.
+            rod_length_mm (float): Connecting rod length in mm.
+            sample_rate (float): Sample rate of the displacement signal in Hz.
+            gear_ratio (float): Motor/crank ratio used to convert the target RPM.
+            glitch_threshold_mm (float): |residual| above which a sample is flagged.
+            droop_tolerance (float): Fractional speed loss vs. target flagged as droop.
+            gn_iterations (int): Gauss-Newton iterations per cycle fit.
+        """
+        self.R = crank_radius_mm
+        self.Lc = rod_length_mm
+        self.fs = sample_rate
+        self.gear_ratio = gear_ratio
+        self.glitch_threshold = glitch_threshold_mm
+        self.droop_tolerance = droop_tolerance
+        self.gn_iterations = gn_iterations
+        self.target_rpm = None
+        self.reset()
+
+    def reset(self):
+        """Clears the fit and sample history, e.g. at the start of a run."""
+        self.sample_index = 0
+        self.nominal_omega = None
+        self.omega = None          # fitted crank speed [rad/s]
+        self.phase = None          # fitted crank angle at t = 0 [rad]
+        self.offset = 0.0          # fitted displacement offset [mm]
+        self.polarity = 1.0        # +1 if the linpot reads positive along the stroke
+        self.fit_rms = None
+        self.droop = False
+        self._buf_t = np.empty(0)
+        self._buf_x = np.empty(0)
+        self._since_fit = 0
+
+    def set_target_rpm(self, motor_rpm):
+        """Updates the commanded motor speed, e.g. at a run profile segment change."""
+        self.target_rpm = motor_rpm
+        if motor_rpm is None or motor_rpm <= 0:
+            self.nominal_omega = None
+            return
+
+        omega_new = motor_rpm * 2 * math.pi / 60.0 / self.gear_ratio
+        if self.omega is not None and self.phase is not None:
+            # keep the crank angle continuous at the current time
+            t_now = self.sample_index / self.fs
+            self.phase += (self.omega - omega_new) * t_now
+        self.nominal_omega = omega_new
+        self.omega = omega_new
+
+    def samples_per_cycle(self):
+        omega = self.omega or self.nominal_omega
+        if not omega:
+            return None
+        return max(8, int(round(2 * math.pi / omega * self.fs)))
+
+    def process(self, disp):
+        """
+        Processes a chunk of measured displacement [mm].
+
+        Returns:
+            dict: 'x_ref' and 'vel_ref' (mm, mm/s), 'residual' (mm), 'glitch'
+            (bool mask) per sample, all NaN/False before the first fit, plus
+            'omega', 'phase', 'offset', 'fit_rms' and 'droop' of the current fit.
+        """
+        disp = np.asarray(disp, dtype=float)
+        n = disp.size
+        t = (self.sample_index + np.arange(n)) / self.fs
+        self.sample_index += n
+
+        # keep (at most) the last cycle of samples for the next fit
+        cycle_n = self.samples_per_cycle()
+        if cycle_n is not None:
+            self._buf_t = np.concatenate((self._buf_t, t))[-cycle_n:]
+            self._buf_x = np.concatenate((self._buf_x, disp))[-cycle_n:]
+            self._since_fit += n
+            if self._since_fit >= cycle_n and self._buf_t.size >= cycle_n:
+                self._fit(self._buf_t, self._buf_x)
+                self._since_fit = 0
+
+        if self.phase is None:
+            nan = np.full(n, np.nan)
+            return {'x_ref': nan, 'vel_ref': nan.copy(), 'residual': nan.copy(),
+                    'glitch': np.zeros(n, dtype=bool), 'omega': None, 'phase': None,
+                    'offset': None, 'fit_rms': None, 'droop': False}
+
+        x_ref, vel_ref = self._reference(t)
+        residual = disp - x_ref
+        return {
+            'x_ref': x_ref,
+            'vel_ref': vel_ref,
+            'residual': residual,
+            'glitch': np.abs(residual) > self.glitch_threshold,
+            'omega': self.omega,
+            'phase': self.phase,
+            'offset': self.offset,
+            'fit_rms': self.fit_rms,
+            'droop': self.droop,
+        }
+
+    def _reference(self, t):
+        x, x_dot, _ = slider_crank_kinematics(self.omega * t + self.phase, self.omega, self.Lc, self.R)
+        return self.polarity * np.asarray(x) + self.offset, self.polarity * np.asarray(x_dot)
+
+    def _initial_phase(self, t_loc, x):
+        """Coarse phase/polarity search at the nominal speed for the first fit."""
+        # a 5 degree grid needs far fewer points than a full cycle at high sample rates
+        step = max(1, t_loc.size // INITIAL_SEARCH_POINTS)
+        t_loc, x = t_loc[::step], x[::step]
+        phases = np.linspace(0, 2 * np.pi, 72, endpoint=False)
+        theta = self.omega * t_loc[None, :] + phases[:, None]
+        model, _, _ = slider_crank_kinematics(theta, self.omega, self.Lc, self.R)
+
+        best = None
+        for polarity in (1.0, -1.0):
+            shaped = polarity * model
+            offsets = (x[None, :] - shaped).mean(axis=1)
+            sse = ((x[None, :] - shaped - offsets[:, None])**2).sum(axis=1)
+            i = int(np.argmin(sse))
+            if best is None or sse[i] < best[0]:
+                best = (sse[i], polarity, phases[i], offsets[i])
+        _, self.polarity, phase_ref, self.offset = best
+        return phase_ref
+
+    def _fit(self, t, x):
+        """Fits phase, speed and offset to one cycle of samples."""
+        # local time about the window centre keeps phase and speed decoupled
+        t_ref = 0.5 * (t[0] + t[-1])
+        t_loc = t - t_ref
+
+        if self.phase is None:
+            phase_ref = self._initial_phase(t_loc, x)
+        else:
+            phase_ref = self.omega * t_ref + self.phase
+        omega, offset = self.omega, self.offset
+
+        for _ in range(self.gn_iterations):
+            model, dx_dtheta, _ = slider_crank_kinematics(omega * t_loc + phase_ref, 1.0, self.Lc, self.R)
+            slope = self.polarity * dx_dtheta
+            r = x - (self.polarity * model + offset)
+            J = np.column_stack((slope, slope * t_loc, np.ones_like(t_loc)))
+            delta, *_ = np.linalg.lstsq(J, r, rcond=None)
+            phase_ref += delta[0]
+            omega += delta[1]
+            offset += delta[2]
+            if np.all(np.abs(delta[:2]) < 1e-6):
+                break
+
+        model, _, _ = slider_crank_kinematics(omega * t_loc + phase_ref, omega, self.Lc, self.R)
+        rms = float(np.sqrt(np.mean((x - (self.polarity * model + offset))**2)))
+
+        # reject diverged fits and keep extrapolating the previous one
+        if not np.isfinite(rms) or omega <= 0 or (self.fit_rms is not None and rms > 10 * max(self.fit_rms, self.glitch_threshold)):
+            logging.warning(f"Stroke reference fit rejected (rms={rms:.3f} mm, omega={omega:.3f} rad/s)")
+            return
+
+        self.omega = omega
+        self.phase = (phase_ref - omega * t_ref) % (2 * np.pi)
+        self.offset = offset
+        self.fit_rms = rms
+
+        droop = (self.nominal_omega is not None and
+                 omega < (1 - self.droop_tolerance) * self.nominal_omega)
+        if droop and not self.droop:
+            logging.warning(f"Motor speed droop: crank at {omega:.2f} rad/s vs target {self.nominal_omega:.2f} rad/s")
+        self.droop = droop
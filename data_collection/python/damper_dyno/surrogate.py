@@ -0,0 +1,184 @@
+import json
+import numpy as np
+
+SETTING_NAMES = ("hsc", "hsr", "lsc", "lsr")
+KEY_NAMES = SETTING_NAMES + ("temp",)
+PW_NAMES = ("F0", "C_LS", "C_HS", "v_knee")
+SIDES = ("pos", "neg")  # compression (v > 0), rebound (v < 0)
+
+class DamperSurrogate:
+    """
+    Compact measured-damper model built from a processed sweep.
+
+    One row per characterized run, keyed by (HSC, HSR, LSC, LSR, mean
+    temperature), holding the combined F-V fits of data_wrangler.m for both
+    directions: the polynomial FV_fit_all coefficients and the piecewise-linear
+    PW_fit_all parameters. Between measured settings the model blends the
+    coefficients of the k nearest rows (inverse squared distance on settings
+    normalized by their sweep range), which is exact at measured settings and
+    equivalent to blending their forces. Weights are computed once per
+    distinct query setting, so evaluating many velocities at few settings is
+    a single Horner pass.
+
+    Units are those of the characterization (in/s and lbf for read_data.m
+    conditioning).
+    """
+
+    def __init__(self, keys, poly, pw, vmax, k=4, meta=None):
+        """
+        Args:
+            keys (array): (M x 5) [hsc, hsr, lsc, lsr, temp] per row.
+            poly (array): (M x 2 x P) polynomial coefficients per side, highest power first.
+            pw (array): (M x 2 x 4) [F0, C_LS, C_HS, v_knee] per side (NaN if no valid fit).
+            vmax (array): (M,) highest |velocity| of each row's data; inputs are clamped to it.
+            k (int): Number of neighbouring rows blended between measured settings.
+            meta (dict, optional): Free-form description saved with the model.
+        """
+        self.keys = np.asarray(keys, dtype=float)
+        self.poly = np.asarray(poly, dtype=float)
+        self.pw = np.asarray(pw, dtype=float)
+        self.vmax = np.asarray(vmax, dtype=float)
+        self.k = int(k)
+        self.meta = meta or {}
+        span = np.ptp(self.keys, axis=0) if len(self.keys) else np.ones(len(KEY_NAMES))
+        self.scale = np.where(span > 0, span, 1.0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # --- serialization ---
+
+    def save(self, path):
+        """Writes the model as an uncompressed .npz (a few kB for a full sweep)."""
+        np.savez(path, keys=self.keys, poly=self.poly, pw=self.pw, vmax=self.vmax,
+                 k=np.array(self.k), meta=np.array(json.dumps(self.meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["keys"], data["poly"], data["pw"], data["vmax"], k=int(data["k"]),
+                       meta=json.loads(str(data["meta"])))
+
+    # --- evaluation ---
+
+    def weights(self, settings, temp=None, model="poly"):
+        """
+        Blending weights of the table rows for query settings.
+
+        Args:
+            settings (array): (U x 4) [hsc, hsr, lsc, lsr] rows.
+            temp (array, optional): (U,) temperatures; None ignores temperature.
+            model (str): Rows without a valid fit for this model are skipped.
+
+        Returns:
+            tuple: (idx, w), both (U x k): row indices and normalized weights.
+        """
+        settings = np.atleast_2d(np.asarray(settings, dtype=float))
+        diff = (settings[:, None, :] - self.keys[None, :, :4]) / self.scale[:4]
+        d2 = np.sum(diff**2, axis=-1)
+        if temp is not None:
+            temp = np.broadcast_to(np.asarray(temp, dtype=float), (settings.shape[0],))
+            d2 = d2 + ((temp[:, None] - self.keys[None, :, 4]) / self.scale[4])**2
+        usable = self._usable(model)
+        d2[:, ~usable] = np.inf
+
+        k = min(self.k, int(usable.sum()))
+        if k == 0:
+            raise ValueError(f"No rows with a valid '{model}' fit in the surrogate.")
+        idx = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        d2k = np.take_along_axis(d2, idx, axis=1)
+        exact = d2k < 1e-12
+        with np.errstate(divide="ignore"):
+            w = np.where(exact.any(axis=1, keepdims=True), exact.astype(float), 1.0 / d2k)
+        w /= w.sum(axis=1, keepdims=True)
+        return idx, w
+
+    def _usable(self, model):
+        if model == "poly":
+            return np.all(np.isfinite(self.poly), axis=(1, 2))
+        if model == "pw":
+            return np.all(np.isfinite(self.pw), axis=(1, 2))
+        raise ValueError(f"Unknown surrogate model '{model}' (use 'poly' or 'pw').")
+
+    def force(self, velocity, settings, temp=None, model="poly"):
+        """
+        Damper force at any velocities for one or many settings.
+
+        Args:
+            velocity (array): Piston velocities.
+            settings (array): [hsc, hsr, lsc, lsr], either one row for all
+                velocities or one row per velocity (shape velocity.shape + (4,)).
+            temp: Temperature (scalar or per velocity); None ignores temperature.
+            model (str): 'poly' (cubic FV_fit_all) or 'pw' (piecewise-linear PW_fit_all).
+
+        Returns:
+            np.ndarray: Force with the shape of velocity.
+        """
+        velocity = np.asarray(velocity, dtype=float)
+        shape = velocity.shape
+        v = velocity.ravel()
+        settings = np.asarray(settings, dtype=float).reshape(-1, 4)
+        per_sample = settings.shape[0] > 1
+        if per_sample and settings.shape[0] != v.size:
+            raise ValueError("settings must be one row or one row per velocity sample.")
+
+        query = settings
+        if temp is not None:
+            t = np.asarray(temp, dtype=float).ravel()
+            if not per_sample and t.size > 1:
+                settings = np.broadcast_to(settings, (v.size, 4))
+                per_sample = True
+            t = np.broadcast_to(t, (settings.shape[0],))
+            query = np.column_stack((settings, t))
+        # weights once per distinct (settings, temp) query
+        unique, inverse = np.unique(query, axis=0, return_inverse=True)
+        inverse = inverse.ravel() if per_sample else np.zeros(v.size, dtype=np.intp)
+        idx, w = self.weights(unique[:, :4], None if temp is None else unique[:, 4], model=model)
+
+        side = (v < 0).astype(np.intp)
+        vmax = np.sum(self.vmax[idx] * w, axis=1)[inverse]
+        v = np.clip(v, -vmax, vmax)
+
+        if model == "poly":
+            coeffs = np.einsum("uk,uksp->usp", w, self.poly[idx])      # (U, 2, P)
+            c = coeffs[inverse, side]                                   # (N, P)
+            out = c[:, 0].copy()
+            for j in range(1, c.shape[1]):
+                out *= v
+                out += c[:, j]
+        else:
+            params = np.einsum("uk,uksp->usp", w, self.pw[idx])[inverse, side]
+            F0, C_LS, C_HS, v_knee = params.T
+            v_abs = np.abs(v)
+            out = F0 + C_LS * np.minimum(v_abs, v_knee) + C_HS * np.maximum(0.0, v_abs - v_knee)
+        return out.reshape(shape)
+
+
+def build_surrogate(dataset, characterization, k=4):
+    """
+    Builds a DamperSurrogate from a ConditionedDataset and its Characterization.
+
+    Runs without valving settings in their name are skipped. The temperature
+    key of each run is its mean conditioned temperature.
+    """
+    runs = characterization.runs
+    n_runs = len(dataset.runs)
+    counts = np.bincount(dataset.samples["run"], minlength=n_runs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_temp = np.bincount(dataset.samples["run"], dataset.samples["temp"], minlength=n_runs) / counts
+
+    rows = [i for i, r in enumerate(dataset.runs) if "valving" in r]
+    keys = np.array([[dataset.runs[i]["valving"][name] for name in SETTING_NAMES] + [mean_temp[i]]
+                     for i in rows], dtype=float).reshape(-1, len(KEY_NAMES))
+    poly = np.stack([np.stack([runs[f"FV_fit_all/{side}/coeffs"][i] for side in SIDES]) for i in rows]) \
+        if rows else np.empty((0, 2, characterization.params["poly_order"] + 1))
+    pw = np.stack([np.stack([[runs[f"PW_fit_all/{side}/{name}"][i] for name in PW_NAMES] for side in SIDES])
+                   for i in rows]) if rows else np.empty((0, 2, len(PW_NAMES)))
+    vmax = np.array([runs["Vmax_total"][i] for i in rows], dtype=float)
+
+    meta = {
+        "runs": [dataset.runs[i]["name"] for i in rows],
+        "key_names": list(KEY_NAMES),
+        "params": characterization.params,
+    }
+    return DamperSurrogate(keys, poly, pw, vmax, k=k, meta=meta)
@@ -0,0 +1,236 @@
+import json
+import logging
+import numpy as np
+from scipy.stats import t as student_t
+
+from uncertainty import uniform_bin_index
+
+SETTING_NAMES = ("hsc", "hsr", "lsc", "lsr")
+STAT_NAMES = ("count", "mean_t", "mean_f", "stt", "stf", "sff")
+DEFAULT_EDGES = np.linspace(-10.0, 10.0, 41)  # in/s, 0.5 in/s bins
+DEFAULT_CONFIDENCE = 0.95  # temp_scatter_slopes.m uses tinv(0.975, dof)
+
+def _empty_stats(n_bins):
+    return {name: np.zeros(n_bins) for name in STAT_NAMES}
+
+def _merge_stats(a, b):
+    """
+    Parallel merge of per-bin count, means and co-moments of (temp, force).
+    Bins empty in b are left unchanged.
+    """
+    n = a["count"] + b["count"]
+    has = b["count"] > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(has, b["count"] / n, 0.0)
+        cross = np.where(has, a["count"] * w, 0.0)
+    dt = np.where(has, b["mean_t"] - a["mean_t"], 0.0)
+    df = np.where(has, b["mean_f"] - a["mean_f"], 0.0)
+    return {
+        "count": n,
+        "mean_t": a["mean_t"] + dt * w,
+        "mean_f": a["mean_f"] + df * w,
+        "stt": a["stt"] + b["stt"] + dt * dt * cross,
+        "stf": a["stf"] + b["stf"] + dt * df * cross,
+        "sff": a["sff"] + b["sff"] + df * df * cross,
+    }
+
+def binned_moments(idx, temp, force, n_bins):
+    """Per-bin count, means and centered co-moments of one batch of samples."""
+    count = np.bincount(idx, minlength=n_bins).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_t = np.nan_to_num(np.bincount(idx, temp, minlength=n_bins) / count)
+        mean_f = np.nan_to_num(np.bincount(idx, force, minlength=n_bins) / count)
+    dt = temp - mean_t[idx]
+    df = force - mean_f[idx]
+    return {
+        "count": count,
+        "mean_t": mean_t,
+        "mean_f": mean_f,
+        "stt": np.bincount(idx, dt * dt, minlength=n_bins),
+        "stf": np.bincount(idx, dt * df, minlength=n_bins),
+        "sff": np.bincount(idx, df * df, minlength=n_bins),
+    }
+
+
+class TempRegressionStore:
+    """
+    Streaming force-vs-temperature regression per velocity bin and valving.
+
+    Replaces the reload-and-refit workflow of temp_investigation.m and
+    temp_scatter_slopes.m: each run is reduced once to per-bin sufficient
+    statistics (count, means and centered co-moments of temperature and
+    force), which merge exactly with those of earlier runs. Slopes dF/dT and
+    their t-intervals are available at any time without revisiting raw
+    data, so a temperature-compensation table grows with every heat-gun run.
+    """
+
+    def __init__(self, edges=DEFAULT_EDGES, confidence=DEFAULT_CONFIDENCE):
+        """
+        Args:
+            edges (array): Velocity bin edges [in/s].
+            confidence (float): Confidence level of the slope intervals.
+        """
+        self.edges = np.asarray(edges, dtype=float)
+        self.centers = 0.5 * (self.edges[:-1] + self.edges[1:])
+        self.n_bins = self.centers.size
+        self.confidence = confidence
+        self.groups = {}  # valving tuple (hsc, hsr, lsc, lsr) -> per-bin stats
+        self.runs = {}    # run id -> summary of what it contributed
+
+    @staticmethod
+    def valving_key(valving):
+        """(hsc, hsr, lsc, lsr) tuple of a valving dict or sequence."""
+        if isinstance(valving, dict):
+            return tuple(float(valving[name]) for name in SETTING_NAMES)
+        return tuple(float(v) for v in valving)
+
+    def add_run(self, run_id, valving, velocity, force, temp):
+        """
+        Adds the samples of one run. Runs already in the store are skipped.
+
+        Args:
+            run_id (str): Unique run identifier (e.g. the capture file path).
+            valving: Valving settings as a dict or (hsc, hsr, lsc, lsr).
+            velocity, force, temp (array): Conditioned samples.
+
+        Returns:
+            bool: True if the run was added.
+        """
+        if run_id in self.runs:
+            return False
+        idx = uniform_bin_index(velocity, self.edges)
+        temp = np.asarray(temp, dtype=float)
+        force = np.asarray(force, dtype=float)
+        keep = (idx >= 0) & np.isfinite(temp) & np.isfinite(force)
+        key = self.valving_key(valving)
+        batch = binned_moments(idx[keep], temp[keep], force[keep], self.n_bins)
+        self.groups[key] = _merge_stats(self.groups.get(key, _empty_stats(self.n_bins)), batch)
+        self.runs[run_id] = {
+            "valving": list(key),
+            "samples": int(keep.sum()),
+            "temp_range": [float(np.min(temp[keep])), float(np.max(temp[keep]))] if keep.any() else None,
+        }
+        return True
+
+    def add_dataset(self, dataset):
+        """
+        Adds every new run of a ConditionedDataset that has valving settings.
+
+        Returns:
+            list: Paths of the runs added.
+        """
+        run = dataset.samples["run"]
+        order = np.argsort(run, kind="stable")
+        starts = np.searchsorted(run[order], np.arange(len(dataset.runs) + 1))
+        added = []
+        for i, info in enumerate(dataset.runs):
+            if "valving" not in info or info["path"] in self.runs:
+                continue
+            rows = order[starts[i]:starts[i + 1]]
+            if self.add_run(info["path"], info["valving"], dataset.samples["velocity"][rows],
+                            dataset.samples["force"][rows], dataset.samples["temp"][rows]):
+                added.append(info["path"])
+        if added:
+            logging.info(f"Temperature regression: added {len(added)} runs ({len(self.runs)} total)")
+        return added
+
+    def merge(self, other):
+        """Adds the statistics of another store with the same bins (runs in both are counted once)."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge regression stores with different bins.")
+        shared = set(self.runs) & set(other.runs)
+        if shared:
+            raise ValueError(f"{len(shared)} runs are in both stores; merge would count them twice.")
+        for key, stats in other.groups.items():
+            self.groups[key] = _merge_stats(self.groups.get(key, _empty_stats(self.n_bins)), stats)
+        self.runs.update(other.runs)
+        return self
+
+    # --- results ---
+
+    def _pooled(self, valving):
+        if valving is not None:
+            return self.groups.get(self.valving_key(valving), _empty_stats(self.n_bins))
+        stats = _empty_stats(self.n_bins)
+        for group in self.groups.values():
+            stats = _merge_stats(stats, group)
+        return stats
+
+    def regression(self, valving=None, min_count=20, reference_temp=None):
+        """
+        Force-vs-temperature fit of every velocity bin.
+
+        Args:
+            valving: One valving setting, or None to pool all settings.
+            min_count (int): Bins with fewer samples are NaN.
+            reference_temp (float, optional): Temperature of the reported
+                'force_at_ref' (default: mean temperature of each bin).
+
+        Returns:
+            dict: Per-bin 'centers', 'count', 'slope' [force/degC], 'halfwidth'
+            (t-interval of the slope), 'force_at_ref', 'mean_temp' and
+            'temp_std'.
+        """
+        s = self._pooled(valving)
+        n = s["count"]
+        ok = (n >= max(3, min_count)) & (s["stt"] > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(ok, s["stf"] / s["stt"], np.nan)
+            dof = np.where(ok, n - 2, np.nan)
+            resid = np.maximum(s["sff"] - slope * s["stf"], 0.0)
+            halfwidth = student_t.ppf(0.5 + self.confidence / 2, dof) * np.sqrt(resid / dof / s["stt"])
+            temp_std = np.where(n > 1, np.sqrt(s["stt"] / (n - 1)), np.nan)
+        ref = s["mean_t"] if reference_temp is None else reference_temp
+        return {
+            "centers": self.centers,
+            "count": n,
+            "slope": slope,
+            "halfwidth": halfwidth,
+            "force_at_ref": np.where(ok, s["mean_f"] + slope * (ref - s["mean_t"]), np.nan),
+            "mean_temp": np.where(n > 0, s["mean_t"], np.nan),
+            "temp_std": temp_std,
+        }
+
+    def compensation_table(self, min_count=20):
+        """
+        dF/dT per valving and velocity bin.
+
+        Returns:
+            dict: valving tuple -> (slope, halfwidth) arrays over the bins.
+        """
+        table = {}
+        for key in self.groups:
+            fit = self.regression(key, min_count=min_count)
+            table[key] = (fit["slope"], fit["halfwidth"])
+        return table
+
+    def compensate(self, velocity, force, temp, valving=None, reference_temp=25.0, min_count=20):
+        """
+        Corrects measured forces to reference_temp with the binned slopes.
+        Samples in bins without a valid slope are returned unchanged.
+        """
+        slope = self.regression(valving, min_count=min_count)["slope"]
+        idx = uniform_bin_index(velocity, self.edges)
+        dFdT = np.where(idx >= 0, slope[np.maximum(idx, 0)], np.nan)
+        dFdT = np.nan_to_num(dFdT)
+        return np.asarray(force, dtype=float) - dFdT * (np.asarray(temp, dtype=float) - reference_temp)
+
+    # --- persistence ---
+
+    def save(self, path):
+        keys = list(self.groups)
+        arrays = {name: np.array([self.groups[k][name] for k in keys]).reshape(len(keys), self.n_bins)
+                  for name in STAT_NAMES}
+        meta = {"confidence": self.confidence, "runs": self.runs}
+        np.savez(path, edges=self.edges, keys=np.array(keys, dtype=float).reshape(-1, 4),
+                 meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            store = cls(data["edges"], confidence=meta["confidence"])
+            for i, key in enumerate(data["keys"]):
+                store.groups[tuple(float(v) for v in key)] = {name: data[name][i].copy() for name in STAT_NAMES}
+        store.runs = meta["runs"]
+        return store
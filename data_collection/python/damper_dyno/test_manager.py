@@ -1,15 +1,21 @@
+import os
 import threading
 import queue
 import logging
-from scipy.signal import butter, lfilter
+from scipy.signal import lfilter
 import numpy as np
+from quantile_sketch import QuantileSketch
+from calibration import CalibrationEngine
+from catalog import TestCatalog, table_columns
+from stroke_reference import StrokeReferenceTracker, MM_PER_IN
+from profiling import profiler
+from events import events
+from publisher import LivePublisher, CycleSummarizer, CHUNK, CYCLE
 from utils import (
-    convert_speed_to_duty_cycle, 
     save_test_data,
     gearbox_scaling,
-    map_voltage_to_displacement,
-    map_voltage_to_force,
-    map_voltage_to_temperature
+    map_HLFB_pwm_to_torque_fraction,
+    motor_mechanical_power
     )
 
 class TestManager:
@@ -25,21 +31,84 @@ class TestManager:
         self.mode = ['DIFF', 'DIFF', 'DIFF']
         
         self.current_target_rpm = 0 
-        
-    def run_test(self, settings):
 
-        # Either a single-speed test OR a multi-step run profile
-        run_profile = settings.get("run_profile", None)
+        # live force percentiles per run segment {segment index: QuantileSketch}
+        self.current_segment = 0
+        self.segment_stats = {}
 
-        if run_profile is not None:
-            self._run_profile_test(settings, run_profile)
-        else:
-            self._run_single_speed_test(settings)
+        self.stroke_tracker = None
+        self.stroke_glitch_count = 0
+
+        # segments in which the motor reached its torque limit
+        self.torque_saturated_segments = set()
+
+        # per-channel tare offsets from the last capture_tare, kept across runs
+        self.tare_offsets = {}
+
+        # set once the last run stopped and its data was saved (for headless callers)
+        self.test_done = threading.Event()
+        self.test_done.set()
+        self.last_saved_path = None
+
+        # set by emergency_stop; the run threads wait on it instead of sleeping
+        self.stop_event = threading.Event()
+
+        # a run and a tare capture share the DAQ; only one may hold it at a time
+        self._activity_lock = threading.Lock()
+        self.tare_running = False
+
+        # samples handed to the DAQ callback this run (sample index of events)
+        self.samples_processed = 0
+
+        # optional localhost live-data stream for external subscribers (publisher_enable)
+        self.publisher = None
+        self.cycle_summarizer = CycleSummarizer()
+        
+    @property
+    def busy(self):
+        """True while a run or tare capture is in progress or the DAQ is already acquiring."""
+        return (not self.test_done.is_set() or self.tare_running
+                or getattr(self.daq, 'ai_task', None) is not None)
+
+    def run_test(self, config):
+        """
+        Runs a compiled RunConfig: a single-speed test OR a multi-step run profile.
+
+        Returns:
+            bool: False if the run was refused because a run or tare is in progress,
+            or could not be started.
+        """
+        with self._activity_lock:
+            if self.busy:
+                logging.warning("A run or tare capture is already in progress; run not started.")
+                return False
+            self.test_done.clear()
+            self.stop_event.clear()
+        events.reset()
+        try:
+            if config.mode == 'profile':
+                self._run_profile_test(config)
+            else:
+                self._run_single_speed_test(config)
+        except Exception as e:
+            logging.error(f"Run failed to start: {e}")
+            try:
+                self.daq.stop_motor()
+                self.daq.stop_acquisition()
+            finally:
+                self.test_done.set()
+            return False
+        return True
+
+    def emergency_stop(self):
+        """Cuts the motor and acquisition now and ends the current run early (its data is still saved)."""
+        self.stop_event.set()
+        self.daq.emergency_stop()
 
     # OPTION A: SINGLE-SPEED TEST
-    def _run_single_speed_test(self, settings):
-        target_speed = settings['run_speed_rpm']
-        num_cycles = gearbox_scaling(10, settings['run_num_cycles'])
+    def _run_single_speed_test(self, config):
+        target_speed = config.segment_rpm[0]
+        num_cycles = gearbox_scaling(10, config.segment_cycles[0])
 
         logging.info(f"Starting SINGLE test: speed={target_speed} RPM, cycles={num_cycles}")
 
@@ -47,32 +116,26 @@ class TestManager:
         
         # SET the target RPM before starting acquisition
         self.current_target_rpm = target_speed
-
-        pwm = convert_speed_to_duty_cycle(
-            target_speed,
-            [settings["rpm_min"], settings["rpm_max"]],
-            [settings["duty_cycle_min"], settings["duty_cycle_max"]]
-        )
+        self.current_segment = 0
 
         self.daq.configure_motor_pwm()
-        self.daq.start_motor(pwm)
+        self.daq.start_motor(config.segment_duty[0])
 
-        self._start_acquisition(settings)
+        self._start_acquisition(config)
 
-        duration = num_cycles / target_speed * 60.0
+        duration = config.segment_duration_s[0]
 
         def thread_fcn():
-            threading.Event().wait(duration)
-            self._end_test(settings)
+            self.stop_event.wait(duration)
+            self._end_test(config)
 
         threading.Thread(target=thread_fcn, daemon=True).start()
 
     # OPTION B: RUN PROFILE
-    def _run_profile_test(self, settings, run_profile):
-        speeds = run_profile[0]  # RPM values
-        cycles = run_profile[1]  # CYCLE COUNTS
-
-        assert len(speeds) == len(cycles), "run_profile rows must be equal length"
+    def _run_profile_test(self, config):
+        speeds = config.segment_rpm  # RPM values
+        segments = list(zip(config.segment_rpm, config.segment_cycles,
+                            config.segment_duration_s, config.segment_duty))
 
         self.gui_queue.put({'command': 'reset_plots'})
 
@@ -80,52 +143,113 @@ class TestManager:
 
         # Initialize with first segment's RPM
         self.current_target_rpm = speeds[0]
+        self.current_segment = 0
 
         # Start DAQ once
-        self._start_acquisition(settings)
+        self._start_acquisition(config)
 
         self.daq.configure_motor_pwm()
 
         def profile_thread():
-            for i, (rpm, cycle_count) in enumerate(zip(speeds, cycles)):
-                # Calculate duration from cycles and RPM
-                if rpm <= 0:
-                    logging.warning(f"[Segment {i+1}] RPM={rpm} is invalid, skipping.")
-                    continue
-                
+            for i, (rpm, cycle_count, duration, pwm) in enumerate(segments):
+                if self.stop_event.is_set():
+                    break
                 # current target RPM for this segment
                 self.current_target_rpm = rpm
-
-                # Apply gearbox scaling to cycles
-                scaled_cycles = gearbox_scaling(10, cycle_count)
-                duration = (scaled_cycles / rpm) * 60.0
+                self.current_segment = i
                 
-                logging.info(f"[Segment {i+1}/{len(speeds)}] RPM={rpm:.2f}, Cycles={cycle_count}, Duration={duration:.2f}s")
-
-                pwm = convert_speed_to_duty_cycle(
-                    rpm,
-                    [settings["rpm_min"], settings["rpm_max"]],
-                    [settings["duty_cycle_min"], settings["duty_cycle_max"]]
-                )
+                events.emit("segment", self.samples_processed,
+                            "[Segment {segment}/{segments}] RPM={rpm:.2f}, Cycles={cycles}, Duration={duration:.2f}s",
+                            segment=i + 1, segments=len(speeds), rpm=rpm, cycles=cycle_count, duration=duration)
 
                 if i == 0:
                     self.daq.start_motor(pwm)
                 else:
                     self.daq.update_motor_duty_cycle(pwm)
 
-                threading.Event().wait(duration)
+                if self.stop_event.wait(duration):
+                    break
 
-            # End of all segments -> stop system
-            self._end_test(settings)
+            # End of all segments (or E-STOP) -> stop system
+            self._end_test(config)
 
         threading.Thread(target=profile_thread, daemon=True).start()
 
-    def _start_acquisition(self, settings):
-        fs = settings['sample_rate']
-        fc = settings['lpf_cutoff']
-        b, a = butter(2, fc / (fs / 2), btype='low')
+    def capture_tare(self, config, duration=None):
+        """
+        Acquires a short block with the motor stopped and computes tare offsets
+        for the channels in config['tare_channels'] (default: force). The
+        offsets are compiled into the calibration of every later RunConfig.
+
+        Refused (returns None) while a run or another acquisition is active.
+        """
+        with self._activity_lock:
+            if self.busy:
+                logging.warning("Cannot tare while a run or acquisition is in progress.")
+                return None
+            self.tare_running = True
+        try:
+            return self._capture_tare(config, duration)
+        finally:
+            self.tare_running = False
+
+    def _capture_tare(self, config, duration):
+        fs = config.sample_rate
+        duration = duration if duration is not None else config.get('tare_duration_s', 1.0)
+        n_needed = max(1, int(duration * fs))
+        blocks = []
+        done = threading.Event()
+
+        def tare_callback(times, raw_values):
+            blocks.append(np.array(raw_values[:len(self.channels)], dtype=float))
+            if sum(b.shape[1] for b in blocks) >= n_needed:
+                done.set()
+
+        logging.info(f"Capturing tare over {duration:.2f}s...")
+        started = self.daq.start_acquisition(
+            self.channels,
+            self.mode,
+            sample_rate=fs,
+            chunk_size=config.chunk_size,
+            callback=tare_callback
+        )
+        if not started:
+            logging.error("Could not start the tare acquisition; keeping previous tare.")
+            return None
+        ok = done.wait(timeout=duration + 5.0)
+        self.daq.stop_acquisition()  # only reached when the tare started it
+        if not ok:
+            logging.error("Tare capture timed out; keeping previous tare.")
+            return None
+
+        tare_channels = config.get('tare_channels', ('force',))
+        engine = CalibrationEngine.from_settings(config.settings)
+        offsets = engine.capture_tare(np.hstack(blocks), channels=tare_channels)
+        self.tare_offsets = {name: offsets[name] for name in tare_channels}
+        return self.tare_offsets
+
+    def _start_acquisition(self, config):
+        settings = config.settings
+        fs = config.sample_rate
+        b, a = config.filter_b, config.filter_a  # precompiled Butterworth LPF
         lpf_state = np.zeros(max(len(a), len(b)) - 1)
         prev_disp = None
+        self.segment_stats = {}
+
+        # all channel calibrations (incl. tare) fused into one pass over the (channels x samples) block
+        calibration = config.calibration
+
+        # model-referenced stroke trajectory for lag-free velocity and residual QA
+        self.stroke_tracker = StrokeReferenceTracker(
+            crank_radius_mm=settings['crank_radius_in'] * MM_PER_IN,
+            rod_length_mm=settings['rod_length_in'] * MM_PER_IN,
+            sample_rate=fs,
+            glitch_threshold_mm=settings.get('stroke_glitch_threshold_mm', 1.0)
+        )
+        self.stroke_glitch_count = 0
+        self.torque_saturated_segments = set()
+        acquire_hlfb = bool(settings.get('hlfb_enable', 0))
+        saturation_fraction = settings.get('torque_saturation_fraction', 0.95)
 
         data_storage = [[
             "RPM",
@@ -133,7 +257,9 @@ class TestManager:
             "Force (V)", "Force (N)",
             "Displacement (V)", "Displacement (mm)",
             "Temperature (V)", "Temperature (C)",
-            "Velocity (mm/s)"
+            "Velocity (mm/s)",
+            "Velocity Ref (mm/s)", "Stroke Residual (mm)",
+            "HLFB Duty (%)", "Motor Torque (Nm)", "Motor Power (W)"
         ]]
 
         def daq_callback(times, raw_values):
@@ -142,16 +268,19 @@ class TestManager:
             n = min(len(times), raw_values.shape[1])
             t = times[:n]
             vals = raw_values[:, :n]
+            first_sample = self.samples_processed
+            self.samples_processed += n
 
             force_v = vals[0]
             disp_v = vals[1]
             temp_v = vals[2]
 
-            force_val = map_voltage_to_force(force_v, settings['force_slope'], settings['force_offset'])
-            disp_val = map_voltage_to_displacement(disp_v, settings['disp_slope'], settings['disp_offset'])
-            temp_val = map_voltage_to_temperature(temp_v, settings['temp_slope'], settings['temp_offset'])
+            t0 = profiler.tic()
+            force_val, disp_val, temp_val = calibration.apply(vals[:3])
+            profiler.toc("calibration", t0, n)
 
             # Filtered displacement
+            t0 = profiler.tic()
             disp_filt, lpf_state = lfilter(b, a, disp_val, zi=lpf_state)
 
             # Derivative velocity
@@ -162,11 +291,53 @@ class TestManager:
 
             vel = (disp_filt - x_prev) * fs
             prev_disp = disp_filt[-1]
+            profiler.toc("filter", t0, n)
 
             # Get current target RPM from instance variable
             current_rpm = self.current_target_rpm  # ADD THIS LINE
 
+            # Reference trajectory fitted to the measured stroke
+            if current_rpm != self.stroke_tracker.target_rpm:
+                self.stroke_tracker.set_target_rpm(current_rpm)
+            stroke_ref = self.stroke_tracker.process(disp_val)
+            vel_ref = stroke_ref['vel_ref']
+            residual = stroke_ref['residual']
+            n_glitch = int(stroke_ref['glitch'].sum())
+            if n_glitch:
+                self.stroke_glitch_count += n_glitch
+                events.emit("stroke_glitch", first_sample + int(np.argmax(stroke_ref['glitch'])),
+                            "Linpot glitch: {samples} samples off the reference stroke (max residual {max_residual_mm:.2f} mm)",
+                            level=logging.WARNING, samples=n_glitch,
+                            max_residual_mm=float(np.nanmax(np.abs(residual))))
+
+            # Motor torque / power from the HLFB duty row (NaN when not acquired)
+            if vals.shape[0] > 3:
+                hlfb = vals[3]
+                if self.stroke_tracker.omega is not None and self.stroke_tracker.phase is not None:
+                    motor_rpm = self.stroke_tracker.omega * self.stroke_tracker.gear_ratio * 60 / (2 * np.pi)
+                else:
+                    motor_rpm = current_rpm
+                torque, torque_frac = map_HLFB_pwm_to_torque_fraction(hlfb, motor_rpm, settings)
+                power = motor_mechanical_power(torque, motor_rpm)
+            else:
+                hlfb = torque = power = np.full(n, np.nan)
+                torque_frac = None
+            if (torque_frac is not None and self.current_segment not in self.torque_saturated_segments
+                    and np.any(np.abs(torque_frac) >= saturation_fraction)):
+                self.torque_saturated_segments.add(self.current_segment)
+                events.emit("torque_saturation", first_sample + int(np.argmax(np.abs(torque_frac) >= saturation_fraction)),
+                            "[Segment {segment}] Motor torque saturated at {motor_rpm:.0f} RPM (peak {peak_nm:.2f} Nm)",
+                            level=logging.WARNING, segment=self.current_segment + 1, motor_rpm=float(motor_rpm),
+                            peak_nm=float(np.nanmax(np.abs(torque))))
+
+            # Live force percentiles for the current segment
+            segment_sketch = self.segment_stats.get(self.current_segment)
+            if segment_sketch is None:
+                segment_sketch = self.segment_stats[self.current_segment] = QuantileSketch()
+            segment_sketch.update(force_val)
+
             # Log rows
+            t0 = profiler.tic()
             for i in range(n):
                 data_storage.append([
                     f"{current_rpm:.2f}",           # target motor speed
@@ -177,29 +348,125 @@ class TestManager:
                     f"{disp_val[i]:.4f}",           # displacement (mm)
                     f"{temp_v[i]:.4f}",             # IR temp voltage
                     f"{temp_val[i]:.4f}",           # temperature (C)
-                    f"{vel[i]:.4f}"                 # velocity (mm/s)
+                    f"{vel[i]:.4f}",                # velocity (mm/s)
+                    f"{vel_ref[i]:.4f}",            # reference velocity (mm/s)
+                    f"{residual[i]:.4f}",           # displacement residual (mm)
+                    f"{hlfb[i]:.2f}",               # HLFB duty cycle (%)
+                    f"{torque[i]:.4f}",             # motor torque (Nm)
+                    f"{power[i]:.2f}"               # motor shaft power (W)
                 ])
+            profiler.toc("storage_append", t0, n)
 
             # GUI update packet
+            t0 = profiler.tic()
             self.gui_queue.put({
                 "times": t,
                 "force": force_val.tolist(),
                 "disp": disp_val.tolist(),
                 "vel": vel.tolist(),
-                "temp": temp_val[-1]
+                "vel_ref": vel_ref.tolist(),
+                "temp": temp_val[-1],
+                "torque": float(np.nanmean(torque)) if np.isfinite(torque).any() else None
             })
+            profiler.toc("gui_packet", t0, n)
+
+            # Live data for external subscribers; only queues frames, never waits on sockets
+            publisher = self.publisher
+            if publisher is not None and publisher.has_subscribers:
+                t0 = profiler.tic()
+                time_s = (first_sample + np.arange(n)) / fs
+                publisher.publish(CHUNK, first_sample,
+                                  np.vstack((time_s, force_val, disp_val, temp_val, vel, vel_ref, torque)),
+                                  {'segment': self.current_segment, 'rpm': current_rpm})
+                if stroke_ref['phase'] is not None:
+                    t_fit = (self.stroke_tracker.sample_index - n + np.arange(n)) / fs
+                    theta = stroke_ref['omega'] * t_fit + stroke_ref['phase']
+                    for summary in self.cycle_summarizer.update(first_sample, theta, force_val, disp_val, vel, temp_val):
+                        publisher.publish(CYCLE, int(summary[1]), summary[None, :], {'segment': self.current_segment})
+                profiler.toc("publish", t0, n)
 
         self.data_storage = data_storage
+        self.samples_processed = 0
+        self._start_publisher(config)
+        profiler.configure(enabled=settings.get('profiling_enable', 1))
+        profiler.reset()
         self.daq.start_acquisition(
             self.channels,
             self.mode,
-            sample_rate=settings['sample_rate'],
-            chunk_size=settings['chunk_size'],
-            callback=daq_callback
+            sample_rate=config.sample_rate,
+            chunk_size=config.chunk_size,
+            callback=daq_callback,
+            acquire_hlfb=acquire_hlfb
         )
 
-    def _end_test(self, settings):
-        logging.info("Test finished -> stopping motor and acquisition.")
+    def _start_publisher(self, config):
+        """Starts (or stops) the live-data publisher per the run settings and announces the run."""
+        address = config.get('publisher_address', 'tcp://127.0.0.1:5555')
+        if not config.get('publisher_enable', 0):
+            self.close()
+            return
+        if self.publisher is None or self.publisher.address != address:
+            self.close()
+            try:
+                self.publisher = LivePublisher(address, buffer_frames=config.get('publisher_buffer_frames', 256))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not start live data publisher on {address}: {e}")
+                return
+            events.add_listener(self.publisher.publish_event)
+        self.cycle_summarizer.reset()
+        self.publisher.set_run(mode=config.mode, sample_rate=config.sample_rate,
+                               segment_rpm=list(config.segment_rpm),
+                               segment_linear_speed_ips=(list(config.segment_linear_speed_ips)
+                                                         if config.segment_linear_speed_ips is not None else None))
+
+    def close(self):
+        """Stops the live-data publisher, if running."""
+        if self.publisher is not None:
+            events.remove_listener(self.publisher.publish_event)
+            self.publisher.close()
+            self.publisher = None
+
+    def _end_test(self, config):
+        try:
+            self._finish_test(config)
+        finally:
+            self.test_done.set()
+
+    def _finish_test(self, config):
+        if self.stop_event.is_set():
+            logging.info("Test stopped early (E-STOP) -> stopping motor and acquisition.")
+        else:
+            logging.info("Test finished -> stopping motor and acquisition.")
         self.daq.stop_motor()
         self.daq.stop_acquisition()
-        save_test_data(self.data_storage, settings)
\ No newline at end of file
+        if self.stroke_tracker is not None:
+            logging.info(f"Stroke reference: {self.stroke_glitch_count} glitch samples, "
+                         f"last fit rms {self.stroke_tracker.fit_rms} mm")
+        for segment, stats in self.get_segment_summary().items():
+            if stats['count']:
+                logging.info(f"[Segment {segment+1}] Force p1={stats['p1']:.1f} N, "
+                             f"p50={stats['p50']:.1f} N, p99={stats['p99']:.1f} N ({stats['count']} samples)")
+        csv_path = self.last_saved_path = save_test_data(self.data_storage, config.settings,
+                                                         metadata=config.to_metadata())
+        if csv_path:
+            try:
+                events.save(os.path.splitext(csv_path)[0] + "_events.jsonl")
+            except OSError as e:
+                logging.warning(f"Could not save run events: {e}")
+        if profiler.enabled:
+            logging.info("Stage profile:\n" + profiler.report())
+            if config.get('profiling_dump_on_end', 0) and csv_path:
+                try:
+                    profiler.dump(os.path.splitext(csv_path)[0] + "_profile.json")
+                except OSError as e:
+                    logging.warning(f"Could not save profile report: {e}")
+        if config.get('catalog_update_on_save', 0) and csv_path:
+            try:
+                # summarized from the rows in memory; the CSV is not re-parsed or cached
+                TestCatalog.for_output_dir(config.output_dir).add(csv_path, table_columns(self.data_storage))
+            except Exception as e:
+                logging.warning(f"Could not update test catalog: {e}")
+
+    def get_segment_summary(self):
+        """Returns {segment index: force summary stats dict} for the current/last run."""
+        return {segment: sketch.summary() for segment, sketch in sorted(self.segment_stats.items())}
\ No newline at end of file
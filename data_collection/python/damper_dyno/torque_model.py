@@ -0,0 +1,201 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+from kinematics import GEAR_RATIO, slider_crank_gmax, slider_crank_kinematics, scotch_yoke_kinematics
+from ohlins_model import load_ohlins_model
+from surrogate import DamperSurrogate
+
+LBF_IN_TO_NM = 0.112985
+G_IN_S2 = 386.09  # in/s^2
+MECHANISMS = ("slider_crank", "scotch_yoke")
+
+@lru_cache(maxsize=8)
+def _load_surrogate(path):
+    return DamperSurrogate.load(path)
+
+def damper_force_fn(damper=None):
+    """
+    Damper force [lbf] as a function of velocity [in/s] from a picklable spec.
+
+    Args:
+        damper (dict, optional): {'model': 'ohlins', 'settings': [lsc, hsc, lsr, hsr]}
+            or {'model': 'surrogate', 'path': model .npz, 'settings': [hsc, hsr, lsc, lsr],
+            'temp': optional, 'fit': 'poly' | 'pw'}, plus an optional 'scale' factor
+            (e.g. 1.5 for a 50% stiffer damper). Defaults to the firmest Ohlins setting.
+    """
+    damper = dict(damper or {})
+    scale = float(damper.get("scale", 1.0))
+    if damper.get("model", "ohlins") == "ohlins":
+        model = load_ohlins_model()
+        lsc, hsc, lsr, hsr = damper.get("settings", (0, 4, 0, 4))
+        return lambda v: scale * model.force(lsc, hsc, lsr, hsr, v)
+    if damper["model"] == "surrogate":
+        model = _load_surrogate(damper["path"])
+        settings, temp, fit = damper["settings"], damper.get("temp"), damper.get("fit", "poly")
+        return lambda v: scale * model.force(v, settings, temp=temp, model=fit)
+    raise ValueError(f"Unknown damper model '{damper['model']}'.")
+
+def crank_speed_for(linear_speed, R, Lc=None, mechanism="slider_crank"):
+    """Constant crank speed [rad/s] reaching the given peak linear speed(s) [in/s]."""
+    linear_speed = np.asarray(linear_speed, dtype=float)
+    if mechanism == "scotch_yoke":
+        return linear_speed / R
+    Gmax, _ = slider_crank_gmax(Lc, R)
+    return linear_speed / Gmax
+
+def crank_torque(theta, linear_speed, R, Lc=None, mechanism="slider_crank", force_fn=None,
+                 moving_mass_lb=2.0, friction_lbf=0.0):
+    """
+    Crank torque components over a crank angle x speed grid at constant crank speed.
+
+    Torques follow from virtual work, T = F dx/dtheta, which equals the
+    force-equilibrium result of slider_crank_torque.m and the r cos(theta)
+    lever arm of motor_torque_gr_study_scotch_yoke.m.
+
+    Args:
+        theta (array): Crank angles [rad] (K,).
+        linear_speed (array): Peak linear speeds [in/s] (S,).
+        R (float): Crank radius [in].
+        Lc (float): Connecting rod length [in] (slider-crank only).
+        mechanism (str): 'slider_crank' or 'scotch_yoke'.
+        force_fn (callable, optional): Damper force [lbf] vs velocity [in/s].
+        moving_mass_lb (float): Reciprocating mass [lb].
+        friction_lbf (float): Coulomb friction of the slide [lbf].
+
+    Returns:
+        dict: (S x K) arrays 'velocity' [in/s], 'inertial', 'damper', 'gravity',
+        'friction' and 'total' crank torque [lbf*in], plus 'crank_speed' (S,) [rad/s].
+    """
+    if mechanism not in MECHANISMS:
+        raise ValueError(f"Unknown mechanism '{mechanism}' (use {' or '.join(MECHANISMS)}).")
+    theta = np.asarray(theta, dtype=float)[None, :]
+    theta_dot = np.atleast_1d(crank_speed_for(linear_speed, R, Lc, mechanism))[:, None]
+    if mechanism == "scotch_yoke":
+        _, x_dot, x_ddot = scotch_yoke_kinematics(theta, theta_dot, R)
+    else:
+        _, x_dot, x_ddot = slider_crank_kinematics(theta, theta_dot, Lc, R)
+    x_dot, x_ddot = np.asarray(x_dot), np.asarray(x_ddot)
+    if force_fn is None:
+        force_fn = damper_force_fn()
+
+    lever = x_dot / theta_dot  # dx/dtheta [in/rad]
+    components = {
+        "inertial": moving_mass_lb / G_IN_S2 * x_ddot * lever,
+        "damper": force_fn(x_dot) * lever,
+        "gravity": moving_mass_lb * lever,
+        "friction": friction_lbf * np.sign(x_dot) * lever,
+    }
+    components["total"] = sum(components.values())
+    components["velocity"] = x_dot
+    components["crank_speed"] = theta_dot[:, 0]
+    return components
+
+def motor_requirements(linear_speeds, gear_ratios=(GEAR_RATIO,), R=0.75, Lc=6.0, mechanism="slider_crank",
+                       force_fn=None, damper=None, moving_mass_lb=2.0, friction_lbf=0.0, efficiency=1.0,
+                       torque_map=None, n_theta=500):
+    """
+    Motor speed, torque and power over a linear speed x gear ratio grid.
+
+    The crank torque is evaluated once per speed over n_theta crank angles;
+    every gear ratio is then a broadcast division, so the whole
+    (gear ratio x speed x angle) grid costs one kinematics pass.
+
+    Args:
+        linear_speeds (array): Peak linear speeds [in/s].
+        gear_ratios (array): Motor revolutions per crank revolution.
+        force_fn (callable, optional): Damper force model; overrides damper.
+        damper (dict, optional): Picklable damper spec (see damper_force_fn).
+        efficiency (float): Gearbox efficiency (motor torque = crank torque / (GR * eff)).
+        torque_map (list, optional): motor_max_torque_map [[rpm...], [Nm...]];
+            enables the 'available_nm', 'margin' and 'feasible' outputs.
+        Other args: see crank_torque.
+
+    Returns:
+        dict: (G x S) arrays 'motor_rpm', 'peak_torque_nm', 'rms_torque_nm',
+        'peak_power_w', 'rms_power_w' (and with a torque_map 'available_nm',
+        'margin' = available - peak, 'feasible'), plus 'linear_speeds' and
+        'gear_ratios'.
+    """
+    linear_speeds = np.atleast_1d(np.asarray(linear_speeds, dtype=float))
+    gear_ratios = np.atleast_1d(np.asarray(gear_ratios, dtype=float))
+    theta = np.linspace(0, 2 * np.pi, n_theta, endpoint=False)
+    if force_fn is None:
+        force_fn = damper_force_fn(damper)
+    comp = crank_torque(theta, linear_speeds, R, Lc, mechanism, force_fn, moving_mass_lb, friction_lbf)
+
+    crank_nm = comp["total"] * LBF_IN_TO_NM                          # (S, K)
+    motor_nm = crank_nm[None, :, :] / (gear_ratios[:, None, None] * efficiency)
+    motor_speed = comp["crank_speed"][None, :] * gear_ratios[:, None]  # (G, S) rad/s
+    power = motor_nm * motor_speed[:, :, None]
+    out = {
+        "linear_speeds": linear_speeds,
+        "gear_ratios": gear_ratios,
+        "motor_rpm": motor_speed * 60 / (2 * np.pi),
+        "peak_torque_nm": np.max(np.abs(motor_nm), axis=2),
+        "rms_torque_nm": np.sqrt(np.mean(motor_nm**2, axis=2)),
+        "peak_power_w": np.max(np.abs(power), axis=2),
+        "rms_power_w": np.sqrt(np.mean(power**2, axis=2)),
+    }
+    if torque_map is not None:
+        rpm_axis, torque_axis = np.asarray(torque_map[0], dtype=float), np.asarray(torque_map[1], dtype=float)
+        available = np.interp(out["motor_rpm"], rpm_axis, torque_axis, right=0.0)
+        out["available_nm"] = available
+        out["margin"] = available - out["peak_torque_nm"]
+        out["feasible"] = out["margin"] >= 0
+    return out
+
+def _sweep_job(args):
+    design, linear_speeds, gear_ratios, torque_map, n_theta = args
+    return motor_requirements(linear_speeds, gear_ratios, torque_map=torque_map, n_theta=n_theta, **design)
+
+def sizing_sweep(designs, linear_speeds, gear_ratios, torque_map=None, workers=None, n_theta=500):
+    """
+    Evaluates motor_requirements for many designs across a process pool.
+
+    Args:
+        designs (list): Dicts of motor_requirements keyword arguments (R, Lc,
+            mechanism, damper, moving_mass_lb, friction_lbf, efficiency);
+            dampers must be given as picklable specs, not callables.
+        linear_speeds, gear_ratios (array): Shared speed x gear ratio grid.
+        torque_map (list, optional): motor_max_torque_map for feasibility.
+        workers (int, optional): Process pool size, default os.cpu_count().
+
+    Returns:
+        list: One motor_requirements dict per design (with the design under 'design').
+    """
+    designs = list(designs)
+    jobs = [(d, linear_speeds, gear_ratios, torque_map, n_theta) for d in designs]
+    if len(jobs) <= 1 or workers == 1:
+        results = [_sweep_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_sweep_job, jobs))
+    for design, result in zip(designs, results):
+        result["design"] = design
+    logging.info(f"Sizing sweep: {len(designs)} designs x {np.size(gear_ratios)} gear ratios "
+                 f"x {np.size(linear_speeds)} speeds")
+    return results
+
+def check_run_profile(settings, damper=None, moving_mass_lb=2.0, friction_lbf=0.0):
+    """
+    Peak motor torque of every run_profile speed on the configured dyno
+    (slider-crank, GEAR_RATIO) against motor_max_torque_map.
+
+    Returns:
+        dict: motor_requirements output for the profile speeds at GEAR_RATIO
+        (arrays of shape (1 x segments)).
+    """
+    profile = settings["run_profile"]
+    if settings.get("run_profile_speeds_are_rpm"):
+        raise ValueError("check_run_profile expects run_profile speeds in in/s.")
+    result = motor_requirements(profile[0], (GEAR_RATIO,), R=float(settings["crank_radius_in"]),
+                                Lc=float(settings["rod_length_in"]), damper=damper,
+                                moving_mass_lb=moving_mass_lb, friction_lbf=friction_lbf,
+                                torque_map=settings["motor_max_torque_map"])
+    for speed, ok, margin in zip(profile[0], result["feasible"][0], result["margin"][0]):
+        if not ok:
+            logging.warning(f"Run profile speed {speed} in/s exceeds the motor torque limit "
+                            f"by {-margin:.2f} Nm")
+    return result
@@ -0,0 +1,170 @@
+import numpy as np
+from scipy.stats import t as student_t
+
+DEFAULT_CONFIDENCE = 0.99  # uncertainty_tn in data_wrangler.m uses tinv(0.995, n-1)
+DEFAULT_SEED = 0
+
+def t_halfwidth(sum_sq_dev, count, confidence=DEFAULT_CONFIDENCE):
+    """
+    Vectorized uncertainty_tn: t_crit * std / sqrt(n) of groups given their
+    sum of squared deviations and sample counts (NaN where n <= 1).
+    """
+    count = np.asarray(count, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dof = np.where(count > 1, count - 1, np.nan)
+        sem = np.sqrt(np.asarray(sum_sq_dev) / dof) / np.sqrt(count)
+        return student_t.ppf(0.5 + confidence / 2, dof) * sem
+
+def sort_by_bin(bin_idx, y, n_bins):
+    """
+    Groups samples by bin for segmented reductions.
+
+    Samples with a bin index outside [0, n_bins) are dropped.
+
+    Returns:
+        tuple: (y_sorted, starts, counts) where bin b owns
+        y_sorted[starts[b]:starts[b] + counts[b]].
+    """
+    bin_idx = np.asarray(bin_idx)
+    y = np.asarray(y, dtype=float)
+    valid = (bin_idx >= 0) & (bin_idx < n_bins)
+    bin_idx, y = bin_idx[valid], y[valid]
+    order = np.argsort(bin_idx, kind="stable")
+    counts = np.bincount(bin_idx, minlength=n_bins)
+    starts = np.cumsum(counts) - counts
+    return y[order], starts, counts
+
+def _segment_sums(values, starts, counts):
+    """Sums of values[..., start:start+count] along the last axis (0 for empty segments)."""
+    out = np.zeros(values.shape[:-1] + (starts.size,))
+    nonempty = counts > 0
+    if values.shape[-1] and nonempty.any():
+        out[..., nonempty] = np.add.reduceat(values, starts[nonempty], axis=-1)
+    return out
+
+def t_intervals(bin_idx, y, n_bins, confidence=DEFAULT_CONFIDENCE):
+    """
+    Student-t confidence intervals of the mean of y in every bin at once.
+
+    bin_idx may address any number of flattened (frequency, bin) cells.
+
+    Returns:
+        tuple: (mean, halfwidth, count), each of length n_bins, NaN where a
+        bin has too few samples.
+    """
+    y_sorted, starts, counts = sort_by_bin(bin_idx, y, n_bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _segment_sums(y_sorted, starts, counts) / counts
+    dev = (y_sorted - np.repeat(mean, counts))**2
+    return mean, t_halfwidth(_segment_sums(dev, starts, counts), counts, confidence), counts
+
+def bootstrap_intervals(bin_idx, y, n_bins, n_boot=200, confidence=DEFAULT_CONFIDENCE,
+                        seed=DEFAULT_SEED, max_block=4_000_000):
+    """
+    Percentile bootstrap confidence intervals of the mean of y in every bin.
+
+    All bins are resampled together: each resample draws, for every sample
+    position, a random index inside its own bin's segment of the sorted
+    data, and bin means come from one np.add.reduceat over the resampled
+    block. Resamples are processed in blocks of at most max_block values.
+
+    Args:
+        bin_idx (array): Bin index of each sample.
+        y (array): Values (e.g. force).
+        n_bins (int): Number of bins (flattened frequency x bin cells).
+        n_boot (int): Number of bootstrap resamples.
+        confidence (float): Two-sided confidence level.
+        seed (int): RNG seed, so intervals are reproducible.
+
+    Returns:
+        tuple: (mean, low, high, count), each of length n_bins, NaN for
+        bins with fewer than 2 samples.
+    """
+    y_sorted, starts, counts = sort_by_bin(bin_idx, y, n_bins)
+    n = y_sorted.size
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = _segment_sums(y_sorted, starts, counts) / counts
+    if n == 0:
+        nan = np.full(n_bins, np.nan)
+        return mean, nan, nan.copy(), counts
+
+    rng = np.random.default_rng(seed)
+    seg_start = np.repeat(starts, counts)
+    seg_count = np.repeat(counts, counts)
+    boot_means = np.empty((n_boot, n_bins))
+    block = max(1, max_block // n)
+    for b0 in range(0, n_boot, block):
+        b1 = min(n_boot, b0 + block)
+        draw = seg_start + (rng.random((b1 - b0, n)) * seg_count).astype(np.intp)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            boot_means[b0:b1] = _segment_sums(y_sorted[draw], starts, counts) / counts
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(boot_means, [alpha, 1 - alpha], axis=0)
+    few = counts < 2
+    low[few] = np.nan
+    high[few] = np.nan
+    return mean, low, high, counts
+
+def uniform_bin_index(x, edges):
+    """
+    Bin index of x on sorted edges (last bin closed, as bin_profile_modified);
+    -1 for samples outside the edges.
+    """
+    x = np.asarray(x, dtype=float)
+    idx = np.searchsorted(edges, x, side="right") - 1
+    idx[x == edges[-1]] = len(edges) - 2
+    idx[(x < edges[0]) | (x > edges[-1]) | ~np.isfinite(x)] = -1
+    return idx
+
+
+class RunningBinStats:
+    """
+    Streaming per-bin mean and t-interval of y over fixed x bins.
+
+    Chunks are merged with bincount-based parallel variance updates, so a
+    live F-V confidence band costs O(chunk) per update regardless of how
+    many samples the run has accumulated.
+    """
+
+    def __init__(self, edges, confidence=DEFAULT_CONFIDENCE):
+        self.edges = np.asarray(edges, dtype=float)
+        self.confidence = confidence
+        self.n_bins = self.edges.size - 1
+        self.centers = 0.5 * (self.edges[:-1] + self.edges[1:])
+        self.reset()
+
+    def reset(self):
+        self.count = np.zeros(self.n_bins)
+        self.mean = np.zeros(self.n_bins)
+        self.m2 = np.zeros(self.n_bins)
+
+    def update(self, x, y):
+        """Adds a chunk of (x, y) samples; samples outside the edges are ignored."""
+        idx = uniform_bin_index(x, self.edges)
+        keep = idx >= 0
+        idx = idx[keep]
+        y = np.asarray(y, dtype=float)[keep]
+        if idx.size == 0:
+            return
+        n_b = np.bincount(idx, minlength=self.n_bins).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.bincount(idx, y, minlength=self.n_bins) / n_b
+        m2_b = np.bincount(idx, (y - np.nan_to_num(mean_b)[idx])**2, minlength=self.n_bins)
+
+        has = n_b > 0
+        n = self.count + n_b
+        delta = np.where(has, mean_b - self.mean, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(has, self.mean + delta * n_b / n, self.mean)
+            self.m2 = np.where(has, self.m2 + m2_b + delta**2 * self.count * n_b / n, self.m2)
+        self.count = n
+
+    def intervals(self, min_count=2):
+        """
+        Returns:
+            tuple: (centers, mean, low, high) for bins with at least min_count samples.
+        """
+        ok = self.count >= max(2, min_count)
+        half = t_halfwidth(self.m2[ok], self.count[ok], self.confidence)
+        return self.centers[ok], self.mean[ok], self.mean[ok] - half, self.mean[ok] + half
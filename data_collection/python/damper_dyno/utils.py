@@ -1,18 +1,23 @@
 import os
 import csv
+import json
 import datetime
 import logging
 import numpy as np
-from scipy.optimize import minimize_scalar
-import warnings
+import kinematics
 
-def save_test_data(data_to_save, settings):
+def save_test_data(data_to_save, settings, metadata=None):
     """
     Saves the collected test data to a CSV file in the specified output directory.
 
     Args:
         data_to_save (list): A list of lists containing the data, including a header row.
         settings (dict): The settings dictionary, which must contain the 'output_dir' key.
+        metadata (dict, optional): Run metadata (e.g. RunConfig.to_metadata()), saved
+            as a JSON sidecar with the same base name as the CSV.
+
+    Returns:
+        str: Path of the saved CSV, or None if nothing was saved.
     """
     try:
         # Get the output directory from the settings dictionary.
@@ -36,8 +41,13 @@ def save_test_data(data_to_save, settings):
         with open(full_filepath, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerows(data_to_save)
+
+        if metadata is not None:
+            with open(os.path.splitext(full_filepath)[0] + ".json", "w") as f:
+                json.dump(metadata, f, indent=4, default=str)
         
         logging.info("Data saved successfully.")
+        return full_filepath
 
     except KeyError:
         logging.error("Error: The provided settings dictionary is missing the 'output_dir' key.")
@@ -90,87 +100,22 @@ def required_theta_dot(V_des, Lc, R):
     Calculates the required constant angular speed of a crank to achieve a 
     desired peak linear speed of a piston in a slider-crank mechanism.
 
-    The optimization is performed in two steps: a coarse grid search followed by a
-    fine, bounded optimization using SciPy's optimizer.
+    Thin wrapper around kinematics.required_theta_dot, which caches Gmax per
+    Lc/R geometry and accepts arrays of speeds.
 
     Args:
-        V_des (float): The desired peak linear speed of the piston.
+        V_des (float or array): The desired peak linear speed of the piston.
         Lc (float): The length of the connecting rod.
         R (float): The radius of the crank.
 
     Returns:
         tuple: A tuple containing:
-            - theta_dot_req (float): The required constant angular speed in rad/s.
+            - theta_dot_req (float or array): The required motor angular speed in rad/s
+              (crank speed scaled by the 10:1 gearbox).
             - Gmax (float): The maximum value of the geometric function G(theta).
             - theta_at_Gmax (float): The angle theta (in radians) at which G is maximum.
     """
-        
-    n = Lc / R
-    if n < 1:
-        warnings.warn(
-            f"n = Lc/R = {n:.4g} < 1. This geometry is not physically possible "
-            "and will produce imaginary results for some theta."
-        )
-
-    def Gfun(th):
-        """
-        Geometric function G(theta) that relates linear to angular velocity.
-        Handles arrays and scalars, and masks invalid theta values.
-        """
-        # Ensure input is a numpy array
-        th = np.asarray(th)
-        s = np.sin(th)
-        root_term = n**2 - s**2
-
-        # mask for valid inputs (term under sqrt is non-negative)
-        mask = root_term >= 0
-
-        # Initialize G (match the input shape)
-        G = np.full(th.shape, -np.inf)
-
-        # Calc G for the valid values to avoid sqrt domain errors
-        G[mask] = R * (s[mask] + np.sin(2 * th[mask]) / (2 * np.sqrt(root_term[mask])))
-        
-        # If the input was a scalar, return a scalar for the optimizer
-        return G.item() if G.ndim == 0 else G
-
-    # 1. coarse search
-    N = 100
-    theta_grid = np.linspace(0, 2 * np.pi, N)
-    G_vals = Gfun(theta_grid)
-    
-    # Find the index of the maximum value in the coarse grid
-    idx = np.argmax(G_vals)
-    theta_coarse = theta_grid[idx]
-
-    # 2. Refine the search around the coarse maximum using a bounded optimizer
-    w = 0.15
-    a = theta_coarse - w
-    b = theta_coarse + w
-
-    # To maximize G(t), we minimize -G(t)
-    negG = lambda t: -Gfun(t)
-
-    result = minimize_scalar(negG, bounds=(a, b), method='bounded')
-
-    if not result.success:
-        warnings.warn(f"Optimization failed: {result.message}. Falling back to coarse grid result.")
-        Gmax = G_vals[idx]
-        theta_at_Gmax = theta_coarse
-    else:
-        theta_at_Gmax = result.x
-        Gmax = -result.fun
-
-    # checks and calculation
-    if Gmax <= 0:
-        warnings.warn(f"Gmax is non-positive ({Gmax:.4g}). Check geometry.", UserWarning)
-        # Avoid division by zero or negative speed
-        theta_dot_req = np.inf if V_des > 0 else 0
-    else:
-        # Required angular velocity
-        theta_dot_req = V_des / Gmax
-
-    return gearbox_scaling(10, theta_dot_req), Gmax, theta_at_Gmax
+    return kinematics.required_theta_dot(V_des, Lc, R, gear_ratio=10)
 
 def gearbox_scaling(gear_ratio, desired_input):
 
@@ -183,9 +128,23 @@ def map_HLFB_pwm_to_torque(HLFB_pwm, motor_speed, settings):
     """
     Calculates motor torque by interpolating max torque from speed 
     and then applying a torque percentage mapped from an HLFB PWM signal.
+
+    Works on scalars or on whole chunks: HLFB_pwm (duty %) and motor_speed (RPM)
+    broadcast against each other and are mapped in a single vectorized pass.
+    """
+    torque, _ = map_HLFB_pwm_to_torque_fraction(HLFB_pwm, motor_speed, settings)
+    return torque
+
+def map_HLFB_pwm_to_torque_fraction(HLFB_pwm, motor_speed, settings):
+    """
+    Vectorized HLFB mapping that also returns the signed fraction of the
+    available torque at speed (-1..1), used to detect motor saturation.
+
+    Returns:
+        tuple: (motor_torque, percent_torque) arrays (or floats for scalar input).
     """
     motor_params = settings.get('motor_max_torque_map')
-    max_torque_at_speed = np.interp(motor_speed, motor_params[0], motor_params[1])
+    max_torque_at_speed = np.interp(np.abs(motor_speed), motor_params[0], motor_params[1])
 
     # interpolate the torque wrt the pwm signal 
     pwm_lims = [[5, 95], [-1, 1]]
@@ -194,4 +153,11 @@ def map_HLFB_pwm_to_torque(HLFB_pwm, motor_speed, settings):
     # calculate final motor torque from scalar mapping
     motor_torque = percent_torque * max_torque_at_speed
 
-    return motor_torque
\ No newline at end of file
+    return motor_torque, percent_torque
+
+def motor_mechanical_power(motor_torque, motor_speed):
+    """
+    Mechanical shaft power in W from torque (N*m) and motor speed (RPM).
+    Vectorized over arrays.
+    """
+    return np.asarray(motor_torque) * np.asarray(motor_speed) * 2 * np.pi / 60.0
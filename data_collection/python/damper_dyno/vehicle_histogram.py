@@ -0,0 +1,360 @@
+import os
+import json
+import logging
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+try:
+    import h5py  # MATLAB v7.3 logs are HDF5 and can be read lazily
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+CORNERS = ("FL", "FR", "RL", "RR")
+# Linpot signal names of the endurance logs (see velocity_histogram.m)
+DEFAULT_SIGNALS = {corner: f"Shock_Pots_{corner}_Lin_Pot_Value" for corner in CORNERS}
+# Motion ratios (shock travel / wheel travel) of velocity_histogram.m
+DEFAULT_MOTION_RATIOS = {"FL": 1.03, "FR": 1.03, "RL": 1.16, "RR": 1.16}
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Parallel (Chan et al.) merge of count / mean / sum of squared deviations."""
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta**2 * n_a * n_b / n
+
+
+class VelocityHistogram:
+    """
+    Fixed-bin wheel velocity histograms accumulated chunk by chunk.
+
+    Replaces the whole-log processing of velocity_histogram.m: positions are
+    scaled by the motion ratio, low-pass filtered with the filter state
+    carried across chunks, differentiated (including across chunk boundaries)
+    and binned per corner, together with running mean/variance. Memory use
+    is independent of log length, and histograms of several sessions can be
+    merged or saved and merged later.
+
+    filtfilt needs the whole record, so the Butterworth filter is applied
+    twice forward instead: same |H|^2 magnitude response (what shapes the
+    velocity distribution), with a delay that does not affect the histogram.
+
+    The bins hold wheel velocity, as in velocity_histogram.m, and stats(),
+    fraction_between() and speed_quantiles() report it. The dyno drives the
+    damper itself, so shock_distribution(), dyno_test_speeds() and the
+    profile planner use shock velocity (wheel velocity x motion ratio).
+    """
+
+    def __init__(self, bin_width=0.5, v_limit=50.0, cutoff_hz=20.0, order=4,
+                 motion_ratios=None, corners=CORNERS):
+        """
+        Args:
+            bin_width (float): Histogram bin width [in/s].
+            v_limit (float): Bins cover [-v_limit, v_limit]; the rest goes to
+                the under/overflow counters.
+            cutoff_hz (float): Low-pass cutoff on positions [Hz].
+            order (int): Butterworth order.
+            motion_ratios (dict, optional): Shock/wheel travel ratio per corner.
+            corners (tuple): Corner names.
+        """
+        self.bin_width = float(bin_width)
+        n_half = int(np.ceil(v_limit / bin_width))
+        self.edges = np.arange(-n_half, n_half + 1) * self.bin_width
+        self.centers = 0.5 * (self.edges[:-1] + self.edges[1:])
+        self.cutoff_hz = cutoff_hz
+        self.order = order
+        self.motion_ratios = dict(DEFAULT_MOTION_RATIOS, **(motion_ratios or {}))
+        self.corners = tuple(corners)
+
+        self.counts = {c: np.zeros(self.centers.size, dtype=np.int64) for c in self.corners}
+        self.underflow = {c: 0 for c in self.corners}
+        self.overflow = {c: 0 for c in self.corners}
+        self.moments = {c: (0, 0.0, 0.0) for c in self.corners}
+        self.sessions = 0
+        self.begin_session()
+
+    def begin_session(self, sample_rate=None):
+        """Resets filter/derivative state for a new, non-contiguous log."""
+        self.sample_rate = sample_rate
+        self._sos = None
+        self._zi = {}
+        self._last = {}   # corner -> (time, filtered position) of the previous sample
+
+    def _design(self, sample_rate):
+        self.sample_rate = sample_rate
+        sos = butter(self.order, self.cutoff_hz / (sample_rate / 2), output="sos")
+        self._sos = np.vstack((sos, sos))
+
+    def process_chunk(self, time, positions, t_start=None, t_end=None):
+        """
+        Adds one chunk of a log.
+
+        Args:
+            time (array): Sample times [s] of the chunk.
+            positions (dict): Corner -> shock linpot position (same length as time).
+            t_start, t_end (float, optional): Only samples in this time window are kept.
+        """
+        time = np.asarray(time, dtype=float)
+        mask = np.ones(time.size, dtype=bool)
+        if t_start is not None:
+            mask &= time >= t_start
+        if t_end is not None:
+            mask &= time <= t_end
+        if not mask.any():
+            return
+        time = time[mask]
+
+        if self._sos is None:
+            if self.sample_rate is None:
+                if time.size < 2:
+                    return
+                self.sample_rate = 1.0 / np.mean(np.diff(time))
+            self._design(self.sample_rate)
+            self.sessions += 1
+
+        for corner in self.corners:
+            if corner not in positions:
+                continue
+            pos = np.asarray(positions[corner], dtype=float)[mask] / self.motion_ratios.get(corner, 1.0)
+            if corner not in self._zi:
+                # start the filter settled at the first sample, like filtfilt's padding does
+                self._zi[corner] = sosfilt_zi(self._sos) * pos[0]
+            pos_f, self._zi[corner] = sosfilt(self._sos, pos, zi=self._zi[corner])
+
+            # differentiate, continuing from the previous chunk's last sample
+            if corner in self._last:
+                t_prev, p_prev = self._last[corner]
+                t_all = np.concatenate(([t_prev], time))
+                p_all = np.concatenate(([p_prev], pos_f))
+            else:
+                t_all, p_all = time, pos_f
+            self._last[corner] = (time[-1], pos_f[-1])
+            if t_all.size < 2:
+                continue
+            vel = np.diff(p_all) / np.diff(t_all)
+            self._accumulate(corner, vel[np.isfinite(vel)])
+
+    def _accumulate(self, corner, vel):
+        if vel.size == 0:
+            return
+        idx = np.searchsorted(self.edges, vel, side="right") - 1
+        under = idx < 0
+        over = idx >= self.centers.size
+        self.underflow[corner] += int(under.sum())
+        self.overflow[corner] += int(over.sum())
+        inside = ~(under | over)
+        self.counts[corner] += np.bincount(idx[inside], minlength=self.centers.size)
+        mean = vel.mean()
+        self.moments[corner] = _merge_moments(*self.moments[corner], vel.size, mean, float(np.sum((vel - mean)**2)))
+
+    def merge(self, other):
+        """Adds the histograms of another VelocityHistogram with the same bins."""
+        if self.edges.shape != other.edges.shape or not np.allclose(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins.")
+        for c in self.corners:
+            if c not in other.counts:
+                continue
+            self.counts[c] += other.counts[c]
+            self.underflow[c] += other.underflow[c]
+            self.overflow[c] += other.overflow[c]
+            self.moments[c] = _merge_moments(*self.moments[c], *other.moments[c])
+        self.sessions += other.sessions
+        return self
+
+    # --- results ---
+
+    def _combined(self, corners=None):
+        corners = corners or self.corners
+        counts = sum(self.counts[c] for c in corners)
+        moments = (0, 0.0, 0.0)
+        for c in corners:
+            moments = _merge_moments(*moments, *self.moments[c])
+        return counts, moments
+
+    def stats(self, corner=None):
+        """
+        velocity_histogram.m statistics of one corner (or all corners pooled).
+
+        Returns:
+            dict: count, mean, std, probability per bin, the share of samples
+            within 1 and 3 sigma (from the binned distribution) and the
+            3-sigma envelope.
+        """
+        counts, (n, mean, m2) = self._combined([corner] if corner else None)
+        std = float(np.sqrt(m2 / (n - 1))) if n > 1 else float("nan")
+        total = counts.sum()
+        prob = counts / total if total else counts.astype(float)
+        return {
+            "count": int(n),
+            "mean": float(mean),
+            "std": std,
+            "probability": prob,
+            "within_1sigma_pct": 100 * self.fraction_between(mean - std, mean + std, corner),
+            "within_3sigma_pct": 100 * self.fraction_between(mean - 3 * std, mean + 3 * std, corner),
+            "envelope_3sigma": (mean - 3 * std, mean + 3 * std),
+        }
+
+    def _cdf(self, corner=None):
+        counts, _ = self._combined([corner] if corner else None)
+        cdf = np.concatenate(([0.0], np.cumsum(counts, dtype=float)))
+        return cdf / cdf[-1] if cdf[-1] else cdf
+
+    def fraction_between(self, low, high, corner=None):
+        """Share of binned samples in [low, high] (linear within bins)."""
+        cdf = self._cdf(corner)
+        return float(np.interp(high, self.edges, cdf) - np.interp(low, self.edges, cdf))
+
+    def shock_distribution(self, corner=None):
+        """
+        Shock (damper) velocity distribution of one corner (or all corners
+        pooled): each corner's wheel velocity bins scaled by its motion ratio
+        and rebinned (uniform within bins) onto bins of the same width.
+
+        Returns:
+            tuple: (edges [in/s], counts per bin).
+        """
+        corners = [corner] if corner else self.corners
+        ratios = [self.motion_ratios.get(c, 1.0) for c in corners]
+        n_half = int(np.ceil(self.edges[-1] * max(ratios) / self.bin_width - 1e-9))
+        edges = np.arange(-n_half, n_half + 1) * self.bin_width
+        counts = np.zeros(edges.size - 1)
+        for c, ratio in zip(corners, ratios):
+            cdf = np.concatenate(([0.0], np.cumsum(self.counts[c], dtype=float)))
+            counts += np.diff(np.interp(edges, self.edges * ratio, cdf))
+        return edges, counts
+
+    def speed_quantiles(self, quantiles, corner=None, shock=False):
+        """
+        |velocity| below which the given fractions of samples lie: wheel
+        speeds [in/s], or shock speeds with shock=True.
+        """
+        if shock:
+            edges, counts = self.shock_distribution(corner)
+        else:
+            edges, (counts, _) = self.edges, self._combined([corner] if corner else None)
+        # fold the signed histogram onto |v|
+        half = counts.size // 2
+        folded = counts[half:] + counts[:half][::-1]
+        cdf = np.concatenate(([0.0], np.cumsum(folded, dtype=float)))
+        if not cdf[-1]:
+            return np.full(np.shape(quantiles), np.nan)
+        return np.interp(quantiles, cdf / cdf[-1], edges[half:])
+
+    def dyno_test_speeds(self, quantiles=(0.5, 0.75, 0.9, 0.95, 0.99), cycles=8, corner=None):
+        """
+        Suggested dyno run_profile from the logged speed distribution: one
+        segment per shock |velocity| quantile, as [[peak linear speeds (in/s)],
+        [cycles]] (run_profile_speeds_are_rpm = 0).
+        """
+        speeds = np.round(self.speed_quantiles(quantiles, corner, shock=True), 2)
+        cycles = np.broadcast_to(cycles, speeds.shape)
+        return [speeds.tolist(), np.asarray(cycles).tolist()]
+
+    # --- persistence ---
+
+    def save(self, path):
+        arrays = {"edges": self.edges}
+        for c in self.corners:
+            arrays[f"counts_{c}"] = self.counts[c]
+        meta = {
+            "corners": list(self.corners),
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+            "moments": {c: list(m) for c, m in self.moments.items()},
+            "sessions": self.sessions,
+            "bin_width": self.bin_width,
+            "cutoff_hz": self.cutoff_hz,
+            "order": self.order,
+            "motion_ratios": self.motion_ratios,
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            edges = data["edges"]
+            hist = cls(bin_width=meta.get("bin_width", edges[1] - edges[0]), v_limit=edges[-1],
+                       cutoff_hz=meta["cutoff_hz"], order=meta["order"], motion_ratios=meta["motion_ratios"],
+                       corners=meta["corners"])
+            # the saved bins, not ones re-derived from floats, so sessions stay mergeable
+            hist.edges = edges.astype(float)
+            hist.centers = 0.5 * (hist.edges[:-1] + hist.edges[1:])
+            for c in hist.corners:
+                hist.counts[c] = data[f"counts_{c}"].astype(np.int64)
+        hist.underflow = meta["underflow"]
+        hist.overflow = meta["overflow"]
+        hist.moments = {c: tuple(m) for c, m in meta["moments"].items()}
+        hist.sessions = meta["sessions"]
+        return hist
+
+
+def mat_log_source(path, signals=None):
+    """
+    Opens an endurance .mat log as {'time': ..., corner: ...} arrays.
+
+    MATLAB v7.3 files are opened lazily through h5py when it is installed
+    (slices are read on demand); older formats are loaded with scipy.
+    Time is taken from the first corner's signal, as in velocity_histogram.m.
+    """
+    signals = signals or DEFAULT_SIGNALS
+    if H5PY_AVAILABLE and h5py.is_hdf5(path):
+        f = h5py.File(path, "r")
+        source = {corner: f[name]["Value"] for corner, name in signals.items()}
+        source["time"] = f[next(iter(signals.values()))]["Time"]
+        return {k: _H5Vector(v) for k, v in source.items()}
+
+    from scipy.io import loadmat
+    data = loadmat(path, variable_names=list(signals.values()), squeeze_me=True, struct_as_record=False)
+    source = {corner: np.asarray(data[name].Value, dtype=float).ravel() for corner, name in signals.items()}
+    source["time"] = np.asarray(data[next(iter(signals.values()))].Time, dtype=float).ravel()
+    return source
+
+class _H5Vector:
+    """1-D view of an (n x 1) or (1 x n) HDF5 dataset, read slice by slice."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.row = dataset.ndim == 2 and dataset.shape[0] == 1
+
+    def __len__(self):
+        return max(self.dataset.shape)
+
+    def __getitem__(self, sl):
+        if self.dataset.ndim == 1:
+            return self.dataset[sl]
+        return self.dataset[0, sl] if self.row else self.dataset[sl, 0]
+
+def npy_log_source(folder):
+    """Opens a folder of <name>.npy columns ('time', 'FL', ...) memory-mapped."""
+    return {os.path.splitext(f)[0]: np.load(os.path.join(folder, f), mmap_mode="r")
+            for f in os.listdir(folder) if f.endswith(".npy")}
+
+def process_log(source, hist=None, chunk_size=1 << 20, t_start=None, t_end=None):
+    """
+    Streams one log session through a VelocityHistogram.
+
+    Args:
+        source (dict): 'time' and one entry per corner, each a sliceable 1-D
+            array (np.memmap, HDF5 dataset view, ndarray).
+        hist (VelocityHistogram, optional): Histogram to add to (new one by default).
+        chunk_size (int): Samples read per chunk.
+        t_start, t_end (float, optional): Time window [s].
+
+    Returns:
+        VelocityHistogram
+    """
+    if hist is None:
+        hist = VelocityHistogram()
+    hist.begin_session()
+    n = len(source["time"])
+    for i in range(0, n, chunk_size):
+        sl = slice(i, min(n, i + chunk_size))
+        time = np.asarray(source["time"][sl], dtype=float)
+        if t_end is not None and time.size and time[0] > t_end:
+            break
+        hist.process_chunk(time, {c: source[c][sl] for c in hist.corners if c in source},
+                           t_start=t_start, t_end=t_end)
+    logging.info(f"Velocity histogram: {hist.stats()['count']} samples over {hist.sessions} session(s)")
+    return hist